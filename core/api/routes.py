@@ -1,26 +1,249 @@
-from fastapi import APIRouter, HTTPException
+import json
+import time
+from fastapi import APIRouter, HTTPException, Request
+from fastapi.responses import PlainTextResponse
 from database import db
-from integration.shelly.device_manager import add_device_to_db
-from typing import Dict, Any
+from integration.shelly.device_manager import add_device_to_db, add_devices_to_db
+from typing import Dict, Any, List, Optional
+from services.metrics.metrics import metrics
+from services.timeseries.timeseries_query import combined_series, device_series
+from api.state_views import device_list_response, device_response, rooms_response
+from config.settings import REST_PAGE_SIZE
 
 router = APIRouter()
 
 @router.get("/devices")
-async def get_devices():
-    return await db.device.find_many()
+async def get_devices(request: Request, fields: Optional[str] = None, type: Optional[str] = None,
+                      room_id: Optional[int] = None, cursor: Optional[str] = None, limit: int = REST_PAGE_SIZE):
+    """
+    Dispozitivele cunoscute, cu statusul live din mașina de stare (fără interogări în baza de date).
+    fields: ex. "id,name,status.ison,status.power"; cursor: "next_cursor" din pagina anterioară.
+    Răspunsul are ETag; cu If-None-Match și nicio modificare se întoarce 304.
+    """
+    return device_list_response(request, request.app.state.state_machine, fields, type, room_id, cursor, limit)
+
+@router.get("/devices/{device_id}")
+async def get_device(device_id: str, request: Request, fields: Optional[str] = None):
+    """Un dispozitiv cu statusul live; ETag și 304 ca la /devices."""
+    return device_response(request, request.app.state.state_machine, device_id, fields)
 
 @router.post("/devices")
 async def add_device(name: str, type: str):
     return await db.device.create(data={"name": name, "type": type})
 
 @router.post("/devices/add")
-async def add_device(device_data: Dict[str, Any]):
+async def add_device(device_data: Dict[str, Any], request: Request):
     """
     Endpoint pentru adăugarea unui dispozitiv în baza de date.
     :param device_data: Datele dispozitivului trimise de frontend.
     """
     try:
         await add_device_to_db(device_data)
+        await request.app.state.state_machine.adopt_devices([device_data["id"]])
         return {"message": "Device added successfully"}
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to add device: {e}")
+
+
+@router.post("/devices/add_many")
+async def add_devices(devices_data: List[Dict[str, Any]], request: Request):
+    """
+    Adaugă mai multe dispozitive într-o singură tranzacție.
+    :param devices_data: Lista de dispozitive trimise de frontend.
+    """
+    try:
+        count = await add_devices_to_db(devices_data)
+        await request.app.state.state_machine.adopt_devices([device["id"] for device in devices_data])
+        return {"message": f"{count} devices added successfully"}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to add devices: {e}")
+
+
+@router.get("/rooms")
+async def get_rooms(request: Request, fields: Optional[str] = None):
+    """Camerele cu entitățile și statusul lor live; fields se aplică entităților."""
+    return rooms_response(request, request.app.state.state_machine, fields)
+
+@router.get("/rooms/{room_id}")
+async def get_room(room_id: int, request: Request, fields: Optional[str] = None):
+    return rooms_response(request, request.app.state.state_machine, fields, room_id)
+
+@router.post("/rooms/refresh")
+async def refresh_rooms(request: Request):
+    """Reîncarcă indexul camerelor după modificări făcute direct în baza de date."""
+    await request.app.state.state_machine.refresh_rooms()
+    return {"message": "Rooms refreshed"}
+
+@router.post("/rooms/{room_id}/refresh")
+async def refresh_room(room_id: int, request: Request):
+    """Reîncarcă o cameră (și asignările entităților ei) după creare, editare sau ștergere."""
+    await request.app.state.state_machine.refresh_room(room_id)
+    return {"message": f"Room {room_id} refreshed"}
+
+
+@router.get("/groups")
+async def get_groups(request: Request):
+    return request.app.state.state_machine.get_groups_data()
+
+@router.post("/groups")
+async def create_group(group_data: Dict[str, Any], request: Request):
+    """
+    Creează un grup numit de entități, folosit ca țintă de comandă ("group_id").
+    :param group_data: {"name": ..., "entity_ids": [...]}
+    """
+    try:
+        group = await db.group.create(data={
+            "name": group_data["name"],
+            "entities": {"connect": [{"id": entity_id} for entity_id in group_data.get("entity_ids", [])]},
+        })
+        await request.app.state.state_machine.refresh_group(group.id)
+        return {"message": "Group created successfully", "id": group.id}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to create group: {e}")
+
+@router.post("/groups/refresh")
+async def refresh_groups(request: Request):
+    """Reîncarcă grupurile și scenele după modificări făcute direct în baza de date."""
+    await request.app.state.state_machine.refresh_groups()
+    return {"message": "Groups and scenes refreshed"}
+
+@router.post("/groups/{group_id}/refresh")
+async def refresh_group(group_id: int, request: Request):
+    await request.app.state.state_machine.refresh_group(group_id)
+    return {"message": f"Group {group_id} refreshed"}
+
+
+@router.get("/scenes")
+async def get_scenes(request: Request):
+    return request.app.state.state_machine.get_scenes_data()
+
+@router.post("/scenes")
+async def create_scene(scene_data: Dict[str, Any], request: Request):
+    """
+    Creează o scenă. Acțiunile au forma mesajelor de comandă WebSocket, de exemplu
+    {"command": "set_color", "room_id": 1, "red": 255, "green": 120, "blue": 0}.
+    :param scene_data: {"name": ..., "actions": [...]}
+    """
+    actions = scene_data.get("actions", [])
+    if not isinstance(actions, list):
+        raise HTTPException(status_code=400, detail="actions must be a list")
+    try:
+        scene = await db.scene.create(data={"name": scene_data["name"], "actions": json.dumps(actions)})
+        await request.app.state.state_machine.refresh_scene(scene.id)
+        return {"message": "Scene created successfully", "id": scene.id}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to create scene: {e}")
+
+@router.post("/scenes/{scene_id}/refresh")
+async def refresh_scene(scene_id: int, request: Request):
+    await request.app.state.state_machine.refresh_scene(scene_id)
+    return {"message": f"Scene {scene_id} refreshed"}
+
+
+@router.get("/commands/latency")
+async def get_command_latency(request: Request):
+    """Latența publicare → confirmare per comandă și per dispozitiv, plus comenzile expirate."""
+    return request.app.state.state_machine.command_tracker.get_stats()
+
+
+def _time_range(start: Optional[float], end: Optional[float], default_span: float = 86400):
+    """Intervalul implicit: ultimele 24 de ore. Capetele sunt timestamp-uri Unix, în secunde."""
+    end = time.time() if end is None else end
+    start = end - default_span if start is None else start
+    if start > end:
+        raise HTTPException(status_code=400, detail="start must be before end")
+    return start, end
+
+@router.get("/devices/{device_id}/timeseries")
+async def get_device_timeseries(device_id: str, request: Request, metric: str = "power",
+                                start: Optional[float] = None, end: Optional[float] = None,
+                                resolution: str = "auto"):
+    """Puterea sau energia unui dispozitiv: raw (ring buffer), minute, hour, day sau auto."""
+    state_machine = request.app.state.state_machine
+    start, end = _time_range(start, end)
+    try:
+        return await device_series(state_machine.timeseries, device_id, metric, start, end, resolution)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@router.get("/rooms/{room_id}/timeseries")
+async def get_room_timeseries(room_id: int, request: Request, metric: str = "power",
+                              start: Optional[float] = None, end: Optional[float] = None,
+                              resolution: str = "auto"):
+    """Seria agregată a dispozitivelor dintr-o cameră."""
+    state_machine = request.app.state.state_machine
+    device_ids = state_machine.resolve_targets(room_id=room_id)
+    if device_ids is None:
+        raise HTTPException(status_code=404, detail=f"Room {room_id} not found")
+    start, end = _time_range(start, end)
+    try:
+        result = await combined_series(state_machine.timeseries, device_ids, metric, start, end, resolution)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    result["room_id"] = room_id
+    return result
+
+@router.get("/timeseries")
+async def get_house_timeseries(request: Request, metric: str = "power",
+                               start: Optional[float] = None, end: Optional[float] = None,
+                               resolution: str = "auto"):
+    """Seria agregată a tuturor dispozitivelor (ex. consumul casei pe o lună, din rollup-urile zilnice)."""
+    state_machine = request.app.state.state_machine
+    device_ids = state_machine.device_ids()
+    start, end = _time_range(start, end)
+    try:
+        return await combined_series(state_machine.timeseries, device_ids, metric, start, end, resolution)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@router.get("/analytics/report")
+async def get_energy_report(request: Request, start: Optional[float] = None, end: Optional[float] = None,
+                            limit: int = 10):
+    """Raportul de consum al casei (implicit ultimele 30 de zile): total, tarife, camere, top, zile, standby."""
+    start, end = _time_range(start, end, 30 * 86400)
+    return request.app.state.energy_analytics.report(start, end, limit)
+
+@router.get("/analytics/rooms")
+async def get_room_energy(request: Request, start: Optional[float] = None, end: Optional[float] = None):
+    start, end = _time_range(start, end)
+    return request.app.state.energy_analytics.room_totals(start, end)
+
+@router.get("/analytics/top")
+async def get_top_consumers(request: Request, start: Optional[float] = None, end: Optional[float] = None,
+                            limit: int = 10):
+    start, end = _time_range(start, end)
+    return request.app.state.energy_analytics.top_consumers(start, end, limit)
+
+@router.get("/analytics/daily")
+async def get_daily_energy(request: Request, start: Optional[float] = None, end: Optional[float] = None):
+    """Consumul pe zile, pentru casă și pe camere, cu variația față de ziua precedentă (implicit 7 zile)."""
+    start, end = _time_range(start, end, 7 * 86400)
+    return request.app.state.energy_analytics.daily(start, end)
+
+@router.get("/analytics/rolling")
+async def get_rolling_power(request: Request, start: Optional[float] = None, end: Optional[float] = None,
+                            window: int = 24, device_id: Optional[str] = None, room_id: Optional[int] = None):
+    """Media mobilă a puterii totale pentru casă, o cameră sau un dispozitiv (implicit 7 zile)."""
+    device_ids = None
+    if device_id is not None or room_id is not None:
+        device_ids = request.app.state.state_machine.resolve_targets(device_ids=device_id, room_id=room_id)
+        if device_ids is None:
+            raise HTTPException(status_code=404, detail=f"Room {room_id} not found")
+    start, end = _time_range(start, end, 7 * 86400)
+    return request.app.state.energy_analytics.rolling_average(start, end, window, device_ids)
+
+@router.get("/analytics/standby")
+async def get_standby_draw(request: Request, start: Optional[float] = None, end: Optional[float] = None):
+    """Dispozitivele cu consum de standby peste ANALYTICS_STANDBY_WATTS (implicit ultimele 7 zile)."""
+    start, end = _time_range(start, end, 7 * 86400)
+    return request.app.state.energy_analytics.standby(start, end)
+
+@router.get("/metrics", response_class=PlainTextResponse)
+async def get_metrics():
+    """Metricile în formatul text Prometheus."""
+    return PlainTextResponse(metrics.render_prometheus(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+@router.get("/metrics/json")
+async def get_metrics_json():
+    """Aceleași metrici, în format JSON compact (histogramele cu count/avg/p50/p95/p99)."""
+    return metrics.as_json()
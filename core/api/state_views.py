@@ -0,0 +1,227 @@
+import base64
+import binascii
+import hashlib
+import secrets
+from bisect import bisect_right
+from collections import OrderedDict
+from typing import Any, Callable, Dict, FrozenSet, List, Optional, Tuple
+from fastapi import HTTPException, Request
+from fastapi.responses import Response
+from config.settings import REST_CACHE_SIZE, REST_MAX_PAGE_SIZE
+from services.metrics.metrics import metrics
+from services.websocket.wire_format import encode_message
+
+RESPONSES = metrics.counter("rest_state_responses_total", "Responses of the cached state REST endpoints", ("result",))
+
+# (chei de nivel 1, câmpuri de status; None = tot statusul)
+Projection = Tuple[FrozenSet[str], Optional[FrozenSet[str]]]
+
+# Epoca procesului: versiunile snapshot-urilor reîncep de la 0 la fiecare pornire,
+# deci un ETag emis înainte de restart nu trebuie să se potrivească după.
+BOOT_ID = secrets.token_hex(8)
+
+
+class ResponseCache:
+    """Ultimele corpuri JSON serializate, după ETag (care include și parametrii cererii)."""
+
+    def __init__(self, size: int = REST_CACHE_SIZE):
+        self.size = size
+        self._entries: "OrderedDict[str, bytes]" = OrderedDict()
+
+    def get(self, etag: str) -> Optional[bytes]:
+        body = self._entries.get(etag)
+        if body is not None:
+            self._entries.move_to_end(etag)
+        return body
+
+    def put(self, etag: str, body: bytes):
+        self._entries[etag] = body
+        self._entries.move_to_end(etag)
+        while len(self._entries) > self.size:
+            self._entries.popitem(last=False)
+
+
+response_cache = ResponseCache()
+
+
+def make_etag(kind: str, *parts: Any) -> str:
+    """
+    ETag puternic: rezumatul epocii procesului, al versiunilor din care se construiește corpul
+    și al parametrilor cererii.
+    """
+    digest = hashlib.blake2b(repr((BOOT_ID,) + parts).encode(), digest_size=12).hexdigest()
+    return f'"{kind}-{digest}"'
+
+
+def etag_matches(header: Optional[str], etag: str) -> bool:
+    """Comparația slabă din If-None-Match (RFC 9110): "*", listă de ETag-uri, prefix W/ ignorat."""
+    if not header:
+        return False
+    if header.strip() == "*":
+        return True
+    return any(candidate.strip().removeprefix("W/") == etag for candidate in header.split(","))
+
+
+def conditional_response(request: Request, etag: str,
+                         build: Callable[[], Tuple[str, Dict[str, Any]]]) -> Response:
+    """
+    304 dacă clientul are deja versiunea curentă, altfel corpul din cache sau construit acum.
+    build întoarce (etag, mesaj): ETag-ul poate fi recalculat din datele efectiv citite,
+    ca un corp să nu fie servit niciodată sub ETag-ul altei versiuni.
+    """
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        RESPONSES.labels("not_modified").inc()
+        return Response(status_code=304, headers=headers)
+    body = response_cache.get(etag)
+    if body is not None:
+        RESPONSES.labels("cached").inc()
+    else:
+        etag, message = build()
+        headers["ETag"] = etag
+        body = response_cache.get(etag)
+        if body is None:
+            body = encode_message(message).encode()
+            response_cache.put(etag, body)
+        RESPONSES.labels("built").inc()
+    return Response(content=body, media_type="application/json", headers=headers)
+
+
+def parse_fields(fields: Optional[str]) -> Optional[Projection]:
+    """ "id,name,status.ison,status.power" -> proiecția; None = înregistrarea întreagă."""
+    if not fields:
+        return None
+    top, status, whole_status = set(), set(), False
+    for name in fields.split(","):
+        name = name.strip()
+        if not name:
+            continue
+        if name.startswith("status."):
+            top.add("status")
+            status.add(name[len("status."):])
+        else:
+            top.add(name)
+            whole_status |= name == "status"
+    return frozenset(top), None if whole_status or not status else frozenset(status)
+
+
+def project(record: Dict[str, Any], projection: Optional[Projection]) -> Dict[str, Any]:
+    if projection is None:
+        return record
+    top, status_fields = projection
+    result = {key: value for key, value in record.items() if key in top}
+    if status_fields is not None and "status" in result:
+        result["status"] = {key: value for key, value in result["status"].items() if key in status_fields}
+    return result
+
+
+def encode_cursor(device_id: str) -> str:
+    return base64.urlsafe_b64encode(device_id.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> str:
+    try:
+        return base64.b64decode(cursor + "=" * (-len(cursor) % 4), altchars=b"-_", validate=True).decode()
+    except (binascii.Error, UnicodeDecodeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+def _check_limit(limit: int):
+    if not 0 < limit <= REST_MAX_PAGE_SIZE:
+        raise HTTPException(status_code=400, detail=f"limit must be between 1 and {REST_MAX_PAGE_SIZE}")
+
+
+def device_list_response(request: Request, state_machine, fields: Optional[str], device_type: Optional[str],
+                         room_id: Optional[int], cursor: Optional[str], limit: int) -> Response:
+    """
+    Dispozitivele din snapshot-urile publicate, ordonate după id, cu proiecție și paginare cu cursor.
+    ETag-ul vine din versiunile snapshot-urilor partițiilor: cât timp nu se schimbă nimic,
+    o cerere condiționată nu citește și nu serializează niciun dispozitiv.
+    """
+    _check_limit(limit)
+    _, snapshots = state_machine.published_snapshots()
+    rooms_version = None
+    members = None
+    if room_id is not None:
+        rooms_version = state_machine.rooms_version
+        members = state_machine.resolve_targets(room_id=room_id)
+        if members is None:
+            raise HTTPException(status_code=404, detail=f"Room {room_id} not found")
+    query = (fields, device_type, room_id, cursor, limit)
+    etag = make_etag("devices", [snapshot.version for snapshot in snapshots], rooms_version, query)
+
+    def build():
+        projection = parse_fields(fields)
+        devices: Dict[str, Dict[str, Any]] = {}
+        for snapshot in snapshots:
+            devices.update(snapshot.devices)
+        if members is not None:
+            ids = sorted(device_id for device_id in members if device_id in devices)
+        else:
+            ids = sorted(devices)
+        if device_type is not None:
+            ids = [device_id for device_id in ids if devices[device_id]["type"] == device_type]
+        start = bisect_right(ids, decode_cursor(cursor)) if cursor else 0
+        page = ids[start:start + limit]
+        next_cursor = encode_cursor(page[-1]) if start + limit < len(ids) else None
+        return etag, {
+            "devices": [project(devices[device_id], projection) for device_id in page],
+            "total": len(ids),
+            "next_cursor": next_cursor,
+        }
+
+    return conditional_response(request, etag, build)
+
+
+def device_response(request: Request, state_machine, device_id: str, fields: Optional[str]) -> Response:
+    """Un dispozitiv; ETag-ul depinde doar de snapshot-ul partiției lui."""
+    snapshot = state_machine.shard(device_id).snapshot
+    record = snapshot.devices.get(device_id)
+    if record is None:
+        raise HTTPException(status_code=404, detail=f"Device {device_id} not found")
+    etag = make_etag("device", device_id, snapshot.version, fields)
+    return conditional_response(request, etag, lambda: (etag, project(record, parse_fields(fields))))
+
+
+def _room_views(rooms: List[Dict[str, Any]], devices: Dict[str, Dict[str, Any]],
+                projection: Optional[Projection]) -> List[Dict[str, Any]]:
+    """Înlocuiește statusul live al entităților cu cel din snapshot și aplică proiecția pe entități."""
+    for room in rooms:
+        entities = []
+        for entry in room["entities"]:
+            record = devices.get(entry["id"])
+            if record is not None:
+                entry["status"] = record["status"]
+                if "pending" in record:
+                    entry["pending"] = record["pending"]
+            entities.append(project(entry, projection))
+        room["entities"] = entities
+    return rooms
+
+
+def rooms_response(request: Request, state_machine, fields: Optional[str], room_id: Optional[int] = None) -> Response:
+    """
+    Camerele (sau una singură) cu entitățile și statusul lor live; ETag din indexul camerelor și snapshot-uri.
+    O cameră inexistentă dă 404 înainte de evaluarea If-None-Match.
+    """
+    if room_id is not None and state_machine.resolve_targets(room_id=room_id) is None:
+        raise HTTPException(status_code=404, detail=f"Room {room_id} not found")
+    _, snapshots = state_machine.published_snapshots()
+    versions = [snapshot.version for snapshot in snapshots]
+    kind = "rooms" if room_id is None else "room"
+    etag = make_etag(kind, state_machine.rooms_version, versions, room_id, fields)
+
+    def build():
+        rooms_version, rooms = state_machine.copy_rooms()
+        if room_id is not None:
+            rooms = [room for room in rooms if room["id"] == room_id]
+            if not rooms:
+                raise HTTPException(status_code=404, detail=f"Room {room_id} not found")
+        devices: Dict[str, Dict[str, Any]] = {}
+        for snapshot in snapshots:
+            devices.update(snapshot.devices)
+        views = _room_views(rooms, devices, parse_fields(fields))
+        built_etag = make_etag(kind, rooms_version, versions, room_id, fields)
+        return built_etag, views[0] if room_id is not None else {"rooms": views}
+
+    return conditional_response(request, etag, build)
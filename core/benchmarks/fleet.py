@@ -0,0 +1,257 @@
+"""
+Benchmark cu o flotă simulată.
+
+Simulează N becuri Shelly Duo RGBW față de un broker MQTT din proces și pune la lucru
+ingestia reală din mqtt_service, DeviceStateMachine, CommandScheduler/CommandTracker și
+WebSocketManager, cu M clienți WebSocket sintetici. Afișează (sau scrie) un singur document
+JSON cu debitul ingestiei, timpii de deținere a lock-urilor, latența broadcast-ului, latența
+comandă → publicare și memoria per dispozitiv.
+
+Se rulează din core/:
+    python -m benchmarks.fleet --devices 1000 --rate 5000 --clients 10 --duration 10 --output bench.json
+
+Baza de date nu e folosită: dispozitivele se încarcă direct în mașina de stare, iar task-ul
+de reconciliere a dispozitivelor noi nu pornește.
+"""
+import argparse
+import asyncio
+import bisect
+import gc
+import json
+import platform
+import random
+import sys
+import time
+import tracemalloc
+from datetime import datetime, timezone
+from typing import Any, Dict, List
+
+from config.logging_config import setup_logging, shutdown_logging
+from integration.device_state import DeviceState
+from integration.shelly.common import MQTT_TOPIC_PREFIX, SET_TOPIC
+from services.metrics.metrics import metrics
+from services.mqtt import mqtt_service
+from services.mqtt.publisher import MqttPublisher
+from services.state_machine.device_state_machine import DeviceStateMachine
+from services.websocket.websocket_service import WebSocketManager
+from benchmarks.simulator import FakeMqttClient, FleetSimulator, SyntheticWebSocket, device_ids, summarize
+
+FULL_STATUS = {
+    "ison": False, "mode": "white", "red": 255, "green": 0, "blue": 0, "gain": 100,
+    "temp": 4750, "brightness": 50, "power": 0.0, "energy": 0.0, "online": True,
+}
+
+
+def seed_devices(state_machine: DeviceStateMachine, ids: List[str]):
+    """Populează cache-ul ca initialize_cache, fără baza de date."""
+    for device_id in ids:
+        with state_machine.shard(device_id).lock:
+            state_machine.devices[device_id] = {
+                "id": device_id,
+                "name": device_id,
+                "type": "light",
+                "status": DeviceState(FULL_STATUS),
+            }
+    state_machine.publish_snapshots()
+
+
+def measure_memory_per_device(count: int) -> Dict[str, Any]:
+    """Octeții alocați per dispozitiv din cache (dicționarul înregistrării + DeviceState cu status complet)."""
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    state_machine = DeviceStateMachine()
+    seed_devices(state_machine, device_ids(count))
+    after = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+    allocated = sum(stat.size_diff for stat in after.compare_to(before, "filename"))
+    return {"devices": count, "bytes_total": allocated, "bytes_per_device": allocated / count if count else None}
+
+
+def command_latencies(submitted: Dict[str, List[float]], events) -> List[float]:
+    """Pune fiecare comandă trimisă în pereche cu prima publicare pe același topic, la sau după ea."""
+    published: Dict[str, List[float]] = {}
+    for topic, published_at in events:
+        published.setdefault(topic, []).append(published_at)
+    latencies = []
+    for topic, submit_times in submitted.items():
+        times = sorted(published.get(topic, ()))
+        for submitted_at in submit_times:
+            index = bisect.bisect_left(times, submitted_at)
+            if index < len(times):
+                latencies.append(times[index] - submitted_at)
+    return latencies
+
+
+async def drive_commands(manager: WebSocketManager, websocket, ids: List[str], rate: float,
+                         stop: asyncio.Event, submitted: Dict[str, List[float]]):
+    """Trimite comenzi de luminozitate, ca de la un slider, către dispozitive aleatoare, `rate` pe secundă."""
+    if rate <= 0:
+        await stop.wait()
+        return
+    interval = 1 / rate
+    while not stop.is_set():
+        device_id = random.choice(ids)
+        topic = f"{MQTT_TOPIC_PREFIX}/{device_id}/{SET_TOPIC}"
+        submitted.setdefault(topic, []).append(time.perf_counter())
+        await manager.process_message(websocket, {
+            "command": "set_white_brightness",
+            "device_ids": [device_id],
+            "brightness": random.randint(1, 100),
+        })
+        await asyncio.sleep(interval)
+
+
+async def sample_depth(stop: asyncio.Event, samples: List[int]):
+    while not stop.is_set():
+        samples.append(mqtt_service.ingest.depth)
+        await asyncio.sleep(0.05)
+
+
+async def run_benchmark(args) -> Dict[str, Any]:
+    memory = measure_memory_per_device(args.devices)
+
+    ids = device_ids(args.devices)
+    state_machine = DeviceStateMachine()
+    seed_devices(state_machine, ids)
+
+    fake_client = FakeMqttClient(ack_delay=args.ack_delay)
+    mqtt_service.publisher = MqttPublisher(fake_client, timeout=5)
+    fake_client.on_publish = mqtt_service.publisher.on_publish
+
+    manager = WebSocketManager(state_machine)
+    mqtt_service.configure_mqtt(state_machine, manager)
+    mqtt_service.ingest.start()
+    tasks = [
+        asyncio.create_task(manager.broadcast_status()),
+        asyncio.create_task(state_machine.command_tracker.run()),
+    ]
+    # Lasă bucla de broadcast să înregistreze event loop-ul în mașina de stare.
+    await asyncio.sleep(0)
+
+    simulator = FleetSimulator(ids, args.rate, mqtt_service.on_message, echo_delay=args.echo_delay)
+    fake_client.on_command = simulator.on_command
+
+    protocol = args.protocol if args.protocol != "json" else None
+    clients = [SyntheticWebSocket(simulator if index == 0 else None, protocol) for index in range(max(args.clients, 1))]
+    for websocket in clients:
+        await manager.connect(websocket)
+    command_socket = SyntheticWebSocket()
+    await manager.connect(command_socket)
+
+    ingest = mqtt_service.ingest
+    if args.new_devices:
+        simulator.announce(device_ids(args.devices + args.new_devices)[args.devices:])
+        while ingest.depth:
+            await asyncio.sleep(0.01)
+    received_before, processed_before = ingest.received, ingest.processed
+    stop = asyncio.Event()
+    submitted: Dict[str, List[float]] = {}
+    depth_samples: List[int] = []
+    background = [
+        asyncio.create_task(drive_commands(manager, command_socket, ids, args.command_rate, stop, submitted)),
+        asyncio.create_task(sample_depth(stop, depth_samples)),
+    ]
+
+    started = time.perf_counter()
+    simulator.start()
+    await asyncio.sleep(args.duration)
+    simulator.stop()
+    elapsed = time.perf_counter() - started
+    # Golește ce e deja în coadă înainte de a citi contoarele.
+    while ingest.depth:
+        await asyncio.sleep(0.01)
+    await asyncio.sleep(0.2)
+    stop.set()
+    await asyncio.gather(*background)
+
+    received = ingest.received - received_before
+    processed = ingest.processed - processed_before
+    stats = metrics.as_json()
+    tracker_stats = state_machine.command_tracker.get_stats()
+
+    for task in tasks:
+        task.cancel()
+    manager.scheduler.stop()
+    ingest.stop()
+    fake_client.stop()
+
+    probe = clients[0]
+    return {
+        "benchmark": "fleet",
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "python": platform.python_version(),
+        "config": {
+            "devices": args.devices,
+            "rate": args.rate,
+            "clients": args.clients,
+            "duration": args.duration,
+            "command_rate": args.command_rate,
+            "new_devices": args.new_devices,
+            "echo_delay": args.echo_delay,
+            "ack_delay": args.ack_delay,
+            "protocol": args.protocol,
+        },
+        "ingest": {
+            "received": received,
+            "processed": processed,
+            "dropped": ingest.dropped,
+            "achieved_rate": received / elapsed,
+            "throughput": processed / elapsed,
+            "max_queue_depth": max(depth_samples, default=0),
+            "batches": stats.get("state_batch_messages"),
+        },
+        "lock_hold": stats.get("state_lock_hold_seconds"),
+        "broadcast": {
+            "latency": summarize(probe.broadcast_latencies),
+            "build_seconds": stats.get("ws_broadcast_seconds"),
+            "frames_per_client": sum(c.frames for c in clients) / len(clients),
+            "bytes_per_client": sum(c.bytes for c in clients) / len(clients),
+            "evicted_clients": stats.get("ws_clients_evicted_total"),
+        },
+        "commands": {
+            "submitted": sum(len(times) for times in submitted.values()),
+            "published": len(simulator.command_events),
+            "coalesced": manager.scheduler.coalesced,
+            "submit_to_publish": summarize(command_latencies(submitted, simulator.command_events)),
+            "confirmed": tracker_stats["confirmed"],
+            "timed_out": tracker_stats["timed_out"],
+            "confirm_latency": tracker_stats["by_command"].get("set_white_brightness"),
+        },
+        "memory": memory,
+    }
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Simulate a Shelly fleet against the backend and report JSON metrics")
+    parser.add_argument("--devices", type=int, default=1000, help="number of simulated bulbs")
+    parser.add_argument("--rate", type=float, default=5000, help="total MQTT messages per second from the fleet")
+    parser.add_argument("--clients", type=int, default=10, help="number of synthetic WebSocket clients")
+    parser.add_argument("--duration", type=float, default=10, help="seconds to run")
+    parser.add_argument("--command-rate", type=float, default=20, help="brightness commands per second")
+    parser.add_argument("--new-devices", type=int, default=0, help="extra devices that only announce themselves")
+    parser.add_argument("--echo-delay", type=float, default=0.02, help="seconds before a bulb echoes a command")
+    parser.add_argument("--ack-delay", type=float, default=0.0, help="seconds before the broker PUBACKs a publish")
+    parser.add_argument("--protocol", choices=["json", "homelab.msgpack"], default="json",
+                        help="WebSocket wire format requested by the synthetic clients")
+    parser.add_argument("--output", help="write the JSON result to this file instead of stdout")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    setup_logging(level="WARNING")
+    try:
+        result = asyncio.run(run_benchmark(args))
+    finally:
+        shutdown_logging()
+    text = json.dumps(result, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+    else:
+        sys.stdout.write(text + "\n")
+
+
+if __name__ == "__main__":
+    main()
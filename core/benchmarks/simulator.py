@@ -0,0 +1,246 @@
+"""Înlocuitori în proces pentru brokerul MQTT, becurile Shelly și clienții WebSocket folosiți de benchmark-uri."""
+import json
+import queue
+import threading
+import time
+from types import SimpleNamespace
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import paho.mqtt.client as mqtt
+
+from integration.shelly.common import (
+    MQTT_TOPIC_PREFIX,
+    STATUS_TOPIC,
+    SWITCH_TOPIC,
+    COMMAND_TOPIC,
+    SET_TOPIC,
+    POWER_TOPIC,
+    ONLINE_TOPIC,
+    ANNOUNCE_TOPIC,
+)
+from services.websocket.wire_format import FORMATS
+
+
+def device_ids(count: int) -> List[str]:
+    return [f"shellycolorbulb-{index:012X}" for index in range(count)]
+
+
+class FakeMqttClient:
+    """
+    Înlocuiește Client-ul paho: publish() se întoarce imediat cu un message id, iar
+    PUBACK-ul e livrat dintr-un thread de „rețea” separat, ca la paho. Comenzile pentru
+    un bec simulat sunt predate flotei, ca să poată trimite înapoi noua stare.
+    """
+
+    def __init__(self, ack_delay: float = 0.0):
+        self.ack_delay = ack_delay
+        self.on_publish: Optional[Callable] = None
+        self.on_command: Optional[Callable[[str, str, float], None]] = None
+        self._mid = 0
+        self._lock = threading.Lock()
+        self._acks: "queue.Queue[Tuple[float, int]]" = queue.Queue()
+        self._running = True
+        self._ack_thread = threading.Thread(target=self._ack_loop, name="fake-mqtt-acks", daemon=True)
+        self._ack_thread.start()
+        self.published = 0
+
+    def publish(self, topic: str, payload: str, qos: int = 0):
+        published_at = time.perf_counter()
+        with self._lock:
+            self._mid += 1
+            mid = self._mid
+            self.published += 1
+        if self.on_command is not None:
+            self.on_command(topic, payload, published_at)
+        self._acks.put((time.monotonic() + self.ack_delay, mid))
+        return SimpleNamespace(mid=mid, rc=mqtt.MQTT_ERR_SUCCESS)
+
+    def _ack_loop(self):
+        while self._running:
+            try:
+                due, mid = self._acks.get(timeout=0.1)
+            except queue.Empty:
+                continue
+            delay = due - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            if self.on_publish is not None:
+                self.on_publish(self, None, mid)
+
+    def stop(self):
+        self._running = False
+        self._ack_thread.join(timeout=1)
+
+
+class FleetSimulator:
+    """
+    N becuri Shelly Duo RGBW simulate care publică mesaje announce, color/0/status,
+    light/0/power și online cu o rată totală fixă. Mesajele ajung la on_message dintr-un
+    thread dedicat, ca bucla de rețea paho. Valorile de putere sunt numere de secvență unice,
+    deci momentul injectării fiecăreia poate fi pus în pereche cu ce primesc clienții WebSocket.
+    """
+
+    def __init__(self, ids: List[str], rate: float, on_message: Callable, echo_delay: float = 0.02,
+                 latency_sample_every: int = 10):
+        self.ids = ids
+        self.rate = rate
+        self.on_message = on_message
+        self.echo_delay = echo_delay
+        self.latency_sample_every = latency_sample_every
+        self.sent = 0
+        # valoarea puterii -> perf_counter() la injectare, pentru un eșantion de mesaje de putere
+        self.injected_at: Dict[float, float] = {}
+        # (topic, perf_counter()) pentru fiecare comandă ajunsă la brokerul simulat
+        self.command_events: List[Tuple[str, float]] = []
+        self._echoes: "queue.Queue[Tuple[float, str, bytes]]" = queue.Queue()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._sequence = 0
+
+    def _deliver(self, topic: str, payload: bytes):
+        self.on_message(None, None, SimpleNamespace(topic=topic, payload=payload))
+        self.sent += 1
+
+    def announce(self, ids: List[str]):
+        for device_id in ids:
+            payload = json.dumps({
+                "id": device_id, "model": "SHCB-1", "mac": device_id[-12:], "ip": "10.0.0.1",
+                "new_fw": False, "fw_ver": "20230913-112625/v1.14.0",
+            }).encode()
+            self._deliver(f"{MQTT_TOPIC_PREFIX}/{ANNOUNCE_TOPIC}", payload)
+
+    def _next_message(self) -> Tuple[str, bytes]:
+        self._sequence += 1
+        sequence = self._sequence
+        device_id = self.ids[sequence % len(self.ids)]
+        base = f"{MQTT_TOPIC_PREFIX}/{device_id}"
+        kind = sequence % 10
+        if kind < 6:
+            power = float(sequence)
+            if sequence % self.latency_sample_every == 0:
+                self.injected_at[power] = time.perf_counter()
+            return f"{base}/{POWER_TOPIC}", str(power).encode()
+        if kind < 9:
+            status = {
+                "ison": True, "mode": "white", "red": 255, "green": 0, "blue": 0, "white": 0,
+                "gain": 100, "temp": 3000 + sequence % 3500, "brightness": sequence % 100, "effect": 0,
+            }
+            return f"{base}/{STATUS_TOPIC}", json.dumps(status).encode()
+        return f"{base}/{ONLINE_TOPIC}", b"true"
+
+    def on_command(self, topic: str, payload: str, published_at: float):
+        """Apelat de FakeMqttClient.publish: notează momentul publicării și programează ecoul becului."""
+        if topic.endswith(COMMAND_TOPIC):
+            base = topic[: -len(COMMAND_TOPIC)]
+            self.command_events.append((topic, published_at))
+            self._echoes.put((time.monotonic() + self.echo_delay, base + SWITCH_TOPIC, payload.encode()))
+        elif topic.endswith(SET_TOPIC):
+            base = topic[: -len(SET_TOPIC)]
+            self.command_events.append((topic, published_at))
+            settings = json.loads(payload)
+            status = {"ison": True, "effect": 0}
+            status.update(settings)
+            for key in ("gain", "red", "green", "blue"):
+                if isinstance(status.get(key), str) and status[key].isdigit():
+                    status[key] = int(status[key])
+            self._echoes.put((time.monotonic() + self.echo_delay, base + STATUS_TOPIC, json.dumps(status).encode()))
+
+    def _run(self):
+        interval = 0.005
+        budget = 0.0
+        next_tick = time.perf_counter()
+        while not self._stop.is_set():
+            budget += self.rate * interval
+            while budget >= 1:
+                topic, payload = self._next_message()
+                self._deliver(topic, payload)
+                budget -= 1
+            now = time.monotonic()
+            while not self._echoes.empty():
+                due, topic, payload = self._echoes.queue[0]
+                if due > now:
+                    break
+                self._echoes.get_nowait()
+                self._deliver(topic, payload)
+            next_tick += interval
+            delay = next_tick - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            else:
+                # Rămas în urmă: nu încearcă să recupereze la nesfârșit.
+                next_tick = time.perf_counter()
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="fleet-simulator", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout=2)
+
+
+class SyntheticWebSocket:
+    """
+    Înlocuitor minimal de WebSocket acceptat de WebSocketManager.connect. Numără cadrele și octeții;
+    un client sondă decodează și delta-urile și pune valorile de putere în pereche cu momentele injectării.
+    `protocol` se oferă ca subprotocol WebSocket (de ex. "homelab.msgpack").
+    """
+
+    def __init__(self, simulator: Optional[FleetSimulator] = None, protocol: Optional[str] = None):
+        self.simulator = simulator
+        self.scope = {"type": "websocket", "subprotocols": [protocol] if protocol else []}
+        self.wire = None
+        self.frames = 0
+        self.bytes = 0
+        self.broadcast_latencies: List[float] = []
+        self.closed = False
+
+    async def accept(self, subprotocol: Optional[str] = None):
+        if subprotocol is not None:
+            self.wire = FORMATS[subprotocol]
+
+    async def send_text(self, text: str):
+        self._received(text, lambda: json.loads(text))
+
+    async def send_bytes(self, data: bytes):
+        self._received(data, lambda: self.wire.decode(data))
+
+    def _received(self, data, decode: Callable[[], Any]):
+        received_at = time.perf_counter()
+        self.frames += 1
+        self.bytes += len(data)
+        if self.simulator is None:
+            return
+        message = decode()
+        if message.get("tag") != "delta":
+            return
+        injected_at = self.simulator.injected_at
+        for change in message.get("changes", {}).values():
+            power = change.get("status", {}).get("power")
+            if power is not None:
+                started = injected_at.pop(power, None)
+                if started is not None:
+                    self.broadcast_latencies.append(received_at - started)
+
+    async def close(self):
+        self.closed = True
+
+
+def percentile(samples: List[float], q: float) -> Optional[float]:
+    if not samples:
+        return None
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, max(0, int(round(q * (len(ordered) - 1)))))
+    return ordered[index]
+
+
+def summarize(samples: List[float], scale: float = 1000.0) -> Dict[str, Any]:
+    """count/p50/p99/max pentru o listă de latențe, implicit în milisecunde."""
+    return {
+        "count": len(samples),
+        "p50_ms": percentile(samples, 0.5) * scale if samples else None,
+        "p99_ms": percentile(samples, 0.99) * scale if samples else None,
+        "max_ms": max(samples) * scale if samples else None,
+    }
+
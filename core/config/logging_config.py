@@ -0,0 +1,123 @@
+"""Logging prin coadă și logging cu limită de rată pentru căile fierbinți."""
+import logging
+import logging.handlers
+import queue
+import sys
+import time
+from typing import Dict, Optional, Tuple
+from config.settings import LOG_LEVEL, LOG_LEVELS, LOG_QUEUE_SIZE, LOG_RATE_LIMIT_INTERVAL
+
+LOG_FORMAT = "%(asctime)s %(levelname)-7s %(name)s: %(message)s"
+
+_listener: Optional[logging.handlers.QueueListener] = None
+
+
+class DroppingQueueHandler(logging.handlers.QueueHandler):
+    """
+    QueueHandler care nu blochează apelantul: înregistrările merg într-o coadă limitată și sunt
+    scrise de un thread separat. Cu coada plină înregistrarea se aruncă și se numără.
+    """
+
+    def __init__(self, log_queue: queue.Queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+def parse_level(level: str) -> Optional[int]:
+    """Numele unui nivel ("info", "DEBUG") -> valoarea lui; None dacă nu e un nivel cunoscut."""
+    value = logging.getLevelName(level.strip().upper())
+    return value if isinstance(value, int) else None
+
+
+def parse_levels(spec: str) -> Dict[str, int]:
+    """ "modul=NIVEL,alt.modul=NIVEL" -> nume logger -> nivel; intrările invalide se ignoră."""
+    levels = {}
+    for item in spec.split(","):
+        if "=" not in item:
+            continue
+        name, level = item.split("=", 1)
+        value = parse_level(level)
+        if value is not None:
+            levels[name.strip()] = value
+    return levels
+
+
+def setup_logging(level: str = LOG_LEVEL, levels: str = LOG_LEVELS, queue_size: int = LOG_QUEUE_SIZE):
+    """
+    Trimite logger-ul rădăcină printr-o coadă limitată către stderr, scris dintr-un thread separat.
+    Se poate apela de mai multe ori; doar primul apel instalează handler-ele.
+    Un LOG_LEVEL necunoscut revine la INFO, cu un avertisment.
+    """
+    global _listener
+    if _listener is not None:
+        return
+    log_queue: queue.Queue = queue.Queue(maxsize=queue_size)
+    stream = logging.StreamHandler(sys.stderr)
+    stream.setFormatter(logging.Formatter(LOG_FORMAT))
+
+    root = logging.getLogger()
+    root.handlers[:] = [DroppingQueueHandler(log_queue)]
+    root_level = parse_level(level)
+    root.setLevel(logging.INFO if root_level is None else root_level)
+    for name, module_level in parse_levels(levels).items():
+        logging.getLogger(name).setLevel(module_level)
+
+    _listener = logging.handlers.QueueListener(log_queue, stream, respect_handler_level=True)
+    _listener.start()
+    if root_level is None:
+        logging.getLogger(__name__).warning("Unknown LOG_LEVEL %r, using INFO", level)
+
+
+def shutdown_logging():
+    """Scrie înregistrările rămase în coadă și oprește thread-ul."""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+class RateLimitedLogger:
+    """
+    Scrie un mesaj cu o anumită cheie cel mult o dată pe interval și raportează câte repetări
+    au fost suprimate. Pentru evenimente per mesaj (erori de parsare, mesaje aruncate) care se pot
+    repeta de mii de ori pe secundă; cu nivelul dezactivat costul e un singur isEnabledFor().
+    """
+
+    def __init__(self, logger: logging.Logger, interval: float = LOG_RATE_LIMIT_INTERVAL):
+        self.logger = logger
+        self.interval = interval
+        # cheie -> (momentul ultimei înregistrări scrise, repetări suprimate de atunci)
+        self._last: Dict[str, Tuple[float, int]] = {}
+
+    def log(self, level: int, key: str, msg: str, *args, **kwargs):
+        if not self.logger.isEnabledFor(level):
+            return
+        now = time.monotonic()
+        last = self._last.get(key)
+        if last is not None and now - last[0] < self.interval:
+            self._last[key] = (last[0], last[1] + 1)
+            return
+        suppressed = last[1] if last is not None else 0
+        self._last[key] = (now, 0)
+        if suppressed:
+            msg = f"{msg} (%d similar messages suppressed)"
+            args = args + (suppressed,)
+        self.logger.log(level, msg, *args, **kwargs)
+
+    def debug(self, key: str, msg: str, *args, **kwargs):
+        self.log(logging.DEBUG, key, msg, *args, **kwargs)
+
+    def info(self, key: str, msg: str, *args, **kwargs):
+        self.log(logging.INFO, key, msg, *args, **kwargs)
+
+    def warning(self, key: str, msg: str, *args, **kwargs):
+        self.log(logging.WARNING, key, msg, *args, **kwargs)
+
+    def error(self, key: str, msg: str, *args, **kwargs):
+        self.log(logging.ERROR, key, msg, *args, **kwargs)
@@ -6,3 +6,73 @@ load_dotenv()
 DATABASE_URL = os.getenv("DATABASE_URL")
 MQTT_BROKER = os.getenv("MQTT_BROKER")
 MQTT_PORT = int(os.getenv("MQTT_PORT", 1883))
+
+# WebSocket delta broadcasts
+BROADCAST_COALESCE_MS = int(os.getenv("BROADCAST_COALESCE_MS", 50))
+# Per state shard
+CHANGE_LOG_SIZE = int(os.getenv("CHANGE_LOG_SIZE", 5000))
+
+# Per-client WebSocket send queues
+WS_SEND_QUEUE_SIZE = int(os.getenv("WS_SEND_QUEUE_SIZE", 64))
+WS_SLOW_CLIENT_TIMEOUT = float(os.getenv("WS_SLOW_CLIENT_TIMEOUT", 10))
+
+# Binary (MessagePack) WebSocket frames of at least this many bytes are zlib-compressed; 0 disables
+WS_COMPRESS_MIN_BYTES = int(os.getenv("WS_COMPRESS_MIN_BYTES", 4096))
+WS_COMPRESS_LEVEL = int(os.getenv("WS_COMPRESS_LEVEL", 6))
+# Pipelined commands (with "request_id") running at once per connection, and commands per batch frame
+WS_MAX_INFLIGHT_COMMANDS = int(os.getenv("WS_MAX_INFLIGHT_COMMANDS", 32))
+WS_MAX_BATCH_SIZE = int(os.getenv("WS_MAX_BATCH_SIZE", 100))
+
+# MQTT ingest pipeline
+MQTT_INGEST_QUEUE_SIZE = int(os.getenv("MQTT_INGEST_QUEUE_SIZE", 10000))
+MQTT_INGEST_BATCH_SIZE = int(os.getenv("MQTT_INGEST_BATCH_SIZE", 500))
+
+# Write-behind persistence of live device state
+PERSIST_FLUSH_INTERVAL = float(os.getenv("PERSIST_FLUSH_INTERVAL", 5))
+PERSIST_FLUSH_THRESHOLD = int(os.getenv("PERSIST_FLUSH_THRESHOLD", 200))
+
+# MQTT publishing
+MQTT_PUBLISH_QOS = int(os.getenv("MQTT_PUBLISH_QOS", 1))
+MQTT_PUBLISH_TIMEOUT = float(os.getenv("MQTT_PUBLISH_TIMEOUT", 5))
+
+# Command scheduling (slider bursts)
+COMMAND_RATE_PER_DEVICE = float(os.getenv("COMMAND_RATE_PER_DEVICE", 5))
+# Seconds to wait for a device to echo a command before rolling back its optimistic state
+COMMAND_CONFIRM_TIMEOUT = float(os.getenv("COMMAND_CONFIRM_TIMEOUT", 5))
+
+# Logging
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
+# Per-module overrides, e.g. "services.mqtt=DEBUG,services.websocket=WARNING"
+LOG_LEVELS = os.getenv("LOG_LEVELS", "")
+LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", 10000))
+# Minimum seconds between repeats of the same rate-limited hot-path log message
+LOG_RATE_LIMIT_INTERVAL = float(os.getenv("LOG_RATE_LIMIT_INTERVAL", 10))
+
+# Power/energy time series
+# Raw samples kept in memory per device and metric
+TIMESERIES_RING_SIZE = int(os.getenv("TIMESERIES_RING_SIZE", 720))
+TIMESERIES_FLUSH_INTERVAL = float(os.getenv("TIMESERIES_FLUSH_INTERVAL", 60))
+# Unwritten rollup rows kept while the database is unavailable; the oldest are dropped beyond this
+TIMESERIES_MAX_PENDING_ROWS = int(os.getenv("TIMESERIES_MAX_PENDING_ROWS", 100000))
+# Minute rollups older than this are pruned; hour and day rollups are kept
+TIMESERIES_MINUTE_RETENTION_DAYS = float(os.getenv("TIMESERIES_MINUTE_RETENTION_DAYS", 7))
+
+# Energy analytics
+# Days of hourly data kept in memory for reports
+ANALYTICS_WINDOW_DAYS = int(os.getenv("ANALYTICS_WINDOW_DAYS", 35))
+# Hourly average power at or above which a device's quietest hours count as standby draw
+ANALYTICS_STANDBY_WATTS = float(os.getenv("ANALYTICS_STANDBY_WATTS", 1.0))
+# Price per kWh outside any tariff window
+ENERGY_PRICE = float(os.getenv("ENERGY_PRICE", 0))
+# Tariff windows in local hours, e.g. "0-7=0.45,7-23=0.89,23-24=0.45"
+ENERGY_TARIFFS = os.getenv("ENERGY_TARIFFS", "")
+
+# Device state partitions, each with its own lock, version and change log
+STATE_SHARDS = int(os.getenv("STATE_SHARDS", 16))
+
+# Cached REST views of devices and rooms
+# Default and maximum page size for GET /api/devices
+REST_PAGE_SIZE = int(os.getenv("REST_PAGE_SIZE", 500))
+REST_MAX_PAGE_SIZE = int(os.getenv("REST_MAX_PAGE_SIZE", 5000))
+# Serialized responses kept by ETag
+REST_CACHE_SIZE = int(os.getenv("REST_CACHE_SIZE", 64))
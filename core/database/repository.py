@@ -0,0 +1,158 @@
+import json
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+from database import db
+from services.metrics.metrics import metrics
+
+DB_SECONDS = metrics.histogram("db_query_seconds", "Entity repository call duration", ("operation",))
+
+
+async def ensure_connected():
+    """Deschide conexiunea partajată dacă nu e deja deschisă (ex. scripturi din afara lifespan)."""
+    if not db.is_connected():
+        await db.connect()
+
+
+def entity_data_from_announce(device_data: Dict[str, Any]) -> Dict[str, Any]:
+    """Construiește rândul Entity pentru un dispozitiv anunțat (id, model, manufacturer)."""
+    return {
+        "id": device_data["id"],
+        "name": device_data["id"],
+        "type": "light" if device_data["model"] == "SHCB-1" else "outlet",
+        "manufacturer": device_data["manufacturer"],
+        "model": device_data["model"],
+        "status": json.dumps({"ison": False}),
+        "config": json.dumps({}),
+    }
+
+
+class EntityRepository:
+    """
+    Acces la tabela Entity prin clientul Prisma partajat din database.db.
+    Operațiile în masă folosesc un singur batch (o tranzacție, un round trip)
+    în loc de câte o conexiune și o interogare per dispozitiv.
+    """
+
+    def __init__(self, client=db):
+        self.db = client
+
+    async def find_many(self, device_type: Optional[str] = None, manufacturer: Optional[str] = None):
+        await ensure_connected()
+        filters = {}
+        if device_type:
+            filters["type"] = device_type
+        if manufacturer:
+            filters["manufacturer"] = manufacturer
+        with DB_SECONDS.labels("find_many").time():
+            return await self.db.entity.find_many(where=filters)
+
+    async def find_many_by_ids(self, ids: Iterable[str]):
+        ids = list(ids)
+        if not ids:
+            return []
+        await ensure_connected()
+        with DB_SECONDS.labels("find_many_by_ids").time():
+            return await self.db.entity.find_many(where={"id": {"in": ids}})
+
+    async def create_many(self, rows: List[Dict[str, Any]]) -> int:
+        """
+        Inserează mai multe entități într-o singură tranzacție.
+        SQLite nu suportă createMany în Prisma, așa că se folosește un batch de create-uri.
+        """
+        if not rows:
+            return 0
+        await ensure_connected()
+        with DB_SECONDS.labels("create_many").time():
+            async with self.db.batch_() as batcher:
+                for row in rows:
+                    batcher.entity.create(data=row)
+        return len(rows)
+
+    async def set_statuses(self, rows: Dict[str, Tuple[Dict[str, Any], datetime]]) -> int:
+        """Scrie statusul complet și lastUpdated pentru mai multe entități într-o tranzacție."""
+        if not rows:
+            return 0
+        await ensure_connected()
+        with DB_SECONDS.labels("set_statuses").time():
+            async with self.db.batch_() as batcher:
+                for device_id, (status, last_updated) in rows.items():
+                    batcher.entity.update_many(
+                        where={"id": device_id},
+                        data={"status": json.dumps(status), "lastUpdated": last_updated},
+                    )
+        return len(rows)
+
+    async def merge_statuses(self, updates: Dict[str, Dict[str, Any]]) -> List[str]:
+        """
+        Combină câmpurile primite cu statusul salvat, pentru mai multe entități:
+        o citire (find_many cu id in ...) și o tranzacție de scriere.
+        Întoarce id-urile care nu există în baza de date.
+        """
+        if not updates:
+            return []
+        entities = await self.find_many_by_ids(updates.keys())
+        found = {entity.id: entity for entity in entities}
+        with DB_SECONDS.labels("merge_statuses").time():
+            async with self.db.batch_() as batcher:
+                for device_id, entity in found.items():
+                    status = json.loads(entity.status or "{}")
+                    status.update(updates[device_id])
+                    batcher.entity.update(where={"id": device_id}, data={"status": json.dumps(status)})
+        return [device_id for device_id in updates if device_id not in found]
+
+
+entity_repository = EntityRepository()
+
+
+class RollupRepository:
+    """Rollup-urile de putere și energie (tabela MetricRollup), scrise și citite în loturi."""
+
+    def __init__(self, client=db):
+        self.db = client
+
+    async def create_many(self, rows: List[Dict[str, Any]]) -> int:
+        if not rows:
+            return 0
+        await ensure_connected()
+        with DB_SECONDS.labels("rollups_create_many").time():
+            async with self.db.batch_() as batcher:
+                for row in rows:
+                    batcher.metricrollup.create(data=row)
+        return len(rows)
+
+    async def find_range(self, device_ids: Iterable[str], metric: str, resolution: str,
+                         start: datetime, end: datetime):
+        ids = list(device_ids)
+        if not ids:
+            return []
+        await ensure_connected()
+        with DB_SECONDS.labels("rollups_find_range").time():
+            return await self.db.metricrollup.find_many(
+                where={
+                    "entityId": {"in": ids},
+                    "metric": metric,
+                    "resolution": resolution,
+                    "bucket": {"gte": start, "lte": end},
+                },
+                order={"bucket": "asc"},
+            )
+
+    async def find_after(self, last_id: int, resolution: str, since: datetime, limit: int = 50000):
+        """Rollup-urile cu id > last_id (scrise după ultima citire), în ordinea id-ului."""
+        await ensure_connected()
+        with DB_SECONDS.labels("rollups_find_after").time():
+            return await self.db.metricrollup.find_many(
+                where={"id": {"gt": last_id}, "resolution": resolution, "bucket": {"gte": since}},
+                order={"id": "asc"},
+                take=limit,
+            )
+
+    async def delete_before(self, resolution: str, cutoff: datetime) -> int:
+        await ensure_connected()
+        with DB_SECONDS.labels("rollups_delete_before").time():
+            return await self.db.metricrollup.delete_many(
+                where={"resolution": resolution, "bucket": {"lt": cutoff}}
+            )
+
+
+rollup_repository = RollupRepository()
@@ -1,11 +1,20 @@
 from abc import ABC, abstractmethod
-from typing import Dict, Any
+from typing import Dict, Any, Optional
 import logging
+from integration.device_state import DeviceState
 
 logger = logging.getLogger(__name__)
 
 class BaseDevice(ABC):
     """Base abstract class for device implementations"""
+
+    # Default status values for a freshly created device of this type
+    status_defaults: Dict[str, Any] = {}
+
+    @classmethod
+    def create_state(cls, values: Optional[Dict[str, Any]] = None) -> DeviceState:
+        """Create the compact status record for this device type, with defaults applied"""
+        return DeviceState({**cls.status_defaults, **(values or {})})
     
     @property
     @abstractmethod
@@ -0,0 +1,137 @@
+"""Compact, typed device state shared by all integrations"""
+from collections.abc import Mapping
+from typing import Any, Dict, Iterator, Optional
+
+# Typed status fields, in bit order. red/green/blue together form the RGB colour.
+FIELD_TYPES = {
+    "ison": bool,
+    "mode": str,
+    "brightness": int,
+    "temp": int,
+    "red": int,
+    "green": int,
+    "blue": int,
+    "gain": int,
+    "power": float,
+    "energy": float,
+    "online": bool,
+    "last_seen": float,
+}
+FIELDS = tuple(FIELD_TYPES)
+FIELD_BITS = {name: 1 << index for index, name in enumerate(FIELDS)}
+
+
+def _coerce(field: str, value: Any) -> Any:
+    """Convert a value to the field's type when it is safe to do so; otherwise keep it as-is"""
+    expected = FIELD_TYPES[field]
+    if value is None or isinstance(value, bool) and expected is not bool:
+        return value
+    if expected is bool:
+        return bool(value) if isinstance(value, int) and value in (0, 1) else value
+    if expected is int and isinstance(value, float):
+        # Integral readings may arrive as 40.0; fractional ones are kept rather than truncated
+        return int(value) if value.is_integer() else value
+    if expected is float and isinstance(value, int):
+        return float(value)
+    return value
+
+
+class DeviceState(Mapping):
+    """
+    Slotted status record for one device.
+
+    Known fields live in slots instead of a per-device dict; unknown keys go to `extra`.
+    `present` marks which fields have been set, so the mapping view contains exactly
+    the keys a plain status dict would. `apply()` returns the fields that actually changed,
+    which the state machine uses for deltas and to mark the device for persistence.
+    """
+
+    __slots__ = FIELDS + ("present", "extra")
+
+    def __init__(self, values: Optional[Dict[str, Any]] = None):
+        for field in FIELDS:
+            setattr(self, field, None)
+        self.present = 0
+        self.extra: Optional[Dict[str, Any]] = None
+        if values:
+            self.apply(values)
+
+    def apply(self, values: Dict[str, Any]) -> Dict[str, Any]:
+        """Apply status values and return only those that actually changed"""
+        changed = {}
+        for key, value in values.items():
+            bit = FIELD_BITS.get(key)
+            if bit is None:
+                extra = self.extra
+                if extra is None:
+                    extra = self.extra = {}
+                elif key in extra and extra[key] == value:
+                    continue
+                extra[key] = value
+                changed[key] = value
+                continue
+
+            value = _coerce(key, value)
+            if self.present & bit and getattr(self, key) == value:
+                continue
+            setattr(self, key, value)
+            self.present |= bit
+            changed[key] = value
+        return changed
+
+    def update(self, values: Dict[str, Any]):
+        self.apply(values)
+
+    def discard(self, key: str) -> bool:
+        """Remove a field from the state; return whether it was set"""
+        bit = FIELD_BITS.get(key)
+        if bit is None:
+            if self.extra and key in self.extra:
+                del self.extra[key]
+                return True
+            return False
+        if not self.present & bit:
+            return False
+        setattr(self, key, None)
+        self.present &= ~bit
+        return True
+
+    def touch(self, timestamp: float):
+        """Record when the device was last heard from, without marking the state changed"""
+        self.last_seen = timestamp
+        self.present |= FIELD_BITS["last_seen"]
+
+    def as_dict(self) -> Dict[str, Any]:
+        result = {field: getattr(self, field) for field, bit in FIELD_BITS.items() if self.present & bit}
+        if self.extra:
+            result.update(self.extra)
+        return result
+
+    def __getitem__(self, key: str) -> Any:
+        bit = FIELD_BITS.get(key)
+        if bit is not None:
+            if self.present & bit:
+                return getattr(self, key)
+        elif self.extra and key in self.extra:
+            return self.extra[key]
+        raise KeyError(key)
+
+    def __iter__(self) -> Iterator[str]:
+        for field, bit in FIELD_BITS.items():
+            if self.present & bit:
+                yield field
+        if self.extra:
+            yield from self.extra
+
+    def __len__(self) -> int:
+        return bin(self.present).count("1") + (len(self.extra) if self.extra else 0)
+
+    def __repr__(self) -> str:
+        return f"DeviceState({self.as_dict()!r})"
+
+
+def json_default(obj: Any) -> Any:
+    """`default` hook for json.dumps so DeviceState serializes like a plain status dict"""
+    if isinstance(obj, DeviceState):
+        return obj.as_dict()
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
@@ -1,27 +1,82 @@
 """Shared functionality for Shelly devices"""
+import json
+from typing import Any, Dict
 
 MQTT_TOPIC_PREFIX = "shellies"
 
+# Topic layouts relative to shellies/<shelly_id>/
+STATUS_TOPIC = "color/0/status"
+SWITCH_TOPIC = "color/0"
+COMMAND_TOPIC = "color/0/command"
+SET_TOPIC = "color/0/set"
+POWER_TOPIC = "light/0/power"
+ENERGY_TOPIC = "light/0/energy"
+ONLINE_TOPIC = "online"
+ANNOUNCE_TOPIC = "announce"
+
 def get_status_topic(shelly_id: str) -> str:
     """Get the status topic for a Shelly device"""
-    return f"{MQTT_TOPIC_PREFIX}/{shelly_id}/color/0/status"
+    return f"{MQTT_TOPIC_PREFIX}/{shelly_id}/{STATUS_TOPIC}"
 
 def get_command_topic(shelly_id: str) -> str:
     """Get the command topic for a Shelly device"""
-    return f"{MQTT_TOPIC_PREFIX}/{shelly_id}/color/0/command"
+    return f"{MQTT_TOPIC_PREFIX}/{shelly_id}/{COMMAND_TOPIC}"
 
 def get_set_topic(shelly_id: str) -> str:
     """Get the set topic for a Shelly device"""
-    return f"{MQTT_TOPIC_PREFIX}/{shelly_id}/color/0/set"
+    return f"{MQTT_TOPIC_PREFIX}/{shelly_id}/{SET_TOPIC}"
 
 def get_power_topic(shelly_id: str) -> str:
     """Get the power consumption topic for a Shelly device"""
-    return f"{MQTT_TOPIC_PREFIX}/{shelly_id}/light/0/power"
+    return f"{MQTT_TOPIC_PREFIX}/{shelly_id}/{POWER_TOPIC}"
 
 def get_energy_topic(shelly_id: str) -> str:
     """Get the energy consumption topic for a Shelly device"""
-    return f"{MQTT_TOPIC_PREFIX}/{shelly_id}/light/0/energy"
+    return f"{MQTT_TOPIC_PREFIX}/{shelly_id}/{ENERGY_TOPIC}"
 
 def get_online_topic(shelly_id: str) -> str:
     """Get the online status topic for a Shelly device"""
-    return f"{MQTT_TOPIC_PREFIX}/{shelly_id}/online"
\ No newline at end of file
+    return f"{MQTT_TOPIC_PREFIX}/{shelly_id}/{ONLINE_TOPIC}"
+
+
+def parse_json_object(payload: str) -> Dict[str, Any]:
+    """Parse a JSON status object payload"""
+    value = json.loads(payload)
+    if not isinstance(value, dict):
+        raise ValueError(f"Expected a JSON object, got {payload!r}")
+    return value
+
+def parse_number(payload: str) -> float:
+    """Parse a numeric payload (power in W, energy in watt-minutes)"""
+    value = json.loads(payload)
+    if isinstance(value, bool) or not isinstance(value, (int, float)):
+        raise ValueError(f"Expected a number, got {payload!r}")
+    return value
+
+def parse_on_off(payload: str) -> bool:
+    """Parse an "on"/"off" switch payload"""
+    value = payload.strip().lower()
+    if value not in ("on", "off"):
+        raise ValueError(f"Expected on/off, got {payload!r}")
+    return value == "on"
+
+def parse_bool(payload: str) -> bool:
+    """Parse a "true"/"false" payload"""
+    value = payload.strip().lower()
+    if value not in ("true", "false"):
+        raise ValueError(f"Expected true/false, got {payload!r}")
+    return value == "true"
+
+
+# MQTT routes published by Shelly devices, relative to MQTT_TOPIC_PREFIX.
+# "+" marks the device id segment. Each entry: (pattern, channel, field, payload parser);
+# field None means the payload is a status object merged as-is.
+TOPIC_ROUTES = [
+    (ANNOUNCE_TOPIC, None, "announce", parse_json_object),
+    (f"+/{ANNOUNCE_TOPIC}", None, "announce", parse_json_object),
+    (f"+/{STATUS_TOPIC}", "color/0", None, parse_json_object),
+    (f"+/{SWITCH_TOPIC}", "color/0", "ison", parse_on_off),
+    (f"+/{POWER_TOPIC}", "light/0", "power", parse_number),
+    (f"+/{ENERGY_TOPIC}", "light/0", "energy", parse_number),
+    (f"+/{ONLINE_TOPIC}", None, "online", parse_bool),
+]
@@ -1,12 +1,8 @@
-import json
-import os
 import logging
-import time
-from prisma import Prisma
-from typing import Dict, Any
+from typing import Dict, Any, List
+from database.repository import entity_repository, entity_data_from_announce
 
 DEVICES_FILE = "devices.json"
-db = Prisma() 
 
 async def load_devices(device_type=None, manufacturer=None):
     """
@@ -15,16 +11,7 @@ async def load_devices(device_type=None, manufacturer=None):
     :param manufacturer: The manufacturer to filter by.
     :return: A list of devices matching the criteria.
     """
-    await db.connect()
-    filters = {}
-    if device_type:
-        filters["type"] = device_type
-    if manufacturer:
-        filters["manufacturer"] = manufacturer
-
-    devices = await db.entity.find_many(where=filters)
-    await db.disconnect()
-    return devices
+    return await entity_repository.find_many(device_type, manufacturer)
 
 
 async def update_device_status(device_id, status_details):
@@ -33,21 +20,18 @@ async def update_device_status(device_id, status_details):
     :param device_id: The ID of the device to update.
     :param status_details: A dictionary containing the new status details.
     """
-    await db.connect()
-    device = await db.entity.find_unique(where={"id": device_id})
-    if not device:
-        await db.disconnect()
+    missing = await entity_repository.merge_statuses({device_id: status_details})
+    if missing:
         raise ValueError(f"Device with ID {device_id} not found.")
 
 
-    current_status = json.loads(device.status or "{}")
-    current_status.update(status_details)
-
-    await db.entity.update(
-        where={"id": device_id},
-        data={"status": json.dumps(current_status)}
-    )
-    await db.disconnect()
+async def update_device_statuses(statuses: Dict[str, Dict[str, Any]]) -> List[str]:
+    """
+    Update the status of several devices in one transaction.
+    :param statuses: device_id -> status details to merge.
+    :return: The IDs that were not found in the database.
+    """
+    return await entity_repository.merge_statuses(statuses)
 
 
 async def add_device_to_db(device_data: Dict[str, Any]):
@@ -55,18 +39,12 @@ async def add_device_to_db(device_data: Dict[str, Any]):
     Adaugă un dispozitiv nou în baza de date.
     :param device_data: Datele dispozitivului (id, model, etc.)
     """
-    await db.connect()
-    try:
-        await db.entity.create(
-            data={
-                "id": device_data["id"],
-                "name": device_data["id"],  
-                "type": "light" if device_data["model"] == "SHCB-1" else "outlet",  
-                "manufacturer": device_data["manufacturer"],
-                "model": device_data["model"],
-                "status": json.dumps({"ison": False}), 
-                "config": json.dumps({}), 
-            }
-        )
-    finally:
-        await db.disconnect()
\ No newline at end of file
+    await entity_repository.create_many([entity_data_from_announce(device_data)])
+
+
+async def add_devices_to_db(devices_data: List[Dict[str, Any]]) -> int:
+    """
+    Adaugă mai multe dispozitive noi într-o singură tranzacție.
+    :param devices_data: Lista de dispozitive (id, model, manufacturer)
+    """
+    return await entity_repository.create_many([entity_data_from_announce(d) for d in devices_data])
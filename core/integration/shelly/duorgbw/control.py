@@ -1,9 +1,11 @@
-from typing import Dict, Any, List
+from typing import Dict, Any, List, Tuple
 import logging
 from integration.base_model import BaseDevice
 import paho.mqtt.client as mqtt
 from services.mqtt import mqtt_service
 from integration.shelly.device_manager import load_devices, update_device_status
+from integration.shelly.duorgbw.schemas import ColorBulbStatus
+from integration.shelly.common import get_command_topic, get_set_topic
 import json
 
 
@@ -14,25 +16,13 @@ class ShellyColorBulb(BaseDevice):
     
     manufacturer = "shelly"
     device_type = "duorgbw"
+    status_defaults = ColorBulbStatus().model_dump()
     
     def __init__(self, device_id: str, shelly_id: str = None, name: str = None, **kwargs):
         self._device_id = device_id
         self._shelly_id = shelly_id or device_id
         self._name = name or device_id
-        self._status = {
-            "ison": False,
-            "mode": "color",
-            "brightness": 100,
-            "temp": 4750,
-            "red": 255,
-            "green": 255,
-            "blue": 255,
-            "gain": 100,
-            "power": 0,
-            "energy": 0,
-            "online": False
-        }
-        self._status.update(kwargs)
+        self._status = self.create_state(kwargs)
         
 
     @property
@@ -49,102 +39,131 @@ class ShellyColorBulb(BaseDevice):
         
 
     def get_status(self) -> Dict[str, Any]:
-        return self._status.copy()
+        return self._status.as_dict()
         
     def update_status(self, status_data: Dict[str, Any]) -> bool:
-        self._status.update(status_data)
+        self._status.apply(status_data)
         return True
 
 
 async def turn_on(device_id: str) -> bool:
     """Turn on a device"""
-
-    topic = f"shellies/{device_id}/color/0/command"
-    payload = "on"
-        
-
-    result = await mqtt_service.safe_publish(topic, payload)
-        
-    return result.rc == mqtt.MQTT_ERR_SUCCESS
+    result = await mqtt_service.publish_many([(device_id, get_command_topic(device_id), "on")])
+    return result.get(device_id, False)
 
 async def turn_off(device_id: str) -> bool:
+    """Turn off a device"""
+    result = await mqtt_service.publish_many([(device_id, get_command_topic(device_id), "off")])
+    return result.get(device_id, False)
 
-    topic = f"shellies/{device_id}/color/0/command"
-    payload = "off"
-
-    mqtt_service.safe_publish(topic, payload)
-        
 async def turn_on_multiple(device_ids: List[str]) -> Dict[str, bool]:
-    
-    for device_id in device_ids :
-        topic = f"shellies/{device_id}/color/0/command"
-        payload = "on"
-        mqtt_service.safe_publish(topic, payload)
-        
-    
+    """Turn on multiple devices in one publish burst"""
+    return await mqtt_service.publish_many(
+        [(device_id, get_command_topic(device_id), "on") for device_id in device_ids]
+    )
+
 async def turn_off_multiple(device_ids: List[str]) -> Dict[str, bool]:
-    
-    for device_id in device_ids :
-        topic = f"shellies/{device_id}/color/0/command"
-        payload = "off"
-        mqtt_service.safe_publish(topic, payload)
+    """Turn off multiple devices in one publish burst"""
+    return await mqtt_service.publish_many(
+        [(device_id, get_command_topic(device_id), "off") for device_id in device_ids]
+    )
+
+async def _set_many(device_ids: List[str], settings: Dict[str, Any]) -> Dict[str, bool]:
+    """Publish the same color/0/set payload to every device and return the per-device PUBACK result"""
+    payload = json.dumps(settings)
+    return await mqtt_service.publish_many(
+        [(device_id, get_set_topic(device_id), payload) for device_id in device_ids]
+    )
+
+async def send_batch(commands: Dict[Tuple[str, str], Any]) -> Dict[Tuple[str, str], bool]:
+    """
+    Publish scheduled commands in one burst.
+    Keys are (device_id, channel): "command" sends an on/off string, "set" sends a color/0/set JSON payload.
+    """
+    messages = []
+    for key, value in commands.items():
+        device_id, channel = key
+        if channel == "command":
+            messages.append((key, get_command_topic(device_id), value))
+        else:
+            messages.append((key, get_set_topic(device_id), json.dumps(value)))
+    return await mqtt_service.publish_many(messages)
+
+# color/0/set keys echoed back in color/0/status once the bulb applies them
+EXPECTED_SET_FIELDS = ("mode", "brightness", "temp", "red", "green", "blue", "gain")
+
+def expected_state(channel: str, value: Any) -> Dict[str, Any]:
+    """Status fields a scheduled command should produce once the device has applied it"""
+    if channel == "command":
+        return {"ison": value == "on"} if value in ("on", "off") else {}
+    if channel == "set" and isinstance(value, dict):
+        expected = {}
+        for field in EXPECTED_SET_FIELDS:
+            if field in value:
+                field_value = value[field]
+                if isinstance(field_value, str) and field_value.isdigit():
+                    field_value = int(field_value)
+                expected[field] = field_value
+        return expected
+    return {}
+
+def color_mode_settings() -> Dict[str, Any]:
+    return {
+        "mode": "color",
+        "red": "255",
+        "green" : "0",
+        "blue" : "0",
+        "gain" : "100"
+    }
+
+def color_settings(red, green, blue) -> Dict[str, Any]:
+    return {
+        "mode": "color",
+        "red": red,
+        "green" : green,
+        "blue" : blue,
+        "gain" : "100"
+    }
+
+def white_mode_settings() -> Dict[str, Any]:
+    return {
+        "mode": "white",
+        "red": "255",
+        "green" : "0",
+        "blue" : "0",
+        "gain" : "100"
+    }
+
+def white_brightness_settings(brightness: int) -> Dict[str, Any]:
+    return {
+        "mode": "white",
+        "brightness": brightness,
+        "gain" : "100"
+    }
+
+def white_temperature_settings(temp: int) -> Dict[str, Any]:
+    return {
+        "mode": "white",
+        "temp": temp,
+        "gain" : "100"
+    }
 
 async def set_color_mode(device_ids: List[str]) -> Dict[str, bool]:
     """Set the same color for multiple devices through the command queue"""
-    for device_id in device_ids :
-        topic = f"shellies/{device_id}/color/0/set"
-        payload = json.dumps({
-                "mode": "color",
-                "red": "255",
-                "green" : "0",
-                "blue" : "0",
-                "gain" : "100"                
-            })
-        mqtt_service.safe_publish(topic, payload)
+    return await _set_many(device_ids, color_mode_settings())
 
 async def set_color(device_ids: List[str], red, green, blue) -> Dict[str, bool]:
     """Set the same color for multiple devices through the command queue"""
-    for device_id in device_ids :
-        topic = f"shellies/{device_id}/color/0/set"
-        payload = json.dumps({
-                "mode": "color",
-                "red": red,
-                "green" : green,
-                "blue" : blue,
-                "gain" : "100"                
-            })
-        mqtt_service.safe_publish(topic, payload)
+    return await _set_many(device_ids, color_settings(red, green, blue))
 
 async def set_white_mode(device_ids: List[str]) -> Dict[str, bool]:
     """Set the same color for multiple devices through the command queue"""
-    for device_id in device_ids :
-        topic = f"shellies/{device_id}/color/0/set"
-        payload = json.dumps({
-                "mode": "white",
-                "red": "255",
-                "green" : "0",
-                "blue" : "0",
-                "gain" : "100"                
-            })
-        mqtt_service.safe_publish(topic, payload)
+    return await _set_many(device_ids, white_mode_settings())
+
 async def set_white_brightness(device_ids: List[str], brightness: int) -> Dict[str, bool]:
     """Set the same brightness for multiple devices through the command queue"""
-    for device_id in device_ids :
-        topic = f"shellies/{device_id}/color/0/set"
-        payload = json.dumps({
-                "mode": "white",
-                "brightness": brightness,
-                "gain" : "100"                
-            })
-        mqtt_service.safe_publish(topic, payload)
+    return await _set_many(device_ids, white_brightness_settings(brightness))
 
 async def set_white_temperature(device_ids: List[str], temp: int) -> Dict[str, bool]:
     """Set the same color temperature for multiple devices"""
-    for device_id in device_ids :
-        topic = f"shellies/{device_id}/color/0/set"
-        payload = json.dumps({
-                "mode": "white",
-                "temp": temp,
-                "gain" : "100"                
-            })
-        mqtt_service.safe_publish(topic, payload)
+    return await _set_many(device_ids, white_temperature_settings(temp))
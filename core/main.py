@@ -3,17 +3,25 @@ import asyncio
 from fastapi import FastAPI, WebSocket, WebSocketDisconnect
 from contextlib import asynccontextmanager
 from database import connect_db, disconnect_db
-from services.mqtt.mqtt_service import start_mqtt, state_machine, configure_mqtt
+from services.mqtt.mqtt_service import start_mqtt, stop_mqtt, state_machine, configure_mqtt
 from services.websocket.websocket_service import WebSocketManager
 from api.routes import router
-import traceback
 import logging
+from config.logging_config import setup_logging, shutdown_logging
 from services.state_machine.device_state_machine import DeviceStateMachine
+from services.persistence.state_persister import StatePersister
+from services.timeseries.rollup_writer import RollupWriter
+from services.analytics.energy_analytics import EnergyAnalytics
 from integration.shelly.duorgbw.control import turn_off
+setup_logging()
 logger = logging.getLogger(__name__)
 
 state_machine = DeviceStateMachine()
 websocket_manager = WebSocketManager(state_machine)
+state_persister = StatePersister(state_machine)
+rollup_writer = RollupWriter(state_machine.timeseries)
+energy_analytics = EnergyAnalytics(state_machine)
+rollup_writer.listeners.append(energy_analytics.sync)
 
 configure_mqtt(state_machine, websocket_manager)
 
@@ -22,9 +30,18 @@ app = FastAPI()
 async def start_background_tasks(app):
     app.state.device_task = asyncio.create_task(state_machine.process_new_devices())
     app.state.websocket_task = asyncio.create_task(websocket_manager.broadcast_status())
-    for task in [app.state.device_task, app.state.websocket_task]:
-        task.add_done_callback(lambda t: print(
-            f"Task {t} finished with exception:  {t.exception()}") if t.exception() else None)
+    app.state.persister_task = asyncio.create_task(state_persister.run())
+    app.state.command_tracker_task = asyncio.create_task(state_machine.command_tracker.run())
+    app.state.rollup_task = asyncio.create_task(rollup_writer.run())
+    app.state.analytics_task = asyncio.create_task(energy_analytics.sync())
+    for task in [app.state.device_task, app.state.websocket_task, app.state.persister_task,
+                 app.state.command_tracker_task, app.state.rollup_task, app.state.analytics_task]:
+        task.add_done_callback(_log_task_exception)
+
+
+def _log_task_exception(task: asyncio.Task):
+    if not task.cancelled() and task.exception():
+        logger.error("Task %s finished with exception", task.get_name(), exc_info=task.exception())
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
@@ -37,15 +54,37 @@ async def lifespan(app: FastAPI):
     
     yield
     
+    websocket_manager.scheduler.stop()
+    stop_mqtt()
     if hasattr(app.state, 'device_task'):
         app.state.device_task.cancel()
     if hasattr(app.state, 'websocket_task'):
         app.state.websocket_task.cancel()
+    if hasattr(app.state, 'persister_task'):
+        app.state.persister_task.cancel()
+    if hasattr(app.state, 'command_tracker_task'):
+        app.state.command_tracker_task.cancel()
+    if hasattr(app.state, 'rollup_task'):
+        app.state.rollup_task.cancel()
+    if hasattr(app.state, 'analytics_task'):
+        app.state.analytics_task.cancel()
+    # Ultima scriere a stării live înainte de închiderea conexiunii la baza de date.
+    try:
+        await state_persister.flush()
+    except Exception as e:
+        logger.error("Final state flush failed: %s", e)
+    try:
+        await rollup_writer.flush(close_open=True)
+    except Exception as e:
+        logger.error("Final rollup flush failed: %s", e)
     state_machine.clear_new_devices()
     
     await disconnect_db()
+    shutdown_logging()
 
 app = FastAPI(lifespan=lifespan)
+app.state.state_machine = state_machine
+app.state.energy_analytics = energy_analytics
 
 @app.websocket("/ws")
 async def websocket_endpoint(websocket: WebSocket):
@@ -53,13 +92,12 @@ async def websocket_endpoint(websocket: WebSocket):
     await websocket_manager.connect(websocket)
     try:
         while True:
-            message = await websocket.receive_json()
+            message = await websocket_manager.receive(websocket)
             await websocket_manager.process_message(websocket, message)
     except WebSocketDisconnect:
         await websocket_manager.disconnect(websocket)
     except Exception as e:
-        logger.error(f"WebSocket error: {e}")
-        traceback.print_exc()
+        logger.exception("WebSocket error: %s", e)
         await websocket_manager.disconnect(websocket)
 
 app.include_router(router, prefix="/api")
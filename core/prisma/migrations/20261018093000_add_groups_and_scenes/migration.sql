@@ -0,0 +1,32 @@
+-- CreateTable
+CREATE TABLE "Group" (
+    "id" INTEGER NOT NULL PRIMARY KEY AUTOINCREMENT,
+    "name" TEXT NOT NULL
+);
+
+-- CreateTable
+CREATE TABLE "Scene" (
+    "id" INTEGER NOT NULL PRIMARY KEY AUTOINCREMENT,
+    "name" TEXT NOT NULL,
+    "actions" TEXT NOT NULL DEFAULT '[]'
+);
+
+-- CreateTable
+CREATE TABLE "_EntityToGroup" (
+    "A" TEXT NOT NULL,
+    "B" INTEGER NOT NULL,
+    CONSTRAINT "_EntityToGroup_A_fkey" FOREIGN KEY ("A") REFERENCES "Entity" ("id") ON DELETE CASCADE ON UPDATE CASCADE,
+    CONSTRAINT "_EntityToGroup_B_fkey" FOREIGN KEY ("B") REFERENCES "Group" ("id") ON DELETE CASCADE ON UPDATE CASCADE
+);
+
+-- CreateIndex
+CREATE UNIQUE INDEX "Group_name_key" ON "Group"("name");
+
+-- CreateIndex
+CREATE UNIQUE INDEX "Scene_name_key" ON "Scene"("name");
+
+-- CreateIndex
+CREATE UNIQUE INDEX "_EntityToGroup_AB_unique" ON "_EntityToGroup"("A", "B");
+
+-- CreateIndex
+CREATE INDEX "_EntityToGroup_B_index" ON "_EntityToGroup"("B");
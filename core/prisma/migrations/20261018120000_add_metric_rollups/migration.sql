@@ -0,0 +1,19 @@
+-- CreateTable
+CREATE TABLE "MetricRollup" (
+    "id" INTEGER NOT NULL PRIMARY KEY AUTOINCREMENT,
+    "entityId" TEXT NOT NULL,
+    "metric" TEXT NOT NULL,
+    "resolution" TEXT NOT NULL,
+    "bucket" DATETIME NOT NULL,
+    "count" INTEGER NOT NULL,
+    "min" REAL NOT NULL,
+    "max" REAL NOT NULL,
+    "avg" REAL NOT NULL,
+    "delta" REAL NOT NULL DEFAULT 0
+);
+
+-- CreateIndex
+CREATE INDEX "MetricRollup_entityId_metric_resolution_bucket_idx" ON "MetricRollup"("entityId", "metric", "resolution", "bucket");
+
+-- CreateIndex
+CREATE INDEX "MetricRollup_resolution_bucket_idx" ON "MetricRollup"("resolution", "bucket");
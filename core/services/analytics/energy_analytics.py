@@ -0,0 +1,479 @@
+import asyncio
+import logging
+import time
+from datetime import datetime, timezone
+from threading import Lock
+from typing import Any, Dict, List, Optional, Tuple
+import numpy as np
+from config.settings import ANALYTICS_STANDBY_WATTS, ANALYTICS_WINDOW_DAYS, ENERGY_PRICE, ENERGY_TARIFFS
+from database.repository import rollup_repository
+from services.metrics.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+HOUR = 3600
+# Contorul de energie Shelly numără watt-minute.
+WATT_MINUTES_PER_KWH = 60000.0
+
+REPORT_SECONDS = metrics.histogram("analytics_report_seconds", "Energy analytics computation time per endpoint",
+                                   ("report",))
+
+
+def parse_tariffs(spec: str, default_price: float = ENERGY_PRICE) -> np.ndarray:
+    """
+    "0-7=0.45,7-23=0.89" -> prețul pe kWh pentru fiecare oră locală a zilei (24 de valori).
+    O specificație invalidă nu oprește pornirea: se loghează și se folosește prețul fix default_price.
+    """
+    prices = np.full(24, default_price, dtype=np.float64)
+    try:
+        for part in filter(None, (part.strip() for part in spec.split(","))):
+            window, separator, price = part.partition("=")
+            start, dash, end = window.partition("-")
+            if not separator or not dash:
+                raise ValueError(f"expected start-end=price, got {part!r}")
+            start, end, price = int(start), int(end), float(price)
+            if not (0 <= start <= 24 and 0 <= end <= 24) or not np.isfinite(price):
+                raise ValueError(f"invalid tariff window {part!r}")
+            hours = np.arange(start, end if end > start else end + 24) % 24
+            prices[hours] = price
+    except ValueError as e:
+        logger.warning("Invalid ENERGY_TARIFFS %r (%s), using ENERGY_PRICE for every hour", spec, e)
+        return np.full(24, default_price, dtype=np.float64)
+    return prices
+
+
+class EnergyAnalytics:
+    """
+    Analize de consum pe toată flota, calculate vectorizat cu NumPy.
+
+    Rollup-urile orare din MetricRollup sunt ținute în matrice coloanare (dispozitiv × oră)
+    pe ultimele ANALYTICS_WINDOW_DAYS zile: energie (delta contorului), sumă și număr de
+    eșantioane de putere. Rândurile noi se citesc incremental, după id, după fiecare scriere
+    a RollupWriter; ora curentă, încă nescrisă, se adaugă la interogare din TimeSeriesStore.
+    Totalurile pe cameră, top consumatori, comparațiile zi cu zi, mediile mobile, standby-ul
+    și costul pe tarife sunt operații pe matrice, fără bucle Python per dispozitiv.
+    """
+
+    def __init__(self, state_machine, days: int = ANALYTICS_WINDOW_DAYS,
+                 standby_watts: float = ANALYTICS_STANDBY_WATTS, prices: Optional[np.ndarray] = None):
+        self.state_machine = state_machine
+        self.hours = days * 24
+        self.standby_watts = standby_watts
+        self.prices = parse_tariffs(ENERGY_TARIFFS) if prices is None else prices
+        self.lock = Lock()
+        self.ids: List[str] = []
+        self.index: Dict[str, int] = {}
+        # Ora (timestamp // 3600) a primei coloane.
+        self.origin: Optional[int] = None
+        self.last_id = 0
+        # sync() e apelat atât la pornire cât și după fiecare flush; rulările nu se suprapun.
+        self._sync_lock = asyncio.Lock()
+        self._allocate(64)
+        metrics.gauge_func("analytics_devices", "Devices with hourly data in the analytics window", lambda: len(self.ids))
+
+    def _allocate(self, capacity: int):
+        shape = (capacity, self.hours)
+        arrays = {
+            "energy": np.zeros(shape, dtype=np.float64),
+            "energy_samples": np.zeros(shape, dtype=np.int32),
+            "power_sum": np.zeros(shape, dtype=np.float64),
+            "power_samples": np.zeros(shape, dtype=np.int32),
+        }
+        for name, array in arrays.items():
+            current = getattr(self, name, None)
+            if current is not None:
+                array[: current.shape[0]] = current
+            setattr(self, name, array)
+        self.capacity = capacity
+
+    def _matrices(self) -> Tuple[np.ndarray, ...]:
+        return self.energy, self.energy_samples, self.power_sum, self.power_samples
+
+    # --- încărcare ---
+
+    async def sync(self) -> int:
+        """Citește rollup-urile orare scrise după ultima sincronizare. Întoarce numărul de rânduri."""
+        since = datetime.fromtimestamp(time.time() - self.hours * HOUR, timezone.utc)
+        total = 0
+        async with self._sync_lock:
+            while True:
+                rows = await rollup_repository.find_after(self.last_id, "hour", since)
+                if not rows:
+                    break
+                self.add_rows(rows)
+                self.last_id = max(self.last_id, max(row.id for row in rows))
+                total += len(rows)
+        if total:
+            logger.debug("Loaded %d hourly rollups into analytics", total)
+        return total
+
+    def add_rows(self, rows):
+        """Adaugă rânduri de rollup orar (obiecte Prisma sau dicționare) în matrice."""
+        parsed = [_row_values(row) for row in rows]
+        if not parsed:
+            return
+        with self.lock:
+            self._add_locked(parsed)
+
+    def _add_locked(self, parsed):
+        hours = np.fromiter((item[1] for item in parsed), dtype=np.int64, count=len(parsed))
+        self._advance_locked(int(hours.max()))
+        columns = hours - self.origin
+        rows = np.fromiter((self._row_locked(item[0]) for item in parsed), dtype=np.int64, count=len(parsed))
+        metric = np.array([item[2] for item in parsed])
+        counts = np.fromiter((item[3] for item in parsed), dtype=np.int64, count=len(parsed))
+        averages = np.fromiter((item[4] for item in parsed), dtype=np.float64, count=len(parsed))
+        deltas = np.fromiter((item[5] for item in parsed), dtype=np.float64, count=len(parsed))
+        inside = columns >= 0
+        energy = inside & (metric == "energy")
+        power = inside & (metric == "power")
+        np.add.at(self.energy, (rows[energy], columns[energy]), deltas[energy])
+        np.add.at(self.energy_samples, (rows[energy], columns[energy]), counts[energy])
+        np.add.at(self.power_sum, (rows[power], columns[power]), averages[power] * counts[power])
+        np.add.at(self.power_samples, (rows[power], columns[power]), counts[power])
+
+    def _advance_locked(self, hour: int):
+        """Mută fereastra astfel încât `hour` să fie ultima coloană, dacă e mai nouă."""
+        if self.origin is None:
+            self.origin = hour - self.hours + 1
+            return
+        shift = hour - (self.origin + self.hours - 1)
+        if shift <= 0:
+            return
+        for matrix in self._matrices():
+            if shift >= self.hours:
+                matrix[:] = 0
+            else:
+                matrix[:, :-shift] = matrix[:, shift:]
+                matrix[:, -shift:] = 0
+        self.origin += shift
+
+    def _row_locked(self, device_id: str) -> int:
+        row = self.index.get(device_id)
+        if row is None:
+            row = self.index[device_id] = len(self.ids)
+            self.ids.append(device_id)
+            if row >= self.capacity:
+                self._allocate(self.capacity * 2)
+        return row
+
+    # --- fereastra de calcul ---
+
+    def _window(self, start: float, end: float):
+        """Orele [start, end] plus ora curentă încă nescrisă, ca (ids, ore, kWh, putere medie)."""
+        now_hour = int(time.time()) // HOUR
+        unflushed = []
+        store = self.state_machine.timeseries
+        for metric in ("energy", "power"):
+            unflushed.extend(store.unflushed_rows(None, metric, "hour", start - HOUR, end))
+        with self.lock:
+            if unflushed:
+                self._advance_locked(max(now_hour, max(int(row["bucket"].timestamp()) // HOUR for row in unflushed)))
+            elif self.origin is not None:
+                self._advance_locked(now_hour)
+            if self.origin is None:
+                return [], np.zeros(0, dtype=np.int64), np.zeros((0, 0)), np.zeros((0, 0))
+            first = max(int(start) // HOUR - self.origin, 0)
+            last = min(int(end) // HOUR - self.origin, self.hours - 1)
+            if last < first:
+                last = first - 1
+            count = len(self.ids)
+            ids = list(self.ids)
+            index = dict(self.index)
+            origin = self.origin
+            extra = [_row_values(row) for row in unflushed]
+            extra = [item for item in extra if first <= item[1] - origin <= last]
+            # Coloanele atinse de rândurile nescrise (de obicei doar ora curentă) se copiază separat.
+            touched = sorted({item[1] - origin for item in extra})
+            raw = [matrix[:count, touched].copy() for matrix in self._matrices()]
+            kwh, power = _derive(*(matrix[:count, first:last + 1] for matrix in self._matrices()))
+        hours = np.arange(origin + first, origin + last + 1, dtype=np.int64)
+        if not extra:
+            return ids, hours, kwh, power
+
+        # Ora curentă (și rândurile încă în coadă) doar în rezultat, nu în matricele persistente.
+        for device_id in dict.fromkeys(item[0] for item in extra if item[0] not in index):
+            index[device_id] = len(ids)
+            ids.append(device_id)
+        added = len(ids) - count
+        if added:
+            kwh = np.pad(kwh, ((0, added), (0, 0)))
+            power = np.pad(power, ((0, added), (0, 0)), constant_values=np.nan)
+            raw = [np.pad(matrix, ((0, added), (0, 0))) for matrix in raw]
+        energy, energy_samples, power_sum, power_samples = raw
+        positions = {column: position for position, column in enumerate(touched)}
+        for device_id, hour, metric, samples, average, delta in extra:
+            row, column = index[device_id], positions[hour - origin]
+            if metric == "energy":
+                energy[row, column] += delta
+                energy_samples[row, column] += samples
+            else:
+                power_sum[row, column] += average * samples
+                power_samples[row, column] += samples
+        columns = [column - first for column in touched]
+        kwh[:, columns], power[:, columns] = _derive(energy, energy_samples, power_sum, power_samples)
+        return ids, hours, kwh, power
+
+    def _local_hours(self, hours: np.ndarray) -> np.ndarray:
+        """Ora locală a zilei (0-23) pentru fiecare coloană; se folosește decalajul UTC curent."""
+        offset = time.localtime().tm_gmtoff // HOUR
+        return (hours + offset) % 24
+
+    def _local_days(self, hours: np.ndarray) -> np.ndarray:
+        offset = time.localtime().tm_gmtoff // HOUR
+        return (hours + offset) // 24
+
+    def _room_membership(self, ids: List[str]) -> Tuple[List[Dict[str, Any]], np.ndarray]:
+        """Camerele și, pentru fiecare dispozitiv, poziția camerei lui (-1 dacă nu are cameră)."""
+        sm = self.state_machine
+        with sm.lock:
+            rooms = [{"id": room["id"], "name": room["name"]} for room in sm.room_index.rooms.values()]
+            entity_rooms = dict(sm.room_index.entity_rooms)
+        positions = {room["id"]: position for position, room in enumerate(rooms)}
+        membership = np.fromiter(
+            (positions.get(entity_rooms.get(device_id), -1) for device_id in ids), dtype=np.int64, count=len(ids)
+        )
+        return rooms, membership
+
+    # --- rapoarte ---
+
+    def room_totals(self, start: float, end: float) -> Dict[str, Any]:
+        with REPORT_SECONDS.labels("rooms").time():
+            ids, hours, kwh, power = self._window(start, end)
+            return self._room_totals(ids, hours, kwh, power)
+
+    def _room_totals(self, ids, hours, kwh, power) -> Dict[str, Any]:
+        rooms, membership = self._room_membership(ids)
+        device_kwh = kwh.sum(axis=1)
+        device_cost = kwh @ self.prices[self._local_hours(hours)]
+        device_power = _mean_ignoring_gaps(power)
+        assigned = membership >= 0
+        count = len(rooms)
+        room_kwh = np.bincount(membership[assigned], weights=device_kwh[assigned], minlength=count)
+        room_cost = np.bincount(membership[assigned], weights=device_cost[assigned], minlength=count)
+        room_power = np.bincount(membership[assigned], weights=device_power[assigned], minlength=count)
+        room_devices = np.bincount(membership[assigned], minlength=count)
+        result = [
+            {
+                "room_id": room["id"],
+                "name": room["name"],
+                "kwh": float(room_kwh[position]),
+                "cost": float(room_cost[position]),
+                "avg_power": float(room_power[position]),
+                "devices": int(room_devices[position]),
+            }
+            for position, room in enumerate(rooms)
+        ]
+        unassigned = ~assigned
+        return {
+            "rooms": sorted(result, key=lambda room: room["kwh"], reverse=True),
+            "unassigned": {
+                "kwh": float(device_kwh[unassigned].sum()),
+                "cost": float(device_cost[unassigned].sum()),
+                "devices": int(unassigned.sum()),
+            },
+        }
+
+    def top_consumers(self, start: float, end: float, limit: int = 10) -> List[Dict[str, Any]]:
+        with REPORT_SECONDS.labels("top").time():
+            ids, hours, kwh, power = self._window(start, end)
+            return self._top_consumers(ids, hours, kwh, power, limit)
+
+    def _top_consumers(self, ids, hours, kwh, power, limit: int) -> List[Dict[str, Any]]:
+        totals = kwh.sum(axis=1)
+        limit = min(limit, len(ids))
+        if limit <= 0:
+            return []
+        top = np.argpartition(-totals, limit - 1)[:limit]
+        top = top[np.argsort(-totals[top])]
+        costs = kwh[top] @ self.prices[self._local_hours(hours)]
+        if power.size:
+            peaks = np.where(np.isnan(power[top]), -np.inf, power[top]).max(axis=1)
+        else:
+            peaks = np.full(limit, -np.inf)
+        return [
+            {
+                "device_id": ids[row],
+                "kwh": float(totals[row]),
+                "cost": float(cost),
+                "peak_hourly_power": float(peak) if np.isfinite(peak) else None,
+            }
+            for row, cost, peak in zip(top, costs, peaks)
+        ]
+
+    def daily(self, start: float, end: float) -> Dict[str, Any]:
+        with REPORT_SECONDS.labels("daily").time():
+            ids, hours, kwh, power = self._window(start, end)
+            return self._daily(ids, hours, kwh)
+
+    def _daily(self, ids, hours, kwh) -> Dict[str, Any]:
+        """Consumul pe zile locale pentru casă și pe camere, cu variația față de ziua precedentă."""
+        if not hours.size:
+            return {"days": [], "rooms": []}
+        days, column_day = np.unique(self._local_days(hours), return_inverse=True)
+        # Matrice oră -> zi, ca totalurile zilnice pe dispozitiv să fie un singur produs matricial.
+        to_days = np.zeros((hours.size, days.size))
+        to_days[np.arange(hours.size), column_day] = 1.0
+        device_daily = kwh @ to_days
+        house = device_daily.sum(axis=0)
+        costs = (kwh * self.prices[self._local_hours(hours)]) @ to_days
+        rooms, membership = self._room_membership(ids)
+        assigned = membership >= 0
+        room_daily = np.zeros((len(rooms), days.size))
+        np.add.at(room_daily, membership[assigned], device_daily[assigned])
+        offset = time.localtime().tm_gmtoff
+        labels = [
+            datetime.fromtimestamp(int(day) * 86400 - offset, timezone.utc).astimezone().date().isoformat()
+            for day in days
+        ]
+        return {
+            "days": [
+                {"date": label, "kwh": float(total), "cost": float(cost), "change": change}
+                for label, total, cost, change in zip(labels, house, costs.sum(axis=0), _changes(house))
+            ],
+            "rooms": [
+                {
+                    "room_id": room["id"],
+                    "name": room["name"],
+                    "kwh": room_daily[position].tolist(),
+                    "change": _changes(room_daily[position]),
+                }
+                for position, room in enumerate(rooms)
+            ],
+        }
+
+    def rolling_average(self, start: float, end: float, window_hours: int = 24,
+                        device_ids: Optional[List[str]] = None) -> Dict[str, Any]:
+        """Media mobilă a puterii totale (W) a dispozitivelor date, pe ferestre de `window_hours` ore."""
+        with REPORT_SECONDS.labels("rolling").time():
+            ids, hours, kwh, power = self._window(start, end)
+            if device_ids is not None:
+                wanted = set(device_ids)
+                power = power[[row for row, device_id in enumerate(ids) if device_id in wanted]]
+            has_data = ~np.isnan(power).all(axis=0) if power.size else np.zeros(hours.size, dtype=bool)
+            total = np.nansum(power, axis=0) if power.size else np.zeros(hours.size)
+            window_hours = max(1, min(window_hours, max(hours.size, 1)))
+            values = np.concatenate(([0.0], np.cumsum(np.where(has_data, total, 0.0))))
+            counts = np.concatenate(([0], np.cumsum(has_data)))
+            sums = values[window_hours:] - values[:-window_hours]
+            samples = counts[window_hours:] - counts[:-window_hours]
+            with np.errstate(invalid="ignore", divide="ignore"):
+                averages = np.where(samples > 0, sums / samples, np.nan)
+            return {
+                "window_hours": window_hours,
+                "points": [
+                    {"time": int(hour) * HOUR, "power": float(value) if not np.isnan(value) else None}
+                    for hour, value in zip(hours[window_hours - 1:], averages)
+                ],
+            }
+
+    def standby(self, start: float, end: float) -> List[Dict[str, Any]]:
+        with REPORT_SECONDS.labels("standby").time():
+            ids, hours, kwh, power = self._window(start, end)
+            return self._standby(ids, power)
+
+    def _standby(self, ids, power) -> List[Dict[str, Any]]:
+        """
+        Consumul de standby: a 10-a percentilă a puterii medii orare (orele cele mai liniștite),
+        pentru dispozitivele cu cel puțin 24 de ore de date. Se raportează cele peste prag.
+        """
+        if not power.size:
+            return []
+        covered = (~np.isnan(power)).sum(axis=1) >= 24
+        if not covered.any():
+            return []
+        # Percentila pe rând fără nanpercentile (care iterează rândurile): golurile devin +inf la sortare.
+        subset = power[covered]
+        present = (~np.isnan(subset)).sum(axis=1)
+        ordered = np.sort(np.where(np.isnan(subset), np.inf, subset), axis=1)
+        baseline = np.full(len(ids), np.nan)
+        baseline[covered] = ordered[np.arange(subset.shape[0]), ((present - 1) * 0.1).astype(np.int64)]
+        flagged = np.flatnonzero(covered & (baseline >= self.standby_watts))
+        flagged = flagged[np.argsort(-baseline[flagged])]
+        yearly_kwh = baseline[flagged] * 8760 / 1000.0
+        price = float(self.prices.mean())
+        return [
+            {
+                "device_id": ids[row],
+                "standby_power": float(baseline[row]),
+                "yearly_kwh": float(kwh),
+                "yearly_cost": float(kwh * price),
+            }
+            for row, kwh in zip(flagged, yearly_kwh)
+        ]
+
+    def report(self, start: float, end: float, limit: int = 10) -> Dict[str, Any]:
+        """Raportul complet al casei pe interval (ex. 30 de zile), dintr-o singură fereastră de date."""
+        started = time.perf_counter()
+        with REPORT_SECONDS.labels("report").time():
+            ids, hours, kwh, power = self._window(start, end)
+            local_hours = self._local_hours(hours)
+            hourly_house = kwh.sum(axis=0)
+            by_price: Dict[float, Dict[str, float]] = {}
+            if hours.size:
+                column_prices = self.prices[local_hours]
+                for price in np.unique(column_prices):
+                    selected = column_prices == price
+                    kwh_at_price = float(hourly_house[selected].sum())
+                    by_price[float(price)] = {"kwh": kwh_at_price, "cost": kwh_at_price * float(price)}
+            result = {
+                "start": start,
+                "end": end,
+                "devices": len(ids),
+                "hours": int(hours.size),
+                "kwh": float(hourly_house.sum()),
+                "cost": float(sum(entry["cost"] for entry in by_price.values())),
+                "by_tariff": [{"price": price, **entry} for price, entry in sorted(by_price.items())],
+                "hour_of_day_kwh": np.bincount(local_hours, weights=hourly_house, minlength=24).tolist()
+                if hours.size else [0.0] * 24,
+                "rooms": self._room_totals(ids, hours, kwh, power),
+                "top_consumers": self._top_consumers(ids, hours, kwh, power, limit),
+                "daily": self._daily(ids, hours, kwh),
+                "standby": self._standby(ids, power),
+            }
+        result["computed_ms"] = (time.perf_counter() - started) * 1000
+        return result
+
+
+def _row_values(row) -> Tuple[str, int, str, int, float, float]:
+    """(device_id, ora, metrică, eșantioane, medie, delta) dintr-un rând de rollup."""
+    get = row.get if isinstance(row, dict) else row.__getattribute__
+    return (
+        get("entityId"),
+        int(get("bucket").timestamp()) // HOUR,
+        get("metric"),
+        get("count"),
+        get("avg"),
+        get("delta") or 0.0,
+    )
+
+
+def _derive(energy, energy_samples, power_sum, power_samples) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    (kWh, putere medie) pe celulă. kWh vine din contorul de energie; unde lipsește, se estimează
+    din puterea medie × 1 h. Puterea e NaN în orele fără eșantioane.
+    """
+    with np.errstate(invalid="ignore", divide="ignore"):
+        power = np.where(power_samples > 0, power_sum / power_samples, np.nan)
+    kwh = np.where(energy_samples > 0, energy / WATT_MINUTES_PER_KWH, np.where(power_samples > 0, power, 0.0) / 1000.0)
+    return kwh, power
+
+
+def _mean_ignoring_gaps(power: np.ndarray) -> np.ndarray:
+    """Media pe rând a orelor cu date (0 pentru rândurile fără date), fără avertismentele nanmean."""
+    if not power.size:
+        return np.zeros(power.shape[0])
+    present = ~np.isnan(power)
+    counts = present.sum(axis=1)
+    totals = np.where(present, power, 0.0).sum(axis=1)
+    return np.where(counts > 0, totals / np.maximum(counts, 1), 0.0)
+
+
+def _changes(values: np.ndarray) -> List[Optional[float]]:
+    """Variația relativă față de elementul precedent (None pentru primul sau când precedentul e 0)."""
+    if not len(values):
+        return []
+    previous = values[:-1]
+    with np.errstate(invalid="ignore", divide="ignore"):
+        change = np.where(previous > 0, (values[1:] - previous) / previous, np.nan)
+    return [None] + [float(value) if not np.isnan(value) else None for value in change]
@@ -0,0 +1,127 @@
+import asyncio
+import logging
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+from config.settings import COMMAND_RATE_PER_DEVICE
+
+logger = logging.getLogger(__name__)
+
+CommandKey = Tuple[str, str]
+
+
+def merge_command(old: Any, new: Any) -> Any:
+    """
+    Comasează două comenzi pentru același (dispozitiv, canal); cea nouă câștigă.
+    Setările compatibile (același mode, ex. brightness + temp) se unesc într-un singur payload.
+    """
+    if isinstance(old, dict) and isinstance(new, dict) and new.get("mode", old.get("mode")) == old.get("mode"):
+        return {**old, **new}
+    return new
+
+
+class _Pending:
+    __slots__ = ("value", "waiters")
+
+    def __init__(self, value: Any):
+        self.value = value
+        self.waiters: List[asyncio.Future] = []
+
+
+class CommandScheduler:
+    """
+    Planificator de comenzi între handler-ele WebSocket și control.py.
+    Comenzile în așteptare se comasează per (dispozitiv, canal) după regula „ultima câștigă”,
+    fiecare dispozitiv primește cel mult COMMAND_RATE_PER_DEVICE publicări pe secundă,
+    iar tot ce e gata de trimis pleacă într-un singur lot prin send_batch.
+    """
+
+    def __init__(self, send_batch: Callable[[Dict[CommandKey, Any]], Awaitable[Dict[CommandKey, bool]]],
+                 rate: float = COMMAND_RATE_PER_DEVICE):
+        self.send_batch = send_batch
+        self.interval = 1 / rate if rate > 0 else 0
+        self._pending: Dict[CommandKey, _Pending] = {}
+        self._next_allowed: Dict[str, float] = {}
+        self._wakeup: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self.submitted = 0
+        self.coalesced = 0
+
+    def submit(self, device_ids: List[str], channel: str, value: Any) -> "asyncio.Future[Dict[str, bool]]":
+        """
+        Programează comanda pentru fiecare dispozitiv și întoarce imediat un future
+        cu rezultatul per dispozitiv. O comandă înlocuită de una mai nouă primește
+        rezultatul publicării care a înlocuit-o.
+        """
+        if self._task is None or self._task.done():
+            self._wakeup = asyncio.Event()
+            self._task = asyncio.create_task(self.run())
+
+        loop = asyncio.get_running_loop()
+        futures = []
+        for device_id in device_ids:
+            key = (device_id, channel)
+            pending = self._pending.get(key)
+            if pending is None:
+                pending = self._pending[key] = _Pending(value)
+            else:
+                pending.value = merge_command(pending.value, value)
+                self.coalesced += 1
+            future = loop.create_future()
+            pending.waiters.append(future)
+            futures.append(future)
+        self.submitted += len(device_ids)
+        self._wakeup.set()
+        return asyncio.ensure_future(_collect(device_ids, futures))
+
+    def stop(self):
+        if self._task:
+            self._task.cancel()
+            self._task = None
+
+    async def run(self):
+        while True:
+            self._wakeup.clear()
+            now = time.monotonic()
+            ready: Dict[CommandKey, _Pending] = {}
+            next_time = None
+            for key, pending in list(self._pending.items()):
+                allowed = self._next_allowed.get(key[0], 0)
+                if allowed <= now:
+                    ready[key] = self._pending.pop(key)
+                elif next_time is None or allowed < next_time:
+                    next_time = allowed
+
+            if ready:
+                for device_id, _ in ready:
+                    self._next_allowed[device_id] = now + self.interval
+                # Nu blocăm planificarea pe durata așteptării PUBACK-urilor.
+                asyncio.create_task(self._dispatch(ready))
+                continue
+
+            if len(self._next_allowed) > 4 * max(len(self._pending), 256):
+                self._next_allowed = {d: t for d, t in self._next_allowed.items() if t > now}
+
+            if next_time is None:
+                await self._wakeup.wait()
+            else:
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=next_time - now)
+                except asyncio.TimeoutError:
+                    pass
+
+    async def _dispatch(self, ready: Dict[CommandKey, _Pending]):
+        try:
+            results = await self.send_batch({key: pending.value for key, pending in ready.items()})
+        except Exception as e:
+            logger.exception("Error sending scheduled commands: %s", e)
+            results = {}
+        for key, pending in ready.items():
+            ok = results.get(key, False)
+            for future in pending.waiters:
+                if not future.done():
+                    future.set_result(ok)
+
+
+async def _collect(device_ids: List[str], futures: List[asyncio.Future]) -> Dict[str, bool]:
+    results = await asyncio.gather(*futures)
+    return dict(zip(device_ids, results))
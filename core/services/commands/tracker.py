@@ -0,0 +1,277 @@
+import asyncio
+import logging
+import time
+from typing import Any, Dict, Iterable, List, Optional
+from config.settings import COMMAND_CONFIRM_TIMEOUT
+from services.metrics.metrics import Histogram, metrics
+
+logger = logging.getLogger(__name__)
+
+# Limitele bucket-urilor de latență, în secunde.
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+CONFIRM_SECONDS = metrics.histogram("command_confirm_seconds", "Publish to status-confirmation latency per command",
+                                    labelnames=("command",), buckets=LATENCY_BUCKETS)
+
+# Ținta de rollback a unui câmp care nu exista în status înainte de comandă.
+_ABSENT = object()
+
+
+class _PendingCommand:
+    """O comandă trimisă unui dispozitiv, partajată de câmpurile pe care le așteaptă."""
+
+    __slots__ = ("command", "sent_at", "deadline", "confirmed")
+
+    def __init__(self, command: str, deadline: float):
+        self.command = command
+        self.sent_at: Optional[float] = None
+        self.deadline = deadline
+        self.confirmed = False
+
+
+class _PendingField:
+    __slots__ = ("expected", "reported", "command")
+
+    def __init__(self, expected: Any, reported: Any, command: _PendingCommand):
+        self.expected = expected
+        # Ultima valoare raportată de dispozitiv (sau _ABSENT); ținta unui rollback.
+        self.reported = reported
+        self.command = command
+
+
+class CommandTracker:
+    """
+    Urmărește comenzile trimise până când dispozitivul confirmă starea cerută.
+
+    La trimitere starea așteptată se aplică imediat (optimist) în DeviceStateMachine,
+    iar câmpurile respective apar în lista "pending" a dispozitivului. Un status MQTT
+    cu valoarea așteptată confirmă câmpul; unul cu altă valoare doar actualizează ținta
+    de rollback. La eșecul publicării sau după COMMAND_CONFIRM_TIMEOUT câmpurile
+    neconfirmate revin la ultima valoare raportată, iar cele pe care dispozitivul nu
+    le raportase niciodată se scot din status.
+    Latența publicare → confirmare se înregistrează per dispozitiv și per comandă.
+    Intrările unui dispozitiv din `pending` se modifică doar cu lock-ul partiției lui deținut
+    (prin state_machine.mutating() când se schimbă și starea dispozitivului).
+    """
+
+    def __init__(self, state_machine, timeout: float = COMMAND_CONFIRM_TIMEOUT):
+        self.state_machine = state_machine
+        self.timeout = timeout
+        # device_id -> câmp -> _PendingField
+        self.pending: Dict[str, Dict[str, _PendingField]] = {}
+        self.by_device: Dict[str, Histogram] = {}
+        self.timeouts_by_device: Dict[str, int] = {}
+        self.confirmed = 0
+        self.timed_out = 0
+        self.failed = 0
+        metrics.counter_func("commands_confirmed_total", "Commands confirmed by a device status", lambda: self.confirmed)
+        metrics.counter_func("commands_timed_out_total", "Commands rolled back after the confirm timeout", lambda: self.timed_out)
+        metrics.counter_func("commands_failed_total", "Commands rolled back because publishing failed", lambda: self.failed)
+        metrics.gauge_func("commands_pending_devices", "Devices with unconfirmed commands", lambda: len(self.pending))
+
+    def track(self, device_ids: Iterable[str], command: str, expected: Dict[str, Any]):
+        """Înregistrează comanda și aplică optimist starea așteptată."""
+        if not expected:
+            return
+        sm = self.state_machine
+        now = time.time()
+        deadline = time.monotonic() + self.timeout
+        changed = False
+        for device_id in device_ids:
+            with sm.mutating(device_id):
+                device = sm.devices.get(device_id)
+                if device is None:
+                    continue
+                status = device["status"]
+                pending_command = _PendingCommand(command, deadline)
+                entries = self.pending.setdefault(device_id, {})
+                for field, value in expected.items():
+                    entry = entries.get(field)
+                    if entry is None:
+                        entries[field] = _PendingField(value, status.get(field, _ABSENT), pending_command)
+                    else:
+                        entry.expected = value
+                        entry.command = pending_command
+                sm._apply_status(device_id, expected, now, touch=False)
+                self._update_marker_locked(device_id)
+                changed = True
+        if changed:
+            sm._notify_changed()
+
+    def mark_sent(self, sent: Dict[str, Dict[str, Any]]):
+        """Marchează momentul publicării pentru câmpurile care așteaptă exact valorile trimise."""
+        sent_at = time.monotonic()
+        for device_id, fields in sent.items():
+            if device_id not in self.pending:
+                continue
+            with self.state_machine.shard(device_id).lock:
+                entries = self.pending.get(device_id)
+                if not entries:
+                    continue
+                for field, value in fields.items():
+                    entry = entries.get(field)
+                    if entry is not None and entry.expected == value and entry.command.sent_at is None:
+                        entry.command.sent_at = sent_at
+                        entry.command.deadline = sent_at + self.timeout
+
+    def reject(self, failed: Dict[str, Iterable[str]]):
+        """Publicarea a eșuat: câmpurile revin imediat la ultima valoare raportată."""
+        if not failed:
+            return
+        sm = self.state_machine
+        for device_id, fields in failed.items():
+            with sm.mutating(device_id):
+                if self._rollback_locked(device_id, list(fields)):
+                    self.failed += 1
+        sm._notify_changed()
+
+    def reconcile_locked(self, device_id: str, values: Dict[str, Any], now: float) -> Dict[str, Any]:
+        """
+        Compară un status primit cu câmpurile în așteptare ale dispozitivului.
+        Întoarce valorile de aplicat: câmpurile încă neconfirmate își păstrează
+        valoarea optimistă. Se apelează cu lock-ul partiției dispozitivului deținut.
+        """
+        entries = self.pending.get(device_id)
+        if not entries:
+            return values
+        result = values
+        marker_changed = False
+        for field in [field for field in values if field in entries]:
+            entry = entries[field]
+            incoming = values[field]
+            if incoming == entry.expected:
+                del entries[field]
+                marker_changed = True
+                self._confirm_locked(device_id, entry.command, now)
+            else:
+                entry.reported = incoming
+                if result is values:
+                    result = dict(values)
+                del result[field]
+        if marker_changed:
+            if not entries:
+                del self.pending[device_id]
+            self._update_marker_locked(device_id)
+        return result
+
+    def reported_locked(self, device_id: str, status: Dict[str, Any]):
+        """
+        Înlocuiește în `status` valorile optimiste cu ultimele raportate de dispozitiv
+        (câmpurile niciodată raportate se scot). Se apelează cu lock-ul partiției deținut.
+        """
+        for field, entry in self.pending.get(device_id, {}).items():
+            if entry.reported is _ABSENT:
+                status.pop(field, None)
+            else:
+                status[field] = entry.reported
+
+    def expire(self) -> int:
+        """Face rollback pentru câmpurile cu termenul depășit. Întoarce numărul de comenzi expirate."""
+        sm = self.state_machine
+        now = time.monotonic()
+        expired = 0
+        for device_id in list(self.pending):
+            with sm.mutating(device_id):
+                entries = self.pending.get(device_id)
+                if not entries:
+                    continue
+                fields = [field for field, entry in entries.items() if entry.command.deadline <= now]
+                if fields and self._rollback_locked(device_id, fields):
+                    expired += 1
+                    self.timeouts_by_device[device_id] = self.timeouts_by_device.get(device_id, 0) + 1
+        self.timed_out += expired
+        if expired:
+            sm._notify_changed()
+        return expired
+
+    def next_deadline(self) -> Optional[float]:
+        deadlines = [entry.command.deadline for entries in self._snapshot().values() for entry in entries]
+        return min(deadlines) if deadlines else None
+
+    def _snapshot(self) -> Dict[str, List[_PendingField]]:
+        """Copia intrărilor în așteptare, luată dispozitiv cu dispozitiv sub lock-ul partiției."""
+        result = {}
+        for device_id in list(self.pending):
+            with self.state_machine.shard(device_id).lock:
+                entries = self.pending.get(device_id)
+                if entries:
+                    result[device_id] = list(entries.values())
+        return result
+
+    async def run(self):
+        """Verifică periodic termenele de confirmare."""
+        while True:
+            try:
+                self.expire()
+                deadline = self.next_deadline()
+                delay = self.timeout if deadline is None else deadline - time.monotonic()
+                await asyncio.sleep(min(max(delay, 0.05), self.timeout))
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.exception("Error expiring pending commands: %s", e)
+                await asyncio.sleep(1)
+
+    def get_stats(self) -> Dict[str, Any]:
+        pending = self._snapshot()
+        return {
+            "pending_fields": sum(len(entries) for entries in pending.values()),
+            "pending_devices": len(pending),
+            "confirmed": self.confirmed,
+            "timed_out": self.timed_out,
+            "failed": self.failed,
+            "by_command": {key[0]: h.as_dict() for key, h in list(CONFIRM_SECONDS.children.items())},
+            "by_device": {name: h.as_dict() for name, h in list(self.by_device.items())},
+            "timeouts_by_device": dict(self.timeouts_by_device),
+        }
+
+    def _confirm_locked(self, device_id: str, command: _PendingCommand, now: float):
+        if command.confirmed:
+            return
+        command.confirmed = True
+        self.confirmed += 1
+        if command.sent_at is None:
+            # Statusul a sosit înainte de publicare (ex. altă sursă a făcut aceeași schimbare).
+            return
+        latency = max(now - command.sent_at, 0.0)
+        CONFIRM_SECONDS.labels(command.command).observe(latency)
+        histogram = self.by_device.get(device_id)
+        if histogram is None:
+            histogram = self.by_device[device_id] = Histogram(LATENCY_BUCKETS)
+        histogram.observe(latency)
+
+    def _rollback_locked(self, device_id: str, fields: List[str]) -> bool:
+        entries = self.pending.get(device_id)
+        if not entries:
+            return False
+        values = {}
+        absent = []
+        for field in fields:
+            entry = entries.pop(field, None)
+            if entry is None:
+                continue
+            if entry.reported is _ABSENT:
+                absent.append(field)
+            else:
+                values[field] = entry.reported
+        if not entries:
+            del self.pending[device_id]
+        if device_id in self.state_machine.devices:
+            if values:
+                self.state_machine._apply_status(device_id, values, time.time(), touch=False)
+            if absent:
+                self.state_machine._discard_status(device_id, absent)
+            self._update_marker_locked(device_id)
+        return True
+
+    def _update_marker_locked(self, device_id: str):
+        """Actualizează lista "pending" a dispozitivului (în snapshot și în delta)."""
+        device = self.state_machine.devices.get(device_id)
+        if device is None:
+            return
+        fields = sorted(self.pending.get(device_id, ()))
+        if fields:
+            device["pending"] = fields
+        else:
+            device.pop("pending", None)
+        self.state_machine._record_change("devices", device_id, {"pending": fields})
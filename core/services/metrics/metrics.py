@@ -0,0 +1,251 @@
+import bisect
+import math
+import time
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+# Bucket-uri implicite pentru durate, în secunde (de la sub-milisecundă la câteva secunde).
+DEFAULT_BUCKETS = (0.0001, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+
+class Counter:
+    __slots__ = ("value",)
+
+    def __init__(self):
+        self.value = 0
+
+    def inc(self, amount: float = 1):
+        self.value += amount
+
+
+class Gauge:
+    __slots__ = ("value",)
+
+    def __init__(self):
+        self.value = 0
+
+    def set(self, value: float):
+        self.value = value
+
+    def inc(self, amount: float = 1):
+        self.value += amount
+
+    def dec(self, amount: float = 1):
+        self.value -= amount
+
+
+class _Timer:
+    __slots__ = ("histogram", "started")
+
+    def __init__(self, histogram: "Histogram"):
+        self.histogram = histogram
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.observe(time.perf_counter() - self.started)
+        return False
+
+
+class Histogram:
+    """Histogramă cu bucket-uri fixe; observe() face o căutare binară și trei adunări."""
+
+    __slots__ = ("buckets", "counts", "count", "sum", "max")
+
+    def __init__(self, buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+        if value > self.max:
+            self.max = value
+
+    def time(self) -> _Timer:
+        """Context manager care înregistrează durata blocului."""
+        return _Timer(self)
+
+    def quantile(self, q: float) -> Optional[float]:
+        """Aproximează cuantila ca limita superioară a bucket-ului în care cade."""
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        for index, bucket_count in enumerate(self.counts):
+            seen += bucket_count
+            if seen >= rank:
+                return self.buckets[index] if index < len(self.buckets) else self.max
+        return self.max
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            "count": self.count,
+            "sum": self.sum,
+            "avg": self.sum / self.count if self.count else None,
+            "max": self.max,
+            "p50": self.quantile(0.5),
+            "p95": self.quantile(0.95),
+            "p99": self.quantile(0.99),
+        }
+
+
+class MetricFamily:
+    """
+    O metrică cu nume, descriere și (opțional) etichete. Fără etichete, familia
+    se folosește direct (inc/set/observe); cu etichete, labels(...) întoarce
+    metrica copil, păstrată într-un dicționar, ca pe hot path să nu se aloce nimic.
+    """
+
+    def __init__(self, name: str, help: str, kind: str, factory: Callable[[], Any],
+                 labelnames: Tuple[str, ...] = ()):
+        self.name = name
+        self.help = help
+        self.kind = kind
+        self.factory = factory
+        self.labelnames = labelnames
+        self.children: Dict[Tuple[str, ...], Any] = {}
+        if not labelnames:
+            self._default = self.children[()] = factory()
+
+    def labels(self, *values) -> Any:
+        key = tuple(str(value) for value in values)
+        child = self.children.get(key)
+        if child is None:
+            child = self.children[key] = self.factory()
+        return child
+
+    def inc(self, amount: float = 1):
+        self._default.inc(amount)
+
+    def set(self, value: float):
+        self._default.set(value)
+
+    def observe(self, value: float):
+        self._default.observe(value)
+
+    def time(self) -> _Timer:
+        return self._default.time()
+
+
+class _CallbackMetric:
+    """Valoare citită doar la export (ex. dimensiunea unei cozi); nu costă nimic pe hot path."""
+
+    def __init__(self, name: str, help: str, kind: str, read: Callable[[], float]):
+        self.name = name
+        self.help = help
+        self.kind = kind
+        self.read = read
+
+
+class MetricsRegistry:
+    def __init__(self, prefix: str = "homelab_"):
+        self.prefix = prefix
+        self.metrics: Dict[str, Any] = {}
+
+    def _register(self, metric):
+        existing = self.metrics.get(metric.name)
+        if isinstance(existing, MetricFamily) and isinstance(metric, MetricFamily):
+            return existing
+        self.metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, help: str, labelnames: Iterable[str] = ()) -> MetricFamily:
+        return self._register(MetricFamily(self.prefix + name, help, "counter", Counter, tuple(labelnames)))
+
+    def gauge(self, name: str, help: str, labelnames: Iterable[str] = ()) -> MetricFamily:
+        return self._register(MetricFamily(self.prefix + name, help, "gauge", Gauge, tuple(labelnames)))
+
+    def histogram(self, name: str, help: str, labelnames: Iterable[str] = (),
+                  buckets: Tuple[float, ...] = DEFAULT_BUCKETS) -> MetricFamily:
+        return self._register(MetricFamily(self.prefix + name, help, "histogram",
+                                           lambda: Histogram(buckets), tuple(labelnames)))
+
+    def gauge_func(self, name: str, help: str, read: Callable[[], float]):
+        """Gauge citit la export; o nouă înregistrare cu același nume o înlocuiește."""
+        self.metrics[self.prefix + name] = _CallbackMetric(self.prefix + name, help, "gauge", read)
+
+    def counter_func(self, name: str, help: str, read: Callable[[], float]):
+        self.metrics[self.prefix + name] = _CallbackMetric(self.prefix + name, help, "counter", read)
+
+    def render_prometheus(self) -> str:
+        """Formatul text Prometheus (exposition format 0.0.4)."""
+        lines: List[str] = []
+        for name, metric in self.metrics.items():
+            lines.append(f"# HELP {name} {metric.help}")
+            lines.append(f"# TYPE {name} {metric.kind}")
+            if isinstance(metric, _CallbackMetric):
+                lines.append(f"{name} {_format_value(_read(metric))}")
+                continue
+            for key, child in list(metric.children.items()):
+                labels = _format_labels(metric.labelnames, key)
+                if metric.kind != "histogram":
+                    lines.append(f"{name}{labels} {_format_value(child.value)}")
+                    continue
+                cumulative = 0
+                for bound, bucket_count in zip(child.buckets, child.counts):
+                    cumulative += bucket_count
+                    bucket_labels = _format_labels(metric.labelnames + ("le",), key + (_format_value(bound),))
+                    lines.append(f"{name}_bucket{bucket_labels} {cumulative}")
+                bucket_labels = _format_labels(metric.labelnames + ("le",), key + ("+Inf",))
+                lines.append(f"{name}_bucket{bucket_labels} {child.count}")
+                lines.append(f"{name}_sum{labels} {_format_value(child.sum)}")
+                lines.append(f"{name}_count{labels} {child.count}")
+        return "\n".join(lines) + "\n"
+
+    def as_json(self) -> Dict[str, Any]:
+        """Variantă compactă: nume fără prefix -> valoare (sau etichete -> valoare)."""
+        result: Dict[str, Any] = {}
+        for name, metric in self.metrics.items():
+            short = name[len(self.prefix):] if name.startswith(self.prefix) else name
+            if isinstance(metric, _CallbackMetric):
+                result[short] = _json_value(_read(metric))
+                continue
+            values = {
+                ",".join(key): child.as_dict() if metric.kind == "histogram" else _json_value(child.value)
+                for key, child in list(metric.children.items())
+            }
+            result[short] = values[""] if not metric.labelnames else values
+        return result
+
+
+def _read(metric: _CallbackMetric) -> float:
+    try:
+        return metric.read()
+    except Exception:
+        return math.nan
+
+
+def _json_value(value: float) -> Optional[float]:
+    """NaN/Inf nu există în JSON (FastAPI serializează cu allow_nan=False): devin null."""
+    if isinstance(value, float) and not math.isfinite(value):
+        return None
+    return value
+
+
+def _format_labels(names: Tuple[str, ...], values: Tuple[str, ...]) -> str:
+    if not names:
+        return ""
+    pairs = ",".join(
+        f'{name}="{value.replace(chr(92), chr(92) * 2).replace(chr(34), chr(92) + chr(34))}"'
+        for name, value in zip(names, values)
+    )
+    return "{" + pairs + "}"
+
+
+def _format_value(value: float) -> str:
+    if isinstance(value, float):
+        if math.isnan(value):
+            return "NaN"
+        if math.isinf(value):
+            return "+Inf" if value > 0 else "-Inf"
+        return repr(value)
+    return str(value)
+
+
+metrics = MetricsRegistry()
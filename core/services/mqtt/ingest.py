@@ -0,0 +1,100 @@
+import asyncio
+import logging
+from collections import deque
+from typing import Optional
+from config.settings import MQTT_INGEST_QUEUE_SIZE, MQTT_INGEST_BATCH_SIZE
+from services.metrics.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+
+class MqttIngest:
+    """
+    Etapa de ingestie MQTT: thread-ul de rețea paho doar pune mesajele brute
+    într-o coadă mărginită, iar bucla asyncio le decodează și le aplică în loturi
+    prin DeviceStateMachine.handle_messages (un lock și o notificare per lot).
+    """
+
+    def __init__(self, state_machine, max_queue: int = MQTT_INGEST_QUEUE_SIZE,
+                 batch_size: int = MQTT_INGEST_BATCH_SIZE):
+        self.state_machine = state_machine
+        self.batch_size = batch_size
+        # deque.append e thread-safe; la depășire se pierd cele mai vechi mesaje.
+        self.queue: deque = deque(maxlen=max_queue)
+        self.received = 0
+        self.dropped = 0
+        self.processed = 0
+        self.batches = 0
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._wakeup: Optional[asyncio.Event] = None
+        self._scheduled = False
+        self._task: Optional[asyncio.Task] = None
+        # Contoarele de mai sus sunt citite direct la export: on_message nu face nimic în plus.
+        metrics.counter_func("mqtt_messages_received_total", "MQTT messages received by on_message", lambda: self.received)
+        metrics.counter_func("mqtt_messages_dropped_total", "MQTT messages dropped because the ingest queue was full", lambda: self.dropped)
+        metrics.counter_func("mqtt_messages_processed_total", "MQTT messages applied to the state machine", lambda: self.processed)
+        metrics.counter_func("mqtt_ingest_batches_total", "Ingest batches applied to the state machine", lambda: self.batches)
+        metrics.gauge_func("mqtt_ingest_queue_depth", "MQTT messages waiting in the ingest queue", lambda: self.depth)
+
+    @property
+    def depth(self) -> int:
+        """Numărul de mesaje care așteaptă să fie procesate."""
+        return len(self.queue)
+
+    def get_stats(self):
+        return {
+            "depth": self.depth,
+            "capacity": self.queue.maxlen,
+            "received": self.received,
+            "dropped": self.dropped,
+            "processed": self.processed,
+            "batches": self.batches,
+        }
+
+    def start(self) -> asyncio.Task:
+        """Pornește consumatorul pe bucla curentă. Se apelează din contextul asyncio."""
+        self._loop = asyncio.get_running_loop()
+        self._wakeup = asyncio.Event()
+        self._task = asyncio.create_task(self.run())
+        return self._task
+
+    def stop(self):
+        if self._task:
+            self._task.cancel()
+            self._task = None
+
+    def submit(self, topic: str, payload: bytes):
+        """Apelat din thread-ul paho: nu decodează, nu printează și nu ia niciun lock."""
+        self.received += 1
+        if len(self.queue) == self.queue.maxlen:
+            self.dropped += 1
+        self.queue.append((topic, payload))
+        if not self._scheduled and self._loop is not None:
+            self._scheduled = True
+            try:
+                self._loop.call_soon_threadsafe(self._wakeup.set)
+            except RuntimeError:
+                # Bucla a fost închisă (shutdown).
+                pass
+
+    async def run(self):
+        logger.info("Starting MQTT ingest task")
+        while True:
+            await self._wakeup.wait()
+            self._wakeup.clear()
+            self._scheduled = False
+            while self.queue:
+                batch = []
+                while self.queue and len(batch) < self.batch_size:
+                    topic, payload = self.queue.popleft()
+                    batch.append((topic, payload.decode(errors="replace")))
+                try:
+                    self.state_machine.handle_messages(batch)
+                except Exception as e:
+                    logger.exception("Error applying MQTT batch: %s", e)
+                self.processed += len(batch)
+                self.batches += 1
+                if logger.isEnabledFor(logging.DEBUG):
+                    logger.debug("Applied MQTT batch of %d messages (%d queued)", len(batch), len(self.queue))
+                # Lasă și alte task-uri (WebSocket, API) să ruleze între loturi.
+                await asyncio.sleep(0)
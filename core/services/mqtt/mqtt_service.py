@@ -1,63 +1,79 @@
 import paho.mqtt.client as mqtt
 from config.settings import MQTT_BROKER, MQTT_PORT
 import json
-from threading import Lock
+import logging
 import asyncio
-import traceback
+from config.logging_config import RateLimitedLogger
 from services.state_machine.device_state_machine import DeviceStateMachine
+from services.mqtt.ingest import MqttIngest
+from services.mqtt.publisher import MqttPublisher, PUBLISHED
 
 client = mqtt.Client()
-new_devices_cache = {}
-cache_lock = Lock()
+publisher = MqttPublisher(client)
+logger = logging.getLogger(__name__)
+# Erorile din on_message pot apărea la fiecare mesaj; se loghează cel mult o dată pe interval.
+hot_logger = RateLimitedLogger(logger)
 
 state_machine = None
 connection_manager = None
+ingest = None
 
 def configure_mqtt(state_machine_instance, connection_manager_instance):
-    global state_machine, connection_manager
+    global state_machine, connection_manager, ingest
     state_machine = state_machine_instance
     connection_manager = connection_manager_instance
+    ingest = MqttIngest(state_machine_instance)
 
 event_loop = None
 
 def on_connect(client, userdata, flags, rc):
     if rc == 0:
-        print(f"Connected to MQTT Broker at {MQTT_BROKER}:{MQTT_PORT} with result code {rc}")
+        logger.info("Connected to MQTT Broker at %s:%s with result code %s", MQTT_BROKER, MQTT_PORT, rc)
         client.subscribe("shellies/#")  
     else:
-        print(f"Failed to connect to MQTT Broker with result code {rc}")
+        logger.error("Failed to connect to MQTT Broker with result code %s", rc)
 
 def on_message(client, userdata, msg):
+    # Rulează pe thread-ul de rețea paho: doar predă mesajul brut buclei asyncio.
     try:
-        payload = msg.payload.decode()
-        print(f"MQTT message received on topic {msg.topic}: {payload}")
-
-        state_machine.handle_message(msg.topic, payload)
+        ingest.submit(msg.topic, msg.payload)
     except Exception as e:
-        print(f"Error processing MQTT message: {e}")
+        hot_logger.error("on_message", "Error processing MQTT message: %s", e)
 
 def on_disconnect(client, userdata, rc):
     if rc != 0:
-        print(f"Unexpected disconnection from MQTT broker with result code {rc}")
+        logger.warning("Unexpected disconnection from MQTT broker with result code %s", rc)
         try:
             client.reconnect()
         except Exception as e:
-            print(f"Failed to reconnect to MQTT broker: {e}")
+            logger.error("Failed to reconnect to MQTT broker: %s", e)
 
 def start_mqtt():
+    """Pornește ingestia pe bucla curentă și apoi clientul paho. Se apelează din lifespan."""
+    ingest.start()
     client.on_connect = on_connect
     client.on_message = on_message
     client.on_disconnect = on_disconnect
+    client.on_publish = publisher.on_publish
     client.connect(MQTT_BROKER, MQTT_PORT, 60)
     client.loop_start()
 
+def stop_mqtt():
+    client.loop_stop()
+    client.disconnect()
+    ingest.stop()
+
 def safe_publish(topic: str, payload: str):
     try:
-        print(f"Publishing to MQTT topic: {topic}, payload: {payload}")
-        result = client.publish(topic, payload)
-        print(f"Publish result: {result.rc}")
-        return result
+        info = client.publish(topic, payload)
+        PUBLISHED.labels("sent").inc()
+        return info
     except Exception as e:
-        print(f"Error in safe_publish: {e}")
+        PUBLISHED.labels("error").inc()
+        logger.error("Error in safe_publish: %s", e)
         return None
 
+async def publish_many(messages, qos: int = None, timeout: float = None):
+    """Publică un lot de (cheie, topic, payload) și întoarce cheie -> confirmat (PUBACK)."""
+    return await publisher.publish_many(messages, qos=qos, timeout=timeout)
+
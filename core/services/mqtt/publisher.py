@@ -0,0 +1,120 @@
+import asyncio
+import logging
+import time
+from threading import Lock
+from typing import Dict, Hashable, List, Tuple
+import paho.mqtt.client as mqtt
+from config.settings import MQTT_PUBLISH_QOS, MQTT_PUBLISH_TIMEOUT
+from services.metrics.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+PUBLISHED = metrics.counter("mqtt_published_total", "MQTT messages published", ("result",))
+PUBLISH_SECONDS = metrics.histogram("mqtt_publish_batch_seconds", "Time from publish_many call to all acks or timeout")
+
+
+class MqttPublisher:
+    """
+    Publicare în masă prin clientul paho, fără a bloca bucla asyncio.
+    Un lot de (cheie, topic, payload) se trimite dintr-o singură rafală într-un thread
+    din executor, iar confirmările PUBACK (QoS 1) sunt urmărite după message id.
+    Rezultatul e un dicționar cheie -> succes, cu timeout.
+    """
+
+    # Câte confirmări „timpurii” (sosite înainte de înregistrare) păstrăm înainte de curățare.
+    EARLY_ACK_LIMIT = 4096
+
+    def __init__(self, client: mqtt.Client, qos: int = MQTT_PUBLISH_QOS,
+                 timeout: float = MQTT_PUBLISH_TIMEOUT):
+        self.client = client
+        self.qos = qos
+        self.timeout = timeout
+        self._lock = Lock()
+        self._pending: Dict[int, asyncio.Future] = {}
+        # mid -> momentul confirmării, pentru PUBACK-uri sosite înainte ca mid-ul să fie înregistrat.
+        self._early_acks: Dict[int, float] = {}
+
+    def on_publish(self, client, userdata, mid):
+        """Callback paho (thread-ul de rețea): marchează mesajul ca livrat."""
+        with self._lock:
+            future = self._pending.pop(mid, None)
+            if future is None:
+                self._early_acks[mid] = time.monotonic()
+                if len(self._early_acks) > self.EARLY_ACK_LIMIT:
+                    cutoff = time.monotonic() - self.timeout
+                    self._early_acks = {m: t for m, t in self._early_acks.items() if t >= cutoff}
+                return
+        try:
+            future.get_loop().call_soon_threadsafe(_resolve, future)
+        except RuntimeError:
+            # Bucla a fost închisă (shutdown).
+            pass
+
+    def _publish_batch(self, messages: List[Tuple[Hashable, str, str]], qos: int):
+        """Rulează în executor: pune toate mesajele în coada paho și întoarce (cheie, mid sau None)."""
+        issued = []
+        for key, topic, payload in messages:
+            try:
+                info = self.client.publish(topic, payload, qos=qos)
+            except Exception as e:
+                logger.error("Error publishing to %s: %s", topic, e)
+                PUBLISHED.labels("error").inc()
+                issued.append((key, None))
+                continue
+            if info.rc != mqtt.MQTT_ERR_SUCCESS:
+                PUBLISHED.labels("error").inc()
+            issued.append((key, info.mid if info.rc == mqtt.MQTT_ERR_SUCCESS else None))
+        return issued
+
+    async def publish_many(self, messages: List[Tuple[Hashable, str, str]], qos: int = None,
+                           timeout: float = None) -> Dict[Hashable, bool]:
+        """Publică toate mesajele și așteaptă confirmările. Întoarce cheie -> succes."""
+        if not messages:
+            return {}
+        qos = self.qos if qos is None else qos
+        timeout = self.timeout if timeout is None else timeout
+        loop = asyncio.get_running_loop()
+
+        started = time.monotonic()
+        issued = await loop.run_in_executor(None, self._publish_batch, messages, qos)
+
+        # O cheie reușește doar dacă toate mesajele ei au fost confirmate.
+        results: Dict[Hashable, bool] = {}
+
+        def record(key, ok):
+            results[key] = results.get(key, True) and ok
+
+        waiting: Dict[asyncio.Future, Tuple[Hashable, int]] = {}
+        with self._lock:
+            for key, mid in issued:
+                if mid is None:
+                    record(key, False)
+                elif qos == 0:
+                    record(key, True)
+                elif self._early_acks.get(mid, 0) >= started:
+                    del self._early_acks[mid]
+                    record(key, True)
+                else:
+                    future = loop.create_future()
+                    self._pending[mid] = future
+                    waiting[future] = (key, mid)
+
+        if waiting:
+            done, not_done = await asyncio.wait(waiting.keys(), timeout=timeout)
+            for future in done:
+                record(waiting[future][0], True)
+            if not_done:
+                with self._lock:
+                    for future in not_done:
+                        key, mid = waiting[future]
+                        self._pending.pop(mid, None)
+                        record(key, False)
+                PUBLISHED.labels("timeout").inc(len(not_done))
+        PUBLISHED.labels("sent").inc(sum(1 for _, mid in issued if mid is not None))
+        PUBLISH_SECONDS.observe(time.monotonic() - started)
+        return results
+
+
+def _resolve(future: asyncio.Future):
+    if not future.done():
+        future.set_result(True)
@@ -0,0 +1,66 @@
+import asyncio
+import logging
+import time
+from datetime import datetime, timezone
+from database.repository import entity_repository
+from config.settings import PERSIST_FLUSH_INTERVAL, PERSIST_FLUSH_THRESHOLD
+from services.metrics.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+
+class StatePersister:
+    """
+    Persistă write-behind statusul live din DeviceStateMachine în tabela Entity.
+    Dispozitivele modificate se adună în dirty_devices ale partițiilor și se scriu
+    într-o singură tranzacție, periodic sau când se strâng destule, nu per mesaj MQTT.
+    """
+
+    def __init__(self, state_machine, interval: float = PERSIST_FLUSH_INTERVAL,
+                 threshold: int = PERSIST_FLUSH_THRESHOLD):
+        self.state_machine = state_machine
+        self.interval = interval
+        self.threshold = threshold
+        self.flushes = 0
+        self.rows_written = 0
+        metrics.counter_func("persist_flushes_total", "Write-behind flushes of live device state", lambda: self.flushes)
+        metrics.counter_func("persist_rows_written_total", "Entity rows written by the state persister", lambda: self.rows_written)
+
+    async def run(self):
+        """Bucla de fundal: scrie la fiecare interval sau la atingerea pragului."""
+        logger.info("Starting state persister task")
+        seen_version = self.state_machine.version
+        while True:
+            try:
+                deadline = time.monotonic() + self.interval
+                while self.state_machine.dirty_count() < self.threshold:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    try:
+                        seen_version = await asyncio.wait_for(
+                            self.state_machine.wait_for_changes(seen_version), timeout=remaining
+                        )
+                    except asyncio.TimeoutError:
+                        break
+                await self.flush()
+            except Exception as e:
+                logger.exception("Error persisting device state: %s", e)
+                await asyncio.sleep(self.interval)
+
+    async def flush(self) -> int:
+        """Scrie toate dispozitivele modificate într-un singur batch. Întoarce numărul de rânduri."""
+        dirty = self.state_machine.take_dirty_devices()
+        if not dirty:
+            return 0
+        try:
+            await entity_repository.set_statuses({
+                device_id: (status, datetime.fromtimestamp(changed_at, tz=timezone.utc))
+                for device_id, (status, changed_at) in dirty.items()
+            })
+        except Exception:
+            self.state_machine.restore_dirty_devices(dirty)
+            raise
+        self.flushes += 1
+        self.rows_written += len(dirty)
+        return len(dirty)
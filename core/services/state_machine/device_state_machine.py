@@ -1,197 +1,582 @@
 import asyncio
+import itertools
 import json
-from typing import Dict, Any
+import logging
+import time
+from contextlib import contextmanager
+from typing import Dict, Any, List, Optional, Tuple
 from threading import Lock
-import traceback
 from database import db  # Conexiunea la baza de date
+from database.repository import entity_repository
+from integration.device_state import DeviceState
+from config.settings import CHANGE_LOG_SIZE, STATE_SHARDS
+from services.state_machine.topic_router import build_default_router
+from services.state_machine.room_index import RoomIndex
+from services.state_machine.group_index import GroupIndex
+from services.state_machine.state_shard import ShardedDevices, ShardSnapshot, StateShard
+from services.commands.tracker import CommandTracker
+from services.timeseries.timeseries_store import METRICS, TimeSeriesStore
+from services.metrics.metrics import metrics
+from config.logging_config import RateLimitedLogger
+
+logger = logging.getLogger(__name__)
+# Erorile de parsare pot apărea la fiecare mesaj; se loghează rar, cu numărul celor suprimate.
+hot_logger = RateLimitedLogger(logger)
+
+LOCK_HOLD_SECONDS = metrics.histogram("state_lock_hold_seconds", "Time handle_messages holds a shard lock per batch")
+BATCH_SIZE = metrics.histogram("state_batch_messages", "MQTT messages per handle_messages batch",
+                               buckets=(1, 5, 10, 25, 50, 100, 250, 500, 1000))
+PARSE_ERRORS = metrics.counter("mqtt_parse_errors_total", "MQTT messages that failed to parse")
 
 class DeviceStateMachine:
-    def __init__(self):
-        self.devices: Dict[str, Dict[str, Any]] = {}  
+    """
+    Starea live a dispozitivelor, partiționată în STATE_SHARDS partiții după hash-ul id-ului.
+    Fiecare partiție are lock, versiune și jurnal de modificări proprii, așa că ingestia unui lot
+    ține pe rând câte un singur lock de partiție, iar citirile (snapshot, delte, persistare) se
+    construiesc partiție cu partiție. `self.lock` protejează doar indexurile (camere, grupuri,
+    dispozitive noi); ordinea de achiziție este mereu self.lock, apoi lock-ul partiției.
+    Versiunile vin dintr-un contor global fără lock (itertools.count), luat sub lock-ul partiției.
+
+    Citirile complete nu iau niciun lock: fiecare modificare se face în `mutating()`, care la final
+    publică un ShardSnapshot imutabil al partiției, iar get_all_devices doar adună referințele
+    la snapshot-urile curente.
+    """
+
+    def __init__(self, shards: int = STATE_SHARDS):
+        self.shards: List[StateShard] = [StateShard(CHANGE_LOG_SIZE) for _ in range(max(shards, 1))]
+        self.devices = ShardedDevices(self.shards)
         self.new_devices: Dict[str, Dict[str, Any]] = {}  
-        self.rooms: Dict[str, Dict[str, Any]] = {} 
+        # Copie imutabilă a new_devices, înlocuită (nu modificată) la fiecare schimbare.
+        self.new_devices_snapshot: Dict[str, Dict[str, Any]] = {}
+        self.room_index = RoomIndex()
+        # Vedere a camerelor cu referințe la statusul live al dispozitivelor.
+        self.rooms: Dict[int, Dict[str, Any]] = self.room_index.rooms
+        self.group_index = GroupIndex()
         self.lock = Lock()
+        self.router = build_default_router()
+        # Sursa versiunilor: fiecare modificare primește următorul număr.
+        self._sequence = itertools.count(1)
+        # Crește când apar dispozitive noi anunțate, pentru reconcilierea cu baza de date.
+        self.pending_version = 0
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._changed: Optional[asyncio.Event] = None
+        # Comenzile trimise și încă neconfirmate de dispozitive (stare optimistă).
+        self.command_tracker = CommandTracker(self)
+        # Istoricul puterii și energiei (ring buffer + rollup-uri minut/oră/zi).
+        self.timeseries = TimeSeriesStore()
+        metrics.gauge_func("devices", "Adopted devices in the state cache", lambda: len(self.devices))
+        metrics.gauge_func("new_devices", "Announced devices waiting for adoption", lambda: len(self.new_devices))
+        metrics.gauge_func("state_version", "Global state version", lambda: self.version)
+        metrics.gauge_func("dirty_devices", "Devices changed but not yet persisted", self.dirty_count)
+        metrics.gauge_func("change_log_entries", "Entries in the delta change logs of all shards",
+                           lambda: sum(len(shard.change_log) for shard in self.shards))
+        metrics.gauge_func("state_shards", "Device state shards", lambda: len(self.shards))
+
+    @property
+    def version(self) -> int:
+        """Cea mai nouă versiune înregistrată în oricare partiție."""
+        return max(shard.version for shard in self.shards)
+
+    @property
+    def rooms_version(self) -> int:
+        return self.room_index.version
+
+    def shard(self, device_id: str) -> StateShard:
+        """Partiția unui dispozitiv; starea lui se modifică doar în `mutating(device_id)`."""
+        return self.devices.shard(device_id)
+
+    @contextmanager
+    def mutating(self, device_id: str):
+        """Lock-ul partiției dispozitivului, cu publicarea snapshot-ului la ieșire."""
+        with self.mutating_shard(self.shard(device_id)) as shard:
+            yield shard
+
+    @contextmanager
+    def mutating_shard(self, shard: StateShard):
+        with shard.lock:
+            shard.writing = next(self._sequence)
+            try:
+                yield shard
+            finally:
+                shard.publish()
+                shard.writing = None
+
+    def publish_snapshots(self):
+        """Reconstruiește snapshot-urile tuturor partițiilor (după încărcarea directă a dispozitivelor)."""
+        for shard in self.shards:
+            with self.mutating_shard(shard):
+                shard.publish(all_devices=True)
+
+    def device_ids(self) -> List[str]:
+        return self.devices.keys()
+
+    def dirty_count(self) -> int:
+        return sum(len(shard.dirty_devices) for shard in self.shards)
 
     async def initialize_cache(self):
-        """Încarcă dispozitivele din baza de date în cache."""
-        devices = await db.entity.find_many()
+        """Încarcă dispozitivele și indexul camerelor din baza de date în cache."""
+        devices = await entity_repository.find_many()
+        rooms = await db.room.find_many(include={"entities": True})
+        groups = await db.group.find_many(include={"entities": True})
+        scenes = await db.scene.find_many()
         with self.lock:
             for device in devices:
                 self.devices[device.id] = {
                     "id": device.id,
                     "name": device.name,
                     "type": device.type,
-                    "status": json.loads(device.status) if device.status else {},
+                    "status": DeviceState(json.loads(device.status) if device.status else None),
                 }
-        print(f"Cache initialized with {len(self.devices)} devices.")
+            self.room_index.load(rooms, self.devices)
+            self.group_index.load(groups, scenes)
+        self.publish_snapshots()
+        logger.info("Cache initialized with %d devices, %d rooms, %d groups and %d scenes.",
+                    len(self.devices), len(self.rooms), len(self.group_index.groups), len(self.group_index.scenes))
 
     async def get_rooms_data(self):
-        """Returnează datele despre camerele din baza de date, inclusiv dispozitivele asociate."""
+        """Returnează camerele din indexul din memorie, cu statusul live al dispozitivelor."""
+        return self.rooms
+
+    async def refresh_rooms(self):
+        """Reîncarcă tot indexul camerelor (o singură interogare)."""
+        rooms = await db.room.find_many(include={"entities": True})
+        with self.lock:
+            self.room_index.load(rooms, self.devices)
+        logger.info("Room index reloaded with %d rooms.", len(self.rooms))
+
+    async def refresh_room(self, room_id: int):
+        """Reîncarcă o singură cameră după ce a fost creată, modificată sau ștearsă."""
+        room = await db.room.find_unique(where={"id": room_id}, include={"entities": True})
+        promoted = False
+        with self.lock:
+            if room is None:
+                self.room_index.remove_room(room_id)
+            else:
+                # Entitățile create din frontend pentru dispozitive anunțate sunt adoptate aici.
+                for entity in room.entities:
+                    if entity.id not in self.devices:
+                        self._promote_device_locked(entity)
+                        promoted = True
+                self.room_index.set_room(room, self.devices)
+        if promoted:
+            self._notify_changed()
+
+    async def refresh_groups(self):
+        """Reîncarcă toate grupurile și scenele."""
+        groups = await db.group.find_many(include={"entities": True})
+        scenes = await db.scene.find_many()
+        with self.lock:
+            self.group_index.load(groups, scenes)
+
+    async def refresh_group(self, group_id: int):
+        """Reîncarcă un grup după ce a fost creat, modificat sau șters."""
+        group = await db.group.find_unique(where={"id": group_id}, include={"entities": True})
+        with self.lock:
+            if group is None:
+                self.group_index.remove_group(group_id)
+            else:
+                self.group_index.set_group(group)
+
+    async def refresh_scene(self, scene_id: int):
+        """Reîncarcă o scenă după ce a fost creată, modificată sau ștearsă."""
+        scene = await db.scene.find_unique(where={"id": scene_id})
+        with self.lock:
+            if scene is None:
+                self.group_index.remove_scene(scene_id)
+            else:
+                self.group_index.set_scene(scene)
+
+    def get_groups_data(self) -> List[Dict[str, Any]]:
+        with self.lock:
+            return [dict(group, entity_ids=list(group["entity_ids"])) for group in self.group_index.groups.values()]
+
+    def get_scenes_data(self) -> List[Dict[str, Any]]:
+        with self.lock:
+            return [dict(scene) for scene in self.group_index.scenes.values()]
+
+    def get_scene(self, scene_id: int) -> Optional[Dict[str, Any]]:
+        with self.lock:
+            scene = self.group_index.scenes.get(scene_id)
+            return dict(scene) if scene is not None else None
+
+    def resolve_targets(self, device_ids=None, room_id: int = None, group_id: int = None,
+                        device_type: str = None) -> Optional[List[str]]:
+        """
+        Rezolvă ținta unei comenzi din indexurile din memorie.
+        device_ids se folosesc ca atare; pentru room_id / group_id se întorc doar
+        dispozitivele cunoscute (opțional filtrate după tip). None dacă camera
+        sau grupul nu există.
+        """
+        if device_ids:
+            return device_ids if isinstance(device_ids, list) else [device_ids]
+        with self.lock:
+            if room_id is not None:
+                members = self.room_index.room_entity_ids(room_id)
+            elif group_id is not None:
+                members = self.group_index.group_entity_ids(group_id)
+            else:
+                return None
+            if members is None:
+                return None
+            return [
+                device_id for device_id in members
+                if device_id in self.devices
+                and (device_type is None or self.devices[device_id]["type"] == device_type)
+            ]
+
+    def _promote_device_locked(self, entity):
+        """
+        Mută o entitate adoptată din new_devices în devices. Se apelează cu self.lock deținut;
+        lock-ul partiției dispozitivului se ia aici.
+        """
+        device_id = entity.id
+        record = {
+            "id": entity.id,
+            "name": entity.name,
+            "type": entity.type,
+            "status": DeviceState(json.loads(entity.status) if entity.status else None),
+        }
+        with self.mutating(device_id):
+            self.devices[device_id] = record
+            if self.new_devices.pop(device_id, None) is not None:
+                self.new_devices_snapshot = dict(self.new_devices)
+            self._record_change("devices", device_id, dict(record, status=record["status"].as_dict()))
+            self._record_change("adopted", device_id, {})
+        self.room_index.assign_entity(entity, self.devices)
+
+    def _record_change(self, section: str, device_id: str, fields: Dict[str, Any]):
+        """Înregistrează o modificare în jurnalul partiției. Se apelează cu lock-ul partiției deținut."""
+        self.shard(device_id).record(next(self._sequence), section, device_id, fields)
+
+    def _notify_changed(self):
+        """Trezește bucla de broadcast; poate fi apelată din orice thread."""
+        loop = self._loop
+        if loop is None:
+            return
         try:
+            loop.call_soon_threadsafe(self._changed.set)
+        except RuntimeError:
+            # Bucla a fost închisă (shutdown).
+            pass
 
-            rooms = await db.room.find_many(
-                include={
-                    "entities": True 
-                }
-            )
+    def _apply_status(self, device_id: str, values: Dict[str, Any], now: float, touch: bool = True) -> bool:
+        """
+        Aplică doar câmpurile care diferă. Se apelează cu lock-ul partiției dispozitivului deținut.
+        touch=False pentru valori care nu vin de la dispozitiv (stare optimistă, rollback):
+        acestea nu marchează dispozitivul de persistat.
+        """
+        shard = self.shard(device_id)
+        status = shard.devices[device_id]["status"]
+        if touch:
+            status.touch(now)
+        changed = status.apply(values)
+        if not changed:
+            return False
+        shard.record(next(self._sequence), "devices", device_id, {"status": changed})
+        if touch:
+            shard.dirty_devices[device_id] = now
+        return True
 
-            # Actualizează cache-ul camerelor
-            with self.lock:
-                self.rooms = {
-                    room.id: {
-                        "id": room.id,
-                        "name": room.name,
-                        "status": json.loads(room.status) if room.status else {},
-                        "image": room.image,
-                        "entities": [
-                            {
-                                "id": entity.id,
-                                "name": entity.name,
-                                "type": entity.type,
-                                "manufacturer": entity.manufacturer,
-                                "model": entity.model,
-                                "status": json.loads(entity.status) if entity.status else {},
-                                "config": json.loads(entity.config) if entity.config else {},
-                                "lastUpdated": entity.lastUpdated.isoformat() if entity.lastUpdated else None,
-                            }
-                            for entity in room.entities
-                        ],
-                    }
-                    for room in rooms
-                }
+    def _discard_status(self, device_id: str, fields: List[str]) -> bool:
+        """
+        Scoate câmpurile din status (rollback pentru valori pe care dispozitivul nu le-a
+        raportat niciodată). În delta apar ca null. Se apelează cu lock-ul partiției deținut.
+        """
+        shard = self.shard(device_id)
+        status = shard.devices[device_id]["status"]
+        removed = {field: None for field in fields if status.discard(field)}
+        if not removed:
+            return False
+        shard.record(next(self._sequence), "devices", device_id, {"status": removed})
+        return True
+
+    def take_dirty_devices(self) -> Dict[str, Tuple[Dict[str, Any], float]]:
+        """
+        Preia dispozitivele modificate: device_id -> (copie a statusului, ultima modificare).
+        Câmpurile încă neconfirmate se persistă cu ultima valoare raportată, nu cu cea optimistă.
+        """
+        tracker = self.command_tracker
+        result = {}
+        for shard in self.shards:
+            with shard.lock:
+                dirty, shard.dirty_devices = shard.dirty_devices, {}
+                for device_id, changed_at in dirty.items():
+                    device = shard.devices.get(device_id)
+                    if device is not None:
+                        status = device["status"].as_dict()
+                        if device_id in tracker.pending:
+                            tracker.reported_locked(device_id, status)
+                        result[device_id] = (status, changed_at)
+        return result
+
+    def restore_dirty_devices(self, dirty: Dict[str, Tuple[Dict[str, Any], float]]):
+        """Repune dispozitivele în lista de persistat după o scriere eșuată."""
+        for device_id, (_, changed_at) in dirty.items():
+            shard = self.shard(device_id)
+            with shard.lock:
+                shard.dirty_devices.setdefault(device_id, changed_at)
+
+    async def wait_for_changes(self, since_version: int) -> int:
+        """Așteaptă până când versiunea stării depășește since_version."""
+        if self._loop is None:
+            self._loop = asyncio.get_running_loop()
+            self._changed = asyncio.Event()
+        while self.version <= since_version:
+            self._changed.clear()
+            if self.version > since_version:
+                break
+            await self._changed.wait()
+        return self.version
+
+    def get_changes_since(self, since_version: int) -> Optional[Dict[str, Any]]:
+        """
+        Returnează modificările comasate de după since_version.
+        Întoarce None dacă jurnalul nu mai acoperă intervalul cerut
+        (clientul a rămas prea mult în urmă și are nevoie de snapshot complet).
+        """
+        # Orice versiune mai mică decât `limit` a fost deja luată de un writer care ține lock-ul
+        # partiției până o înregistrează, deci e vizibilă când trecem pe la acea partiție.
+        # Modificările cu versiuni mai noi rămân pentru delta următoare.
+        limit = next(self._sequence)
+        version = limit - 1
+        if since_version >= version:
+            return {"tag": "delta", "since": since_version, "version": version, "changes": {}}
+        if since_version < 0:
+            return None
 
-            print(f"Cache updated with {len(self.rooms)} rooms.")
-            return self.rooms
+        entries = []
+        device_versions: Dict[str, int] = {}
+        for shard in self.shards:
+            with shard.lock:
+                if shard.version <= since_version:
+                    continue
+                if shard.evicted_through > since_version:
+                    return None
+                shard_entries = shard.changes_between(since_version, limit)
+                for _, _, device_id, _ in shard_entries:
+                    device_versions[device_id] = min(shard.device_versions.get(device_id, version), version)
+            entries.extend(shard_entries)
+        entries.sort(key=lambda entry: entry[0])
 
-        except Exception as e:
-            print(f"Error fetching rooms data: {e}")
-            return {}
+        changes: Dict[str, Dict[str, Any]] = {}
+        new_devices: Dict[str, Dict[str, Any]] = {}
+        adopted = []
+        for _, section, device_id, fields in entries:
+            if section == "new_devices":
+                new_devices[device_id] = fields
+                continue
+            if section == "adopted":
+                adopted.append(device_id)
+                new_devices.pop(device_id, None)
+                continue
+            record = changes.setdefault(device_id, {})
+            for key, value in fields.items():
+                if key == "status":
+                    record.setdefault("status", {}).update(value)
+                else:
+                    record[key] = value
+        for device_id, record in changes.items():
+            record["version"] = device_versions[device_id]
+
+        delta = {"tag": "delta", "since": since_version, "version": version, "changes": changes}
+        if new_devices:
+            delta["new_devices"] = new_devices
+        if adopted:
+            delta["adopted"] = adopted
+        return delta
 
     def clear_new_devices(self):
         """Golește cache-ul de dispozitive noi."""
         with self.lock:
             self.new_devices.clear()
-        print("New devices cache cleared.")
+            self.new_devices_snapshot = {}
+        logger.info("New devices cache cleared.")
 
     def handle_message(self, topic: str, payload: str):
-        """Procesează mesajele primite de la MQTT și actualizează cache-ul."""
-        try:
-            if "announce" in topic:
-                payload_json = json.loads(payload)
-                device_id = payload_json.get("id")
-                if device_id:
-                    self.add_new_device(payload_json)
-                    return
-
-            device_id = topic.split("/")[1] if len(topic.split("/")) > 1 else None
-            
-            if not device_id:
-                print(f"Could not extract device ID from topic: {topic}")
-                return
+        """Procesează un singur mesaj MQTT și actualizează cache-ul."""
+        self.handle_messages([(topic, payload)])
 
+    def handle_messages(self, messages: List[Tuple[str, str]]):
+        """
+        Procesează un lot de mesaje MQTT: parsarea se face în afara lock-ului,
+        apoi toate actualizările se aplică sub o singură achiziție a lock-ului
+        și se emite o singură notificare.
+        """
+        parsed = []
+        for topic, payload in messages:
             try:
-                payload_json = json.loads(payload)
-                if isinstance(payload_json, dict):
-                    with self.lock:
-                        if device_id in self.devices:
-                            self.devices[device_id]["status"].update(payload_json)
-                            print(f"Updated status for device {device_id}: {payload_json}")
-                        else:
-                            print(f"Device {device_id} not found in cache.")
-                else:
-                    self.handle_simple_value(device_id, topic, payload_json)
-            except json.JSONDecodeError:
-                self.handle_non_json_value(device_id, topic, payload)
-        except Exception as e:
-            print(f"Error handling message for topic {topic}: {e}")
-
-    def handle_simple_value(self, device_id: str, topic: str, value: Any):
-        """Procesează valori simple (numere, boolean) pentru un dispozitiv."""
-        with self.lock:
-            if device_id in self.devices:
-                topic_name = topic.split("/")[-1]  
-                self.devices[device_id]["status"][topic_name] = value
-                print(f"Updated simple value for device {device_id}: {topic_name}={value}")
-            else:
-                print(f"Device {device_id} not found in cache for simple value: {topic}={value}")
+                item = self._parse_message(topic, payload)
+            except Exception as e:
+                PARSE_ERRORS.inc()
+                hot_logger.warning("parse", "Error handling message for topic %s: %s", topic, e)
+                continue
+            if item:
+                parsed.append(item)
+        if not parsed:
+            return
 
-    def handle_non_json_value(self, device_id: str, topic: str, value: str):
-        """Procesează valori non-JSON (text simplu) pentru un dispozitiv."""
-        with self.lock:
-            if device_id in self.devices:
-                topic_name = topic.split("/")[-1]
-                if value.lower() == "on":
-                    converted_value = True
-                elif value.lower() == "off":
-                    converted_value = False
-                elif value.lower() in ["true", "false"]:
-                    converted_value = value.lower() == "true"
-                else:
-                    converted_value = value
-                    
-                self.devices[device_id]["status"][topic_name] = converted_value
-                print(f"Updated non-JSON value for device {device_id}: {topic_name}={converted_value}")
+        changed = False
+        now = time.time()
+        received_at = time.monotonic()
+        tracker = self.command_tracker
+        samples = []
+        announces = []
+        by_shard: Dict[int, List[Tuple[str, Dict[str, Any]]]] = {}
+        count = len(self.shards)
+        BATCH_SIZE.observe(len(parsed))
+        for kind, device_id, values in parsed:
+            if kind == "announce":
+                announces.append(values)
             else:
-                print(f"Device {device_id} not found in cache for non-JSON value: {topic}={value}")
+                by_shard.setdefault(hash(device_id) % count, []).append((device_id, values))
+        # Ordinea mesajelor aceluiași dispozitiv se păstrează: toate sunt în aceeași partiție.
+        for index, items in by_shard.items():
+            shard = self.shards[index]
+            with self.mutating_shard(shard):
+                locked_at = time.perf_counter()
+                for device_id, values in items:
+                    if device_id not in shard.devices:
+                        continue
+                    if device_id in tracker.pending:
+                        version = shard.version
+                        values = tracker.reconcile_locked(device_id, values, received_at)
+                        changed |= shard.version != version
+                        # Confirmările și noile ținte de rollback nu schimbă starea din memorie,
+                        # dar schimbă valorile raportate care se persistă.
+                        shard.dirty_devices[device_id] = now
+                    changed |= self._apply_status(device_id, values, now)
+                    for metric in METRICS:
+                        if metric in values:
+                            samples.append((device_id, metric, values[metric]))
+                LOCK_HOLD_SECONDS.observe(time.perf_counter() - locked_at)
+        if announces:
+            with self.lock:
+                for values in announces:
+                    changed |= self._add_new_device_locked(values)
+        if samples:
+            self.timeseries.record_many(samples, now)
+        if changed:
+            self._notify_changed()
+
+    def _parse_message(self, topic: str, payload: str) -> Optional[Tuple[str, str, Dict[str, Any]]]:
+        """Transformă (topic, payload) în (tip, device_id, valori) fără a atinge starea."""
+        match = self.router.match(topic)
+        if match is None:
+            return None
+        route = match.route
+        value = route.parser(payload)
+
+        if route.field == "announce":
+            device_id = value.get("id")
+            return ("announce", device_id, value) if device_id else None
+        if route.field is None:
+            return "status", match.device_id, value
+        return "status", match.device_id, {route.field: value}
 
     async def get_all_devices(self) -> Dict[str, Dict[str, Any]]:
-        """Returnează toate dispozitivele din cache."""
+        """
+        Toate dispozitivele, din snapshot-urile publicate, fără niciun lock. Înregistrările sunt
+        imutabile și partajate între snapshot-uri: nu se modifică. `version` e cea mai mare versiune
+        pentru care toate modificările sunt incluse; o partiție în curs de modificare o limitează
+        la versiunea de dinaintea modificării (deltele ulterioare o reaplică, idempotent).
+        """
+        version, snapshots = self.published_snapshots()
+        devices: Dict[str, Dict[str, Any]] = {}
+        for snapshot in snapshots:
+            devices.update(snapshot.devices)
+        return {"devices": devices, "new_devices": self.new_devices_snapshot, "version": version}
+
+    def published_snapshots(self) -> Tuple[int, List[ShardSnapshot]]:
+        """
+        Snapshot-urile publicate ale tuturor partițiilor, citite o singură dată și fără lock,
+        plus versiunea până la care sunt complete (vezi get_all_devices).
+        """
+        version = next(self._sequence) - 1
+        snapshots = []
+        for shard in self.shards:
+            writing = shard.writing
+            snapshot = shard.snapshot
+            if writing is not None and writing < version:
+                version = writing
+            snapshots.append(snapshot)
+        return version, snapshots
+
+    def copy_rooms(self) -> Tuple[int, List[Dict[str, Any]]]:
+        """
+        Copie a camerelor (cu intrările entităților copiate superficial) și versiunea indexului,
+        luate sub lock. Statusul din intrări e obiectul live; se înlocuiește înainte de serializare.
+        """
         with self.lock:
-            result = {
-                "devices": self.devices,
-                "new_devices": self.new_devices
-            }
-            return result
-        
+            rooms = [
+                dict(room, entities=[dict(entry) for entry in room["entities"]])
+                for room in self.room_index.rooms.values()
+            ]
+            return self.room_index.version, rooms
+
     def add_new_device(self, device_data: Dict[str, Any]):
         """Adaugă un dispozitiv nou în cache-ul de dispozitive noi."""
         device_id = device_data.get("id")
         if not device_id:
-            print("Device ID is missing in announce message.")
+            logger.warning("Device ID is missing in announce message.")
             return
 
         with self.lock:
-            if device_id not in self.devices and device_id not in self.new_devices:
-                self.new_devices[device_id] = {
-                    "id": device_id,
-                    "name": device_data.get("id"),
-                    "type": device_data.get("model", "unknown"),
-                    "ip": device_data.get("ip"),
-                    "mac": device_data.get("mac"),
-                    "fw_ver": device_data.get("fw_ver"),
-                    "new_fw": device_data.get("new_fw"),
-                }
-                print(f"New device added to new_devices cache: {device_id}")
-            else:
-                print(f"Device {device_id} already exists in cache.")
+            added = self._add_new_device_locked(device_data)
+        if added:
+            self._notify_changed()
+
+    def _add_new_device_locked(self, device_data: Dict[str, Any]) -> bool:
+        """Adaugă dispozitivul anunțat dacă e necunoscut. Se apelează cu self.lock deținut."""
+        device_id = device_data.get("id")
+        if device_id in self.devices or device_id in self.new_devices:
+            return False
+        self.new_devices[device_id] = {
+            "id": device_id,
+            "name": device_data.get("id"),
+            "type": device_data.get("model", "unknown"),
+            "ip": device_data.get("ip"),
+            "mac": device_data.get("mac"),
+            "fw_ver": device_data.get("fw_ver"),
+            "new_fw": device_data.get("new_fw"),
+        }
+        with self.mutating(device_id):
+            self.new_devices_snapshot = dict(self.new_devices)
+            self._record_change("new_devices", device_id, dict(self.new_devices[device_id]))
+        self.pending_version += 1
+        logger.info("New device added to new_devices cache: %s", device_id)
+        return True
+
+    async def adopt_devices(self, device_ids: List[str]) -> int:
+        """
+        Promovează în devices entitățile cu id-urile date care există în baza de date,
+        cu o singură interogare (id in ...). Întoarce numărul de dispozitive promovate.
+        """
+        if not device_ids:
+            return 0
+        entities = await entity_repository.find_many_by_ids(device_ids)
+        promoted = 0
+        with self.lock:
+            for entity in entities:
+                if entity.id not in self.devices:
+                    self._promote_device_locked(entity)
+                    promoted += 1
+        if promoted:
+            self._notify_changed()
+            logger.info("Promoted %d device(s) from new_devices to devices cache.", promoted)
+        return promoted
 
     async def process_new_devices(self):
-        """Verifică periodic dacă dispozitivele noi există în baza de date."""
-        print("Starting process_new_devices task")
+        """Reconciliază dispozitivele noi cu baza de date doar când lista lor se schimbă."""
+        logger.info("Starting process_new_devices task")
+        seen_pending_version = -1
         while True:
             try:
-                print("Checking for new devices in database")
-                async with asyncio.Lock():  
-                    for device_id in list(self.new_devices.keys()):
-                        print(f"Checking device {device_id} in database")
-                        device = await db.entity.find_unique(where={"id": device_id})
-                        print(f"Database check result for {device_id}: {'Found' if device else 'Not found'}")
-                        if device:
-                            self.devices[device_id] = {
-                                "id": device.id,
-                                "name": device.name,
-                                "type": device.type,
-                                "status": json.loads(device.status) if device.status else {},
-                            }
-                            print(f"Device {device_id} moved from new_devices to devices cache.")
-                            del self.new_devices[device_id]
-                print("Finished checking for new devices, sleeping for 5 seconds")
-                await asyncio.sleep(5) 
+                if self.pending_version != seen_pending_version:
+                    seen_pending_version = self.pending_version
+                    with self.lock:
+                        pending = list(self.new_devices)
+                    await self.adopt_devices(pending)
+                await self.wait_for_changes(self.version)
             except Exception as e:
-                print(f"Error processing new devices: {e}")
-                traceback.print_exc() 
-
-    from prisma import Prisma
-
-
-   
\ No newline at end of file
+                logger.exception("Error processing new devices: %s", e)
+                await asyncio.sleep(5)
@@ -0,0 +1,57 @@
+import json
+import logging
+from typing import Any, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class GroupIndex:
+    """
+    Grupurile numite și scenele, ținute în memorie ca să poată fi folosite drept
+    ținte de comandă fără interogări la fiecare mesaj. Se reîncarcă doar la
+    modificări. Toate metodele se apelează cu lock-ul mașinii de stare deținut.
+    """
+
+    def __init__(self):
+        self.groups: Dict[int, Dict[str, Any]] = {}
+        self.scenes: Dict[int, Dict[str, Any]] = {}
+
+    def load(self, groups, scenes):
+        """Reconstruiește indexul din grupurile citite cu include={"entities": True} și din scene."""
+        self.groups.clear()
+        self.scenes.clear()
+        for group in groups:
+            self.set_group(group)
+        for scene in scenes:
+            self.set_scene(scene)
+
+    def set_group(self, group):
+        self.groups[group.id] = {
+            "id": group.id,
+            "name": group.name,
+            "entity_ids": [entity.id for entity in group.entities],
+        }
+
+    def remove_group(self, group_id: int):
+        self.groups.pop(group_id, None)
+
+    def set_scene(self, scene):
+        try:
+            actions = json.loads(scene.actions) if scene.actions else []
+        except json.JSONDecodeError:
+            logger.warning("Invalid actions for scene %s, ignoring them", scene.id)
+            actions = []
+        self.scenes[scene.id] = {
+            "id": scene.id,
+            "name": scene.name,
+            "actions": actions if isinstance(actions, list) else [],
+        }
+
+    def remove_scene(self, scene_id: int):
+        self.scenes.pop(scene_id, None)
+
+    def group_entity_ids(self, group_id: int) -> Optional[List[str]]:
+        group = self.groups.get(group_id)
+        if group is None:
+            return None
+        return list(group["entity_ids"])
@@ -0,0 +1,103 @@
+import json
+from typing import Any, Dict, List, Optional
+
+
+class RoomIndex:
+    """
+    Indexul cameră ↔ entitate, încărcat o dată la pornire și actualizat doar
+    când se schimbă camerele sau asignările. Intrările entităților referă
+    dicționarul de status live din DeviceStateMachine.devices, nu o copie.
+    Toate metodele se apelează cu lock-ul mașinii de stare deținut.
+    """
+
+    def __init__(self):
+        self.rooms: Dict[int, Dict[str, Any]] = {}
+        self.entity_rooms: Dict[str, int] = {}
+        self._entries: Dict[str, Dict[str, Any]] = {}
+        self.version = 0
+
+    def load(self, rooms, devices: Dict[str, Dict[str, Any]]):
+        """Reconstruiește indexul din camerele citite cu include={"entities": True}."""
+        self.rooms.clear()
+        self.entity_rooms.clear()
+        self._entries.clear()
+        for room in rooms:
+            self._add_room(room, devices)
+        self.version += 1
+
+    def set_room(self, room, devices: Dict[str, Dict[str, Any]]):
+        """Adaugă sau înlocuiește o cameră, mutând entitățile care aparțineau altor camere."""
+        self._drop_room(room.id)
+        for entity in room.entities:
+            self._detach(entity.id)
+        self._add_room(room, devices)
+        self.version += 1
+
+    def remove_room(self, room_id: int):
+        if self._drop_room(room_id):
+            self.version += 1
+
+    def assign_entity(self, entity, devices: Dict[str, Dict[str, Any]]):
+        """Actualizează camera unei entități (entity.roomId poate fi None)."""
+        self._detach(entity.id)
+        room = self.rooms.get(entity.roomId) if entity.roomId is not None else None
+        if room is not None:
+            entry = self._entity_entry(entity, devices)
+            room["entities"].append(entry)
+            self._entries[entity.id] = entry
+            self.entity_rooms[entity.id] = entity.roomId
+        self.version += 1
+
+    def room_entity_ids(self, room_id: int) -> Optional[List[str]]:
+        room = self.rooms.get(room_id)
+        if room is None:
+            return None
+        return [entry["id"] for entry in room["entities"]]
+
+    def _add_room(self, room, devices: Dict[str, Dict[str, Any]]):
+        entries = []
+        for entity in room.entities:
+            entry = self._entity_entry(entity, devices)
+            entries.append(entry)
+            self._entries[entity.id] = entry
+            self.entity_rooms[entity.id] = room.id
+        self.rooms[room.id] = {
+            "id": room.id,
+            "name": room.name,
+            "status": json.loads(room.status) if room.status else {},
+            "image": room.image,
+            "entities": entries,
+        }
+
+    def _drop_room(self, room_id: int) -> bool:
+        room = self.rooms.pop(room_id, None)
+        if room is None:
+            return False
+        for entry in room["entities"]:
+            self._entries.pop(entry["id"], None)
+            self.entity_rooms.pop(entry["id"], None)
+        return True
+
+    def _detach(self, entity_id: str):
+        room_id = self.entity_rooms.pop(entity_id, None)
+        entry = self._entries.pop(entity_id, None)
+        if room_id is not None and entry is not None and room_id in self.rooms:
+            self.rooms[room_id]["entities"].remove(entry)
+
+    @staticmethod
+    def _entity_entry(entity, devices: Dict[str, Dict[str, Any]]) -> Dict[str, Any]:
+        device = devices.get(entity.id)
+        if device is not None:
+            status = device["status"]
+        else:
+            status = json.loads(entity.status) if entity.status else {}
+        return {
+            "id": entity.id,
+            "name": entity.name,
+            "type": entity.type,
+            "manufacturer": entity.manufacturer,
+            "model": entity.model,
+            "status": status,
+            "config": json.loads(entity.config) if entity.config else {},
+            "lastUpdated": entity.lastUpdated.isoformat() if entity.lastUpdated else None,
+        }
@@ -0,0 +1,126 @@
+from collections import deque
+from threading import Lock
+from typing import Any, Dict, Iterator, List, NamedTuple, Optional, Set, Tuple
+
+
+class ShardSnapshot(NamedTuple):
+    """
+    Vederea publicată a unei partiții: device_id -> înregistrare serializabilă. Nici dicționarul,
+    nici înregistrările nu se mai modifică după publicare; snapshot-ul următor reutilizează
+    înregistrările dispozitivelor neschimbate.
+    """
+    version: int
+    devices: Dict[str, Dict[str, Any]]
+
+
+class StateShard:
+    """
+    O partiție a dispozitivelor din DeviceStateMachine, aleasă după hash-ul id-ului.
+    Are propriul lock, versiune, jurnal de modificări și set de dispozitive nepersistate;
+    toate câmpurile se citesc și se modifică doar cu `lock` deținut, cu excepția `snapshot`
+    și `writing`, care se citesc fără lock.
+    """
+
+    __slots__ = ("lock", "devices", "version", "device_versions", "change_log", "evicted_through", "dirty_devices",
+                 "snapshot", "writing", "touched")
+
+    def __init__(self, log_size: int):
+        self.lock = Lock()
+        self.devices: Dict[str, Dict[str, Any]] = {}
+        # Ultima versiune globală înregistrată în această partiție.
+        self.version = 0
+        self.device_versions: Dict[str, int] = {}
+        # Intrări (versiune, secțiune, device_id, câmpuri modificate), în ordinea versiunii.
+        self.change_log: deque = deque(maxlen=log_size)
+        # Versiunea celei mai noi intrări eliminate din jurnal; deltele de dinainte nu mai pot fi construite.
+        self.evicted_through = 0
+        self.dirty_devices: Dict[str, float] = {}
+        self.snapshot = ShardSnapshot(0, {})
+        # Versiunea luată la începutul unei modificări în curs (None dacă nu e niciuna);
+        # toate versiunile înregistrate de acea modificare sunt mai mari.
+        self.writing: Optional[int] = None
+        # Dispozitivele a căror înregistrare s-a schimbat de la ultimul snapshot publicat.
+        self.touched: Set[str] = set()
+
+    def record(self, version: int, section: str, device_id: str, fields: Dict[str, Any]):
+        if section != "new_devices":
+            self.touched.add(device_id)
+        log = self.change_log
+        if len(log) == log.maxlen:
+            self.evicted_through = log[0][0]
+        log.append((version, section, device_id, fields))
+        self.version = version
+        self.device_versions[device_id] = version
+
+    def publish(self, all_devices: bool = False):
+        """
+        Publică un snapshot nou (copy-on-write): se copiază doar dicționarul partiției, iar
+        înregistrările se reconstruiesc numai pentru dispozitivele modificate.
+        """
+        if not self.touched and not all_devices:
+            return
+        devices = dict(self.snapshot.devices)
+        for device_id in (list(self.devices) if all_devices else self.touched):
+            record = self.devices.get(device_id)
+            if record is None:
+                devices.pop(device_id, None)
+            else:
+                devices[device_id] = dict(record, status=record["status"].as_dict())
+        self.touched = set()
+        self.snapshot = ShardSnapshot(self.version, devices)
+
+    def changes_between(self, since_version: int, limit: int) -> List[Tuple[int, str, str, Dict[str, Any]]]:
+        """Intrările cu since_version < versiune < limit, în ordine cronologică."""
+        result = []
+        for entry in reversed(self.change_log):
+            if entry[0] <= since_version:
+                break
+            if entry[0] < limit:
+                result.append(entry)
+        result.reverse()
+        return result
+
+
+class ShardedDevices:
+    """
+    Vedere de tip dict peste dispozitivele tuturor partițiilor (`state_machine.devices`).
+    Citirile individuale (get, in, []) sunt operații atomice pe dict-ul partiției; modificarea
+    unui dispozitiv se face cu lock-ul partiției lui deținut.
+    """
+
+    def __init__(self, shards: List[StateShard]):
+        self._shards = shards
+        self._count = len(shards)
+
+    def shard(self, device_id: str) -> StateShard:
+        return self._shards[hash(device_id) % self._count]
+
+    def __getitem__(self, device_id: str) -> Dict[str, Any]:
+        return self.shard(device_id).devices[device_id]
+
+    def __setitem__(self, device_id: str, record: Dict[str, Any]):
+        self.shard(device_id).devices[device_id] = record
+
+    def __contains__(self, device_id) -> bool:
+        return device_id in self.shard(device_id).devices
+
+    def get(self, device_id: str, default: Optional[Dict[str, Any]] = None):
+        return self.shard(device_id).devices.get(device_id, default)
+
+    def pop(self, device_id: str, *default):
+        return self.shard(device_id).devices.pop(device_id, *default)
+
+    def __len__(self) -> int:
+        return sum(len(shard.devices) for shard in self._shards)
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.keys())
+
+    def keys(self) -> List[str]:
+        return [device_id for shard in self._shards for device_id in list(shard.devices)]
+
+    def values(self) -> List[Dict[str, Any]]:
+        return [record for shard in self._shards for record in list(shard.devices.values())]
+
+    def items(self) -> List[Tuple[str, Dict[str, Any]]]:
+        return [item for shard in self._shards for item in list(shard.devices.items())]
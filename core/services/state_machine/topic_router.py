@@ -0,0 +1,74 @@
+from typing import Any, Callable, Dict, List, NamedTuple, Optional, Tuple
+from integration.shelly.common import MQTT_TOPIC_PREFIX, TOPIC_ROUTES
+
+
+class TopicRoute(NamedTuple):
+    integration: str
+    channel: Optional[str]
+    field: Optional[str]
+    parser: Callable[[str], Any]
+
+
+class TopicMatch(NamedTuple):
+    route: TopicRoute
+    device_id: Optional[str]
+
+
+class _Node:
+    __slots__ = ("children", "wildcard", "route")
+
+    def __init__(self):
+        self.children: Dict[str, "_Node"] = {}
+        self.wildcard: Optional["_Node"] = None
+        self.route: Optional[TopicRoute] = None
+
+
+class TopicRouter:
+    """
+    Trie construit din definițiile de topic ale integrărilor.
+    Un topic este împărțit o singură dată și parcurs segment cu segment;
+    segmentele literale au prioritate față de "+" (id-ul dispozitivului).
+    Topicurile necunoscute sunt respinse la primul segment care nu se potrivește.
+    """
+
+    def __init__(self):
+        self._root = _Node()
+
+    def register(self, integration: str, prefix: str, pattern: str, channel: Optional[str],
+                 field: Optional[str], parser: Callable[[str], Any]):
+        node = self._root
+        for segment in f"{prefix}/{pattern}".split("/"):
+            if segment == "+":
+                if node.wildcard is None:
+                    node.wildcard = _Node()
+                node = node.wildcard
+            else:
+                node = node.children.setdefault(segment, _Node())
+        node.route = TopicRoute(integration, channel, field, parser)
+
+    def register_integration(self, integration: str, prefix: str,
+                             routes: List[Tuple[str, Optional[str], Optional[str], Callable[[str], Any]]]):
+        for pattern, channel, field, parser in routes:
+            self.register(integration, prefix, pattern, channel, field, parser)
+
+    def match(self, topic: str) -> Optional[TopicMatch]:
+        node = self._root
+        device_id = None
+        for segment in topic.split("/"):
+            child = node.children.get(segment)
+            if child is None:
+                child = node.wildcard
+                if child is None:
+                    return None
+                device_id = segment
+            node = child
+        if node.route is None:
+            return None
+        return TopicMatch(node.route, device_id)
+
+
+def build_default_router() -> TopicRouter:
+    """Router-ul cu toate integrările cunoscute."""
+    router = TopicRouter()
+    router.register_integration("shelly", MQTT_TOPIC_PREFIX, TOPIC_ROUTES)
+    return router
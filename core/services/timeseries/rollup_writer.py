@@ -0,0 +1,82 @@
+import asyncio
+import logging
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Awaitable, Callable, List
+from database.repository import rollup_repository
+from config.settings import TIMESERIES_FLUSH_INTERVAL, TIMESERIES_MINUTE_RETENTION_DAYS
+from services.metrics.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+# Ștergerea rollup-urilor vechi de minut rulează cel mult o dată pe oră.
+PRUNE_INTERVAL = 3600
+
+
+class RollupWriter:
+    """
+    Scrie în lot, periodic, rollup-urile încheiate din TimeSeriesStore (o tranzacție per flush)
+    și șterge rollup-urile de minut mai vechi decât TIMESERIES_MINUTE_RETENTION_DAYS.
+    """
+
+    def __init__(self, store, interval: float = TIMESERIES_FLUSH_INTERVAL,
+                 minute_retention_days: float = TIMESERIES_MINUTE_RETENTION_DAYS):
+        self.store = store
+        self.interval = interval
+        self.minute_retention = timedelta(days=minute_retention_days)
+        self.flushes = 0
+        self.rows_written = 0
+        self._last_prune = 0.0
+        # Apelate după fiecare scriere reușită (ex. EnergyAnalytics citește rândurile noi).
+        self.listeners: List[Callable[[], Awaitable]] = []
+        metrics.counter_func("timeseries_flushes_total", "Rollup batches written to the database", lambda: self.flushes)
+        metrics.counter_func("timeseries_rows_written_total", "Rollup rows written to the database", lambda: self.rows_written)
+        metrics.gauge_func("timeseries_pending_rows", "Closed rollups waiting to be written", store.pending_count)
+        metrics.counter_func("timeseries_rows_dropped_total", "Oldest unwritten rollups dropped over TIMESERIES_MAX_PENDING_ROWS",
+                             lambda: store.dropped)
+
+    async def run(self):
+        logger.info("Starting time-series rollup writer task")
+        while True:
+            try:
+                await asyncio.sleep(self.interval)
+                await self.flush()
+                if time.monotonic() - self._last_prune >= PRUNE_INTERVAL:
+                    await self.prune()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.exception("Error writing time-series rollups: %s", e)
+
+    async def flush(self, close_open: bool = False) -> int:
+        """
+        Scrie rollup-urile încheiate. Cu close_open=True (la oprire) se scriu și bucket-urile
+        deschise; datele ulterioare din același interval vor forma un al doilea rând, combinat la citire.
+        """
+        self.store.close_expired(time.time() + (10 ** 9 if close_open else 0))
+        rows = self.store.take_pending()
+        if not rows:
+            return 0
+        try:
+            await rollup_repository.create_many(rows)
+        except Exception:
+            dropped = self.store.restore_pending(rows)
+            if dropped:
+                logger.warning("Rollup backlog over %d rows, dropped the %d oldest", self.store.max_pending, dropped)
+            raise
+        self.flushes += 1
+        self.rows_written += len(rows)
+        for listener in self.listeners:
+            try:
+                await listener()
+            except Exception as e:
+                logger.exception("Rollup listener failed: %s", e)
+        return len(rows)
+
+    async def prune(self) -> int:
+        self._last_prune = time.monotonic()
+        cutoff = datetime.now(timezone.utc) - self.minute_retention
+        deleted = await rollup_repository.delete_before("minute", cutoff)
+        if deleted:
+            logger.info("Pruned %d minute rollups older than %s", deleted, cutoff.isoformat())
+        return deleted
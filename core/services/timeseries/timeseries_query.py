@@ -0,0 +1,87 @@
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterable, List, Optional
+from database.repository import rollup_repository
+from services.timeseries.timeseries_store import (
+    METRICS,
+    RESOLUTIONS,
+    TimeSeriesStore,
+    choose_resolution,
+    finalize,
+    merge_rows,
+)
+
+
+def validate(metric: str, resolution: Optional[str], start: float, end: float) -> str:
+    """Verifică parametrii unei interogări și întoarce rezoluția efectivă (ValueError dacă sunt invalizi)."""
+    if metric not in METRICS:
+        raise ValueError(f"Unknown metric '{metric}', expected one of {', '.join(METRICS)}")
+    if start > end:
+        raise ValueError("start must be before end")
+    if resolution in (None, "", "auto"):
+        return choose_resolution(start, end)
+    if resolution != "raw" and resolution not in RESOLUTIONS:
+        raise ValueError(f"Unknown resolution '{resolution}'")
+    return resolution
+
+
+async def _rollup_points(store: TimeSeriesStore, device_ids: List[str], metric: str, resolution: str,
+                         start: float, end: float):
+    # Bucket-ul care conține `start` începe înaintea lui; se include și el.
+    first_bucket = start - start % RESOLUTIONS[resolution]
+    rows = await rollup_repository.find_range(
+        device_ids, metric, resolution,
+        datetime.fromtimestamp(first_bucket, timezone.utc), datetime.fromtimestamp(end, timezone.utc),
+    )
+    unflushed = store.unflushed_rows(device_ids, metric, resolution, first_bucket, end)
+    return merge_rows(list(rows) + unflushed)
+
+
+async def device_series(store: TimeSeriesStore, device_id: str, metric: str, start: float, end: float,
+                        resolution: Optional[str] = None) -> Dict[str, Any]:
+    """Seria unui dispozitiv: eșantioane brute din ring buffer sau rollup-uri din baza de date."""
+    resolution = validate(metric, resolution, start, end)
+    result = {"device_id": device_id, "metric": metric, "resolution": resolution, "start": start, "end": end}
+    if resolution == "raw":
+        result["points"] = [
+            {"time": timestamp, "value": value}
+            for timestamp, value in store.raw_samples(device_id, metric, start, end)
+        ]
+        return result
+    merged = await _rollup_points(store, [device_id], metric, resolution, start, end)
+    result["points"] = [finalize(point) for _, point in sorted(merged.items(), key=lambda item: item[1]["bucket"])]
+    return result
+
+
+async def combined_series(store: TimeSeriesStore, device_ids: Iterable[str], metric: str, start: float,
+                          end: float, resolution: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Seria agregată a mai multor dispozitive (o cameră, toată casa), per bucket:
+    avg/min/max sunt sumele valorilor per dispozitiv (ex. puterea totală și limitele ei),
+    delta este consumul total, iar `devices` numărul dispozitivelor cu date în bucket.
+    """
+    resolution = validate(metric, resolution, start, end)
+    if resolution == "raw":
+        raise ValueError("raw samples are only available per device")
+    ids = list(device_ids)
+    merged = await _rollup_points(store, ids, metric, resolution, start, end)
+    buckets: Dict[float, Dict[str, Any]] = {}
+    for point in merged.values():
+        device_point = finalize(point)
+        total = buckets.get(device_point["bucket"])
+        if total is None:
+            buckets[device_point["bucket"]] = dict(device_point, devices=1)
+            continue
+        total["devices"] += 1
+        total["count"] += device_point["count"]
+        total["min"] += device_point["min"]
+        total["max"] += device_point["max"]
+        total["avg"] += device_point["avg"]
+        total["delta"] += device_point["delta"]
+    return {
+        "device_ids": ids,
+        "metric": metric,
+        "resolution": resolution,
+        "start": start,
+        "end": end,
+        "points": [buckets[bucket] for bucket in sorted(buckets)],
+    }
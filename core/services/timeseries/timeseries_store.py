@@ -0,0 +1,259 @@
+import math
+from array import array
+from datetime import datetime, timezone
+from threading import Lock
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+from config.settings import TIMESERIES_MAX_PENDING_ROWS, TIMESERIES_RING_SIZE
+
+# Câmpurile de status urmărite ca serii de timp.
+METRICS = ("power", "energy")
+# Rezoluția -> durata bucket-ului în secunde (zilele sunt zile UTC).
+RESOLUTIONS = {"minute": 60, "hour": 3600, "day": 86400}
+
+
+class RingBuffer:
+    """Ultimele N eșantioane (timestamp, valoare) ale unei serii, în două array-uri de dimensiune fixă."""
+
+    __slots__ = ("times", "values", "size", "next", "count")
+
+    def __init__(self, size: int):
+        self.times = array("d", bytes(8 * size))
+        self.values = array("d", bytes(8 * size))
+        self.size = size
+        self.next = 0
+        self.count = 0
+
+    def append(self, timestamp: float, value: float):
+        index = self.next
+        self.times[index] = timestamp
+        self.values[index] = value
+        self.next = (index + 1) % self.size
+        if self.count < self.size:
+            self.count += 1
+
+    def items(self, start: float = -math.inf, end: float = math.inf) -> List[Tuple[float, float]]:
+        """Eșantioanele din [start, end], în ordine cronologică."""
+        first = (self.next - self.count) % self.size
+        result = []
+        for offset in range(self.count):
+            index = (first + offset) % self.size
+            timestamp = self.times[index]
+            if start <= timestamp <= end:
+                result.append((timestamp, self.values[index]))
+        return result
+
+
+class Bucket:
+    """Agregatul unei serii pe un interval: min/max/medie și creșterea contorului (delta)."""
+
+    __slots__ = ("start", "count", "total", "min", "max", "delta")
+
+    def __init__(self, start: float):
+        self.start = start
+        self.count = 0
+        self.total = 0.0
+        self.min = math.inf
+        self.max = -math.inf
+        self.delta = 0.0
+
+    def add(self, value: float, delta: float):
+        self.count += 1
+        self.total += value
+        if value < self.min:
+            self.min = value
+        if value > self.max:
+            self.max = value
+        self.delta += delta
+
+    def as_row(self, device_id: str, metric: str, resolution: str) -> Dict[str, Any]:
+        return {
+            "entityId": device_id,
+            "metric": metric,
+            "resolution": resolution,
+            "bucket": datetime.fromtimestamp(self.start, timezone.utc),
+            "count": self.count,
+            "min": self.min,
+            "max": self.max,
+            "avg": self.total / self.count,
+            "delta": self.delta,
+        }
+
+
+class _Series:
+    __slots__ = ("ring", "buckets", "last_value")
+
+    def __init__(self, ring_size: int):
+        self.ring = RingBuffer(ring_size)
+        self.buckets: Dict[str, Bucket] = {}
+        self.last_value: Optional[float] = None
+
+
+class TimeSeriesStore:
+    """
+    Istoricul puterii și energiei per dispozitiv.
+
+    Eșantioanele recente stau într-un RingBuffer per (dispozitiv, metrică). Fiecare eșantion
+    actualizează direct bucket-ul curent de minut, oră și zi; un bucket încheiat devine un rând
+    de rollup care așteaptă în `pending` să fie scris în lot de RollupWriter. Interogările pe
+    intervale lungi citesc rollup-urile, nu eșantioanele brute.
+    Pentru energie (contor cumulativ) delta e creșterea contorului; o scădere e tratată ca reset.
+    Cât timp baza de date e indisponibilă, `pending` păstrează cel mult `max_pending` rânduri;
+    cele mai vechi se aruncă și se numără în `dropped`.
+    """
+
+    def __init__(self, ring_size: int = TIMESERIES_RING_SIZE, max_pending: int = TIMESERIES_MAX_PENDING_ROWS):
+        self.ring_size = ring_size
+        self.max_pending = max_pending
+        self.lock = Lock()
+        self.series: Dict[Tuple[str, str], _Series] = {}
+        self.pending: List[Dict[str, Any]] = []
+        self.samples = 0
+        self.dropped = 0
+
+    def record_many(self, samples: Iterable[Tuple[str, str, float]], timestamp: float):
+        """Adaugă un lot de (device_id, metrică, valoare) primite la `timestamp`."""
+        with self.lock:
+            for device_id, metric, value in samples:
+                self._record_locked(device_id, metric, value, timestamp)
+
+    def _record_locked(self, device_id: str, metric: str, value: float, timestamp: float):
+        if isinstance(value, bool) or not isinstance(value, (int, float)):
+            return
+        key = (device_id, metric)
+        series = self.series.get(key)
+        if series is None:
+            series = self.series[key] = _Series(self.ring_size)
+        series.ring.append(timestamp, value)
+        self.samples += 1
+
+        delta = 0.0
+        if metric == "energy":
+            last = series.last_value
+            if last is not None:
+                delta = value - last if value >= last else value
+            series.last_value = value
+
+        for resolution, seconds in RESOLUTIONS.items():
+            start = timestamp - timestamp % seconds
+            bucket = series.buckets.get(resolution)
+            if bucket is None or bucket.start != start:
+                if bucket is not None and bucket.count:
+                    self.pending.append(bucket.as_row(device_id, metric, resolution))
+                bucket = series.buckets[resolution] = Bucket(start)
+            bucket.add(value, delta)
+
+    def close_expired(self, now: float) -> int:
+        """Încheie bucket-urile al căror interval a trecut, chiar dacă dispozitivul nu mai trimite date."""
+        closed = 0
+        with self.lock:
+            for (device_id, metric), series in self.series.items():
+                for resolution, bucket in list(series.buckets.items()):
+                    if bucket.start + RESOLUTIONS[resolution] <= now:
+                        if bucket.count:
+                            self.pending.append(bucket.as_row(device_id, metric, resolution))
+                            closed += 1
+                        del series.buckets[resolution]
+        return closed
+
+    def take_pending(self) -> List[Dict[str, Any]]:
+        with self.lock:
+            rows, self.pending = self.pending, []
+            return rows
+
+    def restore_pending(self, rows: List[Dict[str, Any]]) -> int:
+        """
+        Repune rândurile nescrise după o eroare de scriere, în limita `max_pending`.
+        Întoarce numărul de rânduri vechi aruncate.
+        """
+        with self.lock:
+            self.pending[:0] = rows
+            excess = len(self.pending) - self.max_pending
+            if excess <= 0:
+                return 0
+            del self.pending[:excess]
+            self.dropped += excess
+            return excess
+
+    def pending_count(self) -> int:
+        with self.lock:
+            return len(self.pending)
+
+    def raw_samples(self, device_id: str, metric: str, start: float, end: float) -> List[Tuple[float, float]]:
+        with self.lock:
+            series = self.series.get((device_id, metric))
+            return series.ring.items(start, end) if series else []
+
+    def unflushed_rows(self, device_ids: Optional[Iterable[str]], metric: str, resolution: str,
+                       start: float, end: float) -> List[Dict[str, Any]]:
+        """
+        Rânduri încă nescrise în baza de date: bucket-uri deschise și rânduri în `pending`.
+        device_ids=None înseamnă toate dispozitivele.
+        """
+        ids = set(device_ids) if device_ids is not None else None
+        rows = []
+        with self.lock:
+            for row in self.pending:
+                if (ids is None or row["entityId"] in ids) and row["metric"] == metric and row["resolution"] == resolution:
+                    rows.append(row)
+            if ids is None:
+                keys = [key for key in self.series if key[1] == metric]
+            else:
+                keys = [(device_id, metric) for device_id in ids]
+            for key in keys:
+                series = self.series.get(key)
+                bucket = series.buckets.get(resolution) if series else None
+                if bucket is not None and bucket.count:
+                    rows.append(bucket.as_row(key[0], metric, resolution))
+        return [row for row in rows if start <= row["bucket"].timestamp() <= end]
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self.lock:
+            return {"series": len(self.series), "samples": self.samples, "pending_rows": len(self.pending),
+                    "dropped_rows": self.dropped}
+
+
+def choose_resolution(start: float, end: float) -> str:
+    """Rezoluția implicită pentru un interval: minute până la 6 ore, ore până la 14 zile, apoi zile."""
+    span = end - start
+    if span <= 6 * 3600:
+        return "minute"
+    if span <= 14 * 86400:
+        return "hour"
+    return "day"
+
+
+def merge_rows(rows: Iterable[Any]) -> Dict[Tuple[str, float], Dict[str, Any]]:
+    """
+    Combină rândurile cu același (dispozitiv, bucket): pot exista mai multe pentru un bucket
+    (ex. după o repornire în mijlocul intervalului, sau bucket-ul deschis peste cel scris).
+    """
+    merged: Dict[Tuple[str, float], Dict[str, Any]] = {}
+    for row in rows:
+        get = row.get if isinstance(row, dict) else row.__getattribute__
+        bucket = get("bucket").timestamp()
+        key = (get("entityId"), bucket)
+        count = get("count")
+        current = merged.get(key)
+        if current is None:
+            merged[key] = {
+                "bucket": bucket, "count": count, "min": get("min"), "max": get("max"),
+                "sum": get("avg") * count, "delta": get("delta") or 0.0,
+            }
+            continue
+        current["count"] += count
+        current["min"] = min(current["min"], get("min"))
+        current["max"] = max(current["max"], get("max"))
+        current["sum"] += get("avg") * count
+        current["delta"] += get("delta") or 0.0
+    return merged
+
+
+def finalize(point: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        "bucket": point["bucket"],
+        "count": point["count"],
+        "min": point["min"],
+        "max": point["max"],
+        "avg": point["sum"] / point["count"] if point["count"] else None,
+        "delta": point["delta"],
+    }
@@ -0,0 +1,170 @@
+import asyncio
+import logging
+import time
+from collections import deque
+from typing import Any, Callable, Dict, Optional, Set
+from fastapi import WebSocket
+from config.settings import WS_MAX_INFLIGHT_COMMANDS, WS_SEND_QUEUE_SIZE, WS_SLOW_CLIENT_TIMEOUT
+from services.websocket.subscriptions import Subscription
+from services.websocket.wire_format import JSON, SharedFrame, WireFormat
+from services.metrics.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+EVICTIONS = metrics.counter("ws_clients_evicted_total", "WebSocket clients evicted for falling behind", ("reason",))
+MERGED_DELTAS = metrics.counter("ws_deltas_merged_total", "Deltas merged into a full client queue instead of queued")
+MESSAGES_SENT = metrics.counter("ws_messages_sent_total", "Messages written to WebSocket clients")
+BYTES_SENT = metrics.counter("ws_bytes_sent_total", "Bytes written to WebSocket clients", ("protocol",))
+
+
+def merge_deltas(older: Dict[str, Any], newer: Dict[str, Any]) -> Dict[str, Any]:
+    """Comasează două mesaje delta consecutive; valorile mai noi câștigă."""
+    changes = {device_id: dict(record) for device_id, record in older.get("changes", {}).items()}
+    for device_id, record in newer.get("changes", {}).items():
+        merged = changes.setdefault(device_id, {})
+        status = {**merged.get("status", {}), **record.get("status", {})}
+        merged.update(record)
+        if status:
+            merged["status"] = status
+
+    result = {
+        "tag": "delta",
+        "since": older.get("since"),
+        "version": newer.get("version"),
+        "changes": changes,
+    }
+    new_devices = {**older.get("new_devices", {}), **newer.get("new_devices", {})}
+    adopted = older.get("adopted", []) + newer.get("adopted", [])
+    for device_id in adopted:
+        new_devices.pop(device_id, None)
+    if new_devices:
+        result["new_devices"] = new_devices
+    if adopted:
+        result["adopted"] = adopted
+    return result
+
+
+class ClientConnection:
+    """
+    O conexiune WebSocket cu coadă de ieșire proprie și task de scriere dedicat.
+    Broadcast-ul doar pune mesaje în coadă, deci nu așteaptă niciodată după un client lent.
+    Mesajele se codifică la scriere, în formatul negociat la conectare (`wire`).
+    """
+
+    def __init__(self, websocket: WebSocket, on_close: Callable[["ClientConnection"], Any],
+                 max_queue: int = WS_SEND_QUEUE_SIZE, slow_timeout: float = WS_SLOW_CLIENT_TIMEOUT,
+                 wire: WireFormat = JSON, max_inflight: int = WS_MAX_INFLIGHT_COMMANDS):
+        self.websocket = websocket
+        self.wire = wire
+        self._bytes_sent = BYTES_SENT.labels(wire.protocol)
+        self.queue: deque = deque()
+        self.max_queue = max_queue
+        self.slow_timeout = slow_timeout
+        self.behind_since: Optional[float] = None
+        self.closed = False
+        # Filtrul cerut cu comanda "subscribe"; None înseamnă toate dispozitivele.
+        self.subscription: Optional[Subscription] = None
+        # Cererile cu "request_id" în zbor, limitate per conexiune; se anulează la închidere.
+        self.inflight = asyncio.Semaphore(max_inflight)
+        self.requests: Set[asyncio.Task] = set()
+        self._on_close = on_close
+        self._wakeup = asyncio.Event()
+        self._writer: Optional[asyncio.Task] = None
+
+    def start(self):
+        self._writer = asyncio.create_task(self._write_loop())
+
+    def enqueue(self, message: Dict[str, Any], frame: Optional[SharedFrame] = None) -> bool:
+        """
+        Adaugă un mesaj în coadă fără să blocheze. Întoarce False dacă clientul a fost evacuat.
+        frame e mesajul partajat între toți clienții unui broadcast, serializat o dată per format.
+        """
+        if self.closed:
+            return False
+
+        if len(self.queue) >= self.max_queue:
+            now = time.monotonic()
+            if self.behind_since is None:
+                self.behind_since = now
+            elif now - self.behind_since > self.slow_timeout:
+                logger.warning("Evicting slow WebSocket client after %ss behind", self.slow_timeout)
+                EVICTIONS.labels("slow").inc()
+                self.close()
+                return False
+
+            # Coada e plină: actualizările de stare se comasează în ultimul delta din coadă.
+            if message.get("tag") == "delta":
+                for index in range(len(self.queue) - 1, -1, -1):
+                    queued = self.queue[index][0]
+                    if queued.get("tag") == "delta":
+                        # Mesajul comasat e propriu acestui client și se serializează separat.
+                        self.queue[index] = (merge_deltas(queued, message), None)
+                        MERGED_DELTAS.inc()
+                        return True
+                    if "devices" in queued:
+                        # Un snapshot complet e deja în coadă; delta trebuie să rămână după el.
+                        break
+            elif len(self.queue) >= 2 * self.max_queue:
+                logger.warning("WebSocket client send queue overflow, evicting")
+                EVICTIONS.labels("overflow").inc()
+                self.close()
+                return False
+
+        self.queue.append((message, frame))
+        self._wakeup.set()
+        return True
+
+    async def _send(self, data):
+        if self.wire.binary:
+            await self.websocket.send_bytes(data)
+        else:
+            await self.websocket.send_text(data)
+        self._bytes_sent.inc(len(data))
+
+    async def _write_loop(self):
+        try:
+            hello = self.wire.hello()
+            if hello is not None:
+                await self._send(hello)
+            while True:
+                while not self.queue:
+                    self._wakeup.clear()
+                    await self._wakeup.wait()
+                message, frame = self.queue.popleft()
+                data = frame.encode(self.wire) if frame is not None else self.wire.encode(message)
+                await self._send(data)
+                MESSAGES_SENT.inc()
+                if len(self.queue) < self.max_queue:
+                    self.behind_since = None
+        except asyncio.CancelledError:
+            pass
+        except Exception as e:
+            logger.info("Error sending to WebSocket, closing connection: %s", e)
+            self.close()
+
+    def request_done(self, task: asyncio.Task):
+        self.requests.discard(task)
+        self.inflight.release()
+
+    def close(self):
+        """Oprește scrierea și cererile în zbor și închide socket-ul în fundal."""
+        if self.closed:
+            return
+        self.closed = True
+        self.queue.clear()
+        for task in list(self.requests):
+            if task is not asyncio.current_task():
+                task.cancel()
+        if self._writer and self._writer is not asyncio.current_task():
+            self._writer.cancel()
+        asyncio.create_task(self._close_socket())
+        try:
+            self._on_close(self)
+        except Exception:
+            logger.exception("Error in WebSocket close callback")
+
+    async def _close_socket(self):
+        try:
+            await asyncio.wait_for(self.websocket.close(), timeout=self.slow_timeout)
+        except Exception:
+            pass
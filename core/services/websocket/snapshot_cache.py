@@ -0,0 +1,29 @@
+from typing import Any, Awaitable, Callable, Dict, Hashable, Tuple
+from services.websocket.wire_format import SharedFrame
+
+
+class SnapshotCache:
+    """
+    Păstrează ultimul cadru pentru fiecare tip de snapshot, indexat după versiunea stării.
+    Un snapshot se codifică o singură dată per format și același cadru e trimis tuturor clienților;
+    intrarea se reconstruiește doar când versiunea din DeviceStateMachine se schimbă.
+    """
+
+    def __init__(self):
+        self._entries: Dict[Hashable, Tuple[Hashable, Dict[str, Any], SharedFrame]] = {}
+
+    async def get(self, kind: Hashable, version: Hashable,
+                  build: Callable[[], Awaitable[Dict[str, Any]]]) -> Tuple[Dict[str, Any], SharedFrame]:
+        entry = self._entries.get(kind)
+        if entry and entry[0] == version:
+            return entry[1], entry[2]
+        message = await build()
+        frame = SharedFrame(message)
+        self._entries[kind] = (version, message, frame)
+        return message, frame
+
+    def invalidate(self, kind: Hashable = None):
+        if kind is None:
+            self._entries.clear()
+        else:
+            self._entries.pop(kind, None)
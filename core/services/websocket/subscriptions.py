@@ -0,0 +1,234 @@
+from typing import Any, Dict, FrozenSet, Hashable, Iterable, List, Optional, Set, Tuple
+
+
+class Subscription:
+    """
+    Filtrul cerut de un client: camere, dispozitive și tipuri de dispozitive (reuniune),
+    plus câmpurile de status dorite. Fără camere/dispozitive/tipuri clientul primește toate
+    dispozitivele, eventual doar cu câmpurile din `fields`. Anunțurile de dispozitive noi
+    se primesc doar cu new_devices=True.
+    """
+
+    __slots__ = ("rooms", "device_ids", "types", "fields", "new_devices", "key")
+
+    def __init__(self, rooms: Iterable[int] = (), device_ids: Iterable[str] = (), types: Iterable[str] = (),
+                 fields: Optional[Iterable[str]] = None, new_devices: bool = False):
+        self.rooms: FrozenSet[int] = frozenset(rooms)
+        self.device_ids: FrozenSet[str] = frozenset(device_ids)
+        self.types: FrozenSet[str] = frozenset(types)
+        self.fields: Optional[FrozenSet[str]] = frozenset(fields) if fields is not None else None
+        self.new_devices = bool(new_devices)
+        # Clienții cu același filtru primesc exact același mesaj, serializat o singură dată.
+        self.key: Hashable = (self.rooms, self.device_ids, self.types, self.fields, self.new_devices)
+
+    @classmethod
+    def from_message(cls, message: Dict[str, Any]) -> "Subscription":
+        """Construiește filtrul dintr-o comandă "subscribe"; ValueError pentru câmpuri invalide."""
+        values = {}
+        for name, kind in (("rooms", int), ("device_ids", str), ("types", str), ("fields", str)):
+            value = message.get(name)
+            if value is None:
+                continue
+            if not isinstance(value, list) or not all(isinstance(item, kind) and not isinstance(item, bool)
+                                                      for item in value):
+                raise ValueError(f"'{name}' must be a list of {kind.__name__}")
+            values[name] = value
+        return cls(new_devices=message.get("new_devices", False), **values)
+
+    @property
+    def all_devices(self) -> bool:
+        return not (self.rooms or self.device_ids or self.types)
+
+    def project(self, record: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """
+        Păstrează din înregistrarea unui dispozitiv doar câmpurile de status cerute.
+        None dacă nu rămâne nimic de trimis (ex. doar `power` s-a schimbat).
+        """
+        fields = self.fields
+        status = record.get("status")
+        if fields is None or status is None:
+            return record
+        projected = {key: value for key, value in record.items() if key != "status"}
+        status = {key: value for key, value in status.items() if key in fields}
+        if status:
+            projected["status"] = status
+        elif projected.keys() <= {"version"}:
+            return None
+        return projected
+
+    def filter_snapshot(self, message: Dict[str, Any], members: Optional[Set[str]]) -> Dict[str, Any]:
+        """Snapshot-ul complet restrâns la dispozitivele din `members` (None = toate)."""
+        devices = {}
+        for device_id, record in message["devices"].items():
+            if members is not None and device_id not in members and record.get("type") not in self.types:
+                continue
+            projected = self.project(record)
+            if projected is not None:
+                devices[device_id] = projected
+        return {
+            "devices": devices,
+            "new_devices": message.get("new_devices", {}) if self.new_devices else {},
+            "version": message["version"],
+        }
+
+
+class SubscriptionIndex:
+    """
+    Indexul invers dispozitiv -> filtre interesate, pentru rutarea fiecărei modificări doar către
+    clienții care au cerut-o. Conexiunile cu același filtru formează un grup (după `key`), ca
+    mesajul filtrat să fie construit și serializat o singură dată per grup.
+    Conexiunile fără filtru nu apar aici; ele primesc mesajul comun al broadcast-ului.
+    Folosit doar din bucla de evenimente, deci fără lock.
+    """
+
+    def __init__(self, state_machine):
+        self.state_machine = state_machine
+        # key -> (filtru, conexiunile care îl folosesc)
+        self.groups: Dict[Hashable, Tuple[Subscription, Set[Any]]] = {}
+        # key -> dispozitivele rezolvate din camere și device_ids (None pentru filtrele fără selecție)
+        self.members: Dict[Hashable, Optional[Set[str]]] = {}
+        self.by_device: Dict[str, Set[Hashable]] = {}
+        self.by_type: Dict[str, Set[Hashable]] = {}
+        self.all_devices: Set[Hashable] = set()
+        self.rooms_version = state_machine.rooms_version
+
+    def add(self, connection, subscription: Subscription):
+        group = self.groups.get(subscription.key)
+        if group is None:
+            group = self.groups[subscription.key] = (subscription, set())
+            self._index(subscription)
+        group[1].add(connection)
+
+    def remove(self, connection, subscription: Subscription) -> bool:
+        """Scoate conexiunea din grupul ei; True dacă grupul a rămas gol și a fost șters."""
+        group = self.groups.get(subscription.key)
+        if group is None:
+            return False
+        group[1].discard(connection)
+        if group[1]:
+            return False
+        del self.groups[subscription.key]
+        self._unindex(subscription)
+        return True
+
+    def members_of(self, subscription: Subscription) -> Optional[Set[str]]:
+        self._check_rooms()
+        if subscription.key in self.members:
+            return self.members[subscription.key]
+        return self._resolve(subscription)
+
+    def _resolve(self, subscription: Subscription) -> Optional[Set[str]]:
+        if subscription.all_devices:
+            return None
+        members = set(subscription.device_ids)
+        for room_id in subscription.rooms:
+            members.update(self.state_machine.resolve_targets(room_id=room_id) or ())
+        return members
+
+    def _index(self, subscription: Subscription):
+        key = subscription.key
+        members = self.members[key] = self._resolve(subscription)
+        if members is None:
+            self.all_devices.add(key)
+            return
+        for device_id in members:
+            self.by_device.setdefault(device_id, set()).add(key)
+        for device_type in subscription.types:
+            self.by_type.setdefault(device_type, set()).add(key)
+
+    def _unindex(self, subscription: Subscription):
+        key = subscription.key
+        members = self.members.pop(key, None)
+        self.all_devices.discard(key)
+        for device_id in members or ():
+            keys = self.by_device.get(device_id)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self.by_device[device_id]
+        for device_type in subscription.types:
+            keys = self.by_type.get(device_type)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self.by_type[device_type]
+
+    def _check_rooms(self):
+        """Re-rezolvă camerele după ce indexul camerelor s-a schimbat (asignări, adoptări)."""
+        version = self.state_machine.rooms_version
+        if version == self.rooms_version:
+            return
+        self.rooms_version = version
+        for subscription, _ in self.groups.values():
+            if subscription.rooms:
+                self._unindex(subscription)
+                self._index(subscription)
+
+    def route(self, delta: Dict[str, Any]) -> List[Tuple[List[Any], Dict[str, Any]]]:
+        """
+        Împarte un delta pe grupurile de filtre: (conexiuni, delta filtrat) pentru fiecare grup
+        care are ceva de primit. Costul depinde de dispozitivele modificate și de grupurile
+        interesate de ele, nu de numărul total de dispozitive.
+        """
+        if not self.groups:
+            return []
+        self._check_rooms()
+        changes = delta.get("changes", {})
+        devices = self.state_machine.devices
+        selected: Dict[Hashable, List[str]] = {key: list(changes) for key in self.all_devices}
+        for device_id in changes:
+            keys = self.by_device.get(device_id)
+            if keys:
+                for key in keys:
+                    selected.setdefault(key, []).append(device_id)
+            if self.by_type:
+                record = devices.get(device_id)
+                type_keys = self.by_type.get(record["type"]) if record is not None else None
+                for key in type_keys or ():
+                    if not keys or key not in keys:
+                        selected.setdefault(key, []).append(device_id)
+
+        routed = []
+        for key, (subscription, connections) in self.groups.items():
+            message = self._filter(subscription, delta, selected.get(key, ()))
+            if message is not None:
+                routed.append((list(connections), message))
+        return routed
+
+    def filter_delta(self, subscription: Subscription, delta: Dict[str, Any]) -> Dict[str, Any]:
+        """Delta-ul restrâns la un filtru (pentru "sync"); întoarce și un delta gol."""
+        members = self.members_of(subscription)
+        devices = self.state_machine.devices
+        device_ids = []
+        for device_id in delta.get("changes", {}):
+            if members is None or device_id in members:
+                device_ids.append(device_id)
+            elif subscription.types:
+                record = devices.get(device_id)
+                if record is not None and record["type"] in subscription.types:
+                    device_ids.append(device_id)
+        message = self._filter(subscription, delta, device_ids)
+        if message is None:
+            message = {"tag": "delta", "since": delta["since"], "version": delta["version"], "changes": {}}
+        return message
+
+    @staticmethod
+    def _filter(subscription: Subscription, delta: Dict[str, Any],
+                device_ids: Iterable[str]) -> Optional[Dict[str, Any]]:
+        """Delta-ul pentru un filtru, sau None dacă filtrul nu are nimic de primit din el."""
+        changes = delta.get("changes", {})
+        filtered = {}
+        for device_id in device_ids:
+            projected = subscription.project(changes[device_id])
+            if projected is not None:
+                filtered[device_id] = projected
+        announces = subscription.new_devices and ("new_devices" in delta or "adopted" in delta)
+        if not filtered and not announces:
+            return None
+        message = {"tag": "delta", "since": delta["since"], "version": delta["version"], "changes": filtered}
+        if announces:
+            if "new_devices" in delta:
+                message["new_devices"] = delta["new_devices"]
+            if "adopted" in delta:
+                message["adopted"] = delta["adopted"]
+        return message
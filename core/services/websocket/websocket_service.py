@@ -1,29 +1,72 @@
-from fastapi import WebSocket
-from typing import List, Dict, Any
+from fastapi import WebSocket, WebSocketDisconnect
+from typing import Any, Callable, Dict, List, Optional, Tuple
 import logging
 import asyncio
+import inspect
+import time
 from services.state_machine.device_state_machine import DeviceStateMachine
-import traceback
+from services.websocket.client_connection import ClientConnection
+from services.websocket.snapshot_cache import SnapshotCache
+from services.websocket.subscriptions import Subscription, SubscriptionIndex
+from services.websocket.wire_format import JSON, SharedFrame, encode_message, negotiate
+from config.settings import BROADCAST_COALESCE_MS, WS_MAX_BATCH_SIZE
+from services.commands.scheduler import CommandScheduler
+from services.metrics.metrics import metrics
 from integration.shelly.duorgbw.control import (
-    turn_on,
-    turn_off,
-    turn_on_multiple,
-    turn_off_multiple,
-    set_color_mode,
-    set_white_mode,
-    set_color,
-    set_white_brightness,
-    set_white_temperature,
+    send_batch,
+    expected_state,
+    color_mode_settings,
+    white_mode_settings,
+    color_settings,
+    white_brightness_settings,
+    white_temperature_settings,
 )
 logger = logging.getLogger(__name__)
 
+BROADCAST_SECONDS = metrics.histogram("ws_broadcast_seconds", "Time to build and enqueue one broadcast")
+BROADCASTS = metrics.counter("ws_broadcasts_total", "Broadcasts sent to all clients", ("kind",))
+COMMANDS = metrics.counter("ws_commands_total", "WebSocket commands received", ("command",))
+COMMAND_SECONDS = metrics.histogram("ws_command_seconds", "Time spent in process_message per command")
+REQUESTS = metrics.counter("ws_requests_total", "Pipelined WebSocket requests (with request_id)", ("mode",))
+
+# Comenzile pe dispozitive: nume -> (canal, payload construit din mesaj, tipul entităților țintă
+# când ținta e o cameră sau un grup). Folosit de handler-e și de scene.
+DEVICE_COMMANDS = {
+    "turn_on": ("command", lambda message: "on", None),
+    "turn_off": ("command", lambda message: "off", None),
+    "turn_on_multiple": ("command", lambda message: "on", None),
+    "turn_off_multiple": ("command", lambda message: "off", None),
+    "set_color_mode": ("set", lambda message: color_mode_settings(), "light"),
+    "set_white_mode": ("set", lambda message: white_mode_settings(), "light"),
+    "set_color": ("set", lambda message: color_settings(
+        message.get("red", 255), message.get("green", 255), message.get("blue", 255)), "light"),
+    "set_white_temperature": ("set", lambda message: white_temperature_settings(message.get("temp", 4750)), "light"),
+    "set_white_brightness": ("set", lambda message: white_brightness_settings(message.get("brightness", 100)), "light"),
+}
+
 
 class WebSocketManager:
     def __init__(self, state_machine):
-        self.active_connections: List[WebSocket] = []
+        self.active_connections: Dict[WebSocket, ClientConnection] = {}
         self.state_machine = state_machine
+        self.snapshot_cache = SnapshotCache()
+        self.subscriptions = SubscriptionIndex(state_machine)
+        self.command_tracker = state_machine.command_tracker
+        self.scheduler = CommandScheduler(self._send_tracked)
+        metrics.gauge_func("ws_connections", "Connected WebSocket clients", lambda: len(self.active_connections))
+        metrics.gauge_func("ws_queued_messages", "Messages waiting in WebSocket client queues",
+                           lambda: sum(len(c.queue) for c in list(self.active_connections.values())))
+        metrics.gauge_func("ws_subscription_groups", "Distinct subscription filters in use",
+                           lambda: len(self.subscriptions.groups))
+        metrics.gauge_func("commands_scheduled", "Commands waiting in the scheduler",
+                           lambda: len(self.scheduler._pending))
+        metrics.counter_func("commands_coalesced_total", "Commands replaced by a newer one before publishing",
+                             lambda: self.scheduler.coalesced)
         self.command_handlers = {
             "get_all_data": self.handle_get_all_data,
+            "sync": self.handle_sync,
+            "subscribe": self.handle_subscribe,
+            "unsubscribe": self.handle_unsubscribe,
             "turn_on": self.handle_turn_on,
             "turn_off": self.handle_turn_off,
             "turn_on_multiple": self.handle_turn_on_multiple,
@@ -33,19 +76,84 @@ class WebSocketManager:
             "set_color": self.handle_set_color,
             "set_white_temperature": self.handle_set_temperature,
             "set_white_brightness": self.handle_set_brightness,
+            "recall_scene": self.handle_recall_scene,
         }
 
     async def connect(self, websocket: WebSocket):
-        """Adaugă un client nou la lista de conexiuni active."""
-        await websocket.accept()
-        self.active_connections.append(websocket)
-        print(f"New WebSocket connection. Total connections: {len(self.active_connections)}")
+        """
+        Adaugă un client nou la lista de conexiuni active. Formatul se negociază prin subprotocolul
+        WebSocket (ex. "homelab.msgpack"); clienții care nu cer niciunul primesc JSON text, ca înainte.
+        """
+        wire = negotiate(websocket.scope.get("subprotocols", []))
+        await websocket.accept(subprotocol=wire.protocol if wire else None)
+        connection = ClientConnection(websocket, self._remove_connection, wire=wire or JSON)
+        self.active_connections[websocket] = connection
+        connection.start()
+        logger.info("New WebSocket connection (%s). Total connections: %d",
+                    connection.wire.protocol, len(self.active_connections))
+        # Snapshot complet doar la conectare; apoi clientul primește delta-uri.
+        connection.enqueue(*await self.get_devices_snapshot())
+
+    def _remove_connection(self, connection: ClientConnection):
+        self._set_subscription(connection, None)
+        if self.active_connections.get(connection.websocket) is connection:
+            del self.active_connections[connection.websocket]
+            logger.info("WebSocket disconnected. Total connections: %d", len(self.active_connections))
 
     async def disconnect(self, websocket: WebSocket):
         """Elimină un client deconectat din lista de conexiuni active."""
-        if websocket in self.active_connections:
-            self.active_connections.remove(websocket)
-            print(f"WebSocket disconnected. Total connections: {len(self.active_connections)}")
+        connection = self.active_connections.get(websocket)
+        if connection:
+            connection.close()
+
+    async def send(self, websocket: WebSocket, message: Dict[str, Any], frame: SharedFrame = None):
+        """Trimite un mesaj prin coada clientului, păstrând ordinea față de broadcast-uri."""
+        connection = self.active_connections.get(websocket)
+        if connection:
+            connection.enqueue(message, frame)
+        else:
+            await websocket.send_text(encode_message(message))
+
+    async def receive(self, websocket: WebSocket) -> Any:
+        """Următorul mesaj de la client, decodat în formatul negociat (text JSON sau cadru binar)."""
+        connection = self.active_connections.get(websocket)
+        if connection is None or not connection.wire.binary:
+            return await websocket.receive_json()
+        message = await websocket.receive()
+        if message["type"] == "websocket.disconnect":
+            raise WebSocketDisconnect(message.get("code", 1000), message.get("reason"))
+        data = message.get("bytes")
+        return connection.wire.decode(data if data is not None else message["text"])
+
+    def _set_subscription(self, connection: ClientConnection, subscription: Optional[Subscription]):
+        """Mută conexiunea în grupul noului filtru (None = toate dispozitivele)."""
+        previous = connection.subscription
+        if previous is not None and self.subscriptions.remove(connection, previous):
+            self.snapshot_cache.invalidate(("devices", previous.key))
+        connection.subscription = subscription
+        if subscription is not None:
+            self.subscriptions.add(connection, subscription)
+
+    async def get_devices_snapshot(self, subscription: Optional[Subscription] = None):
+        """
+        Snapshot-ul dispozitivelor, serializat o singură dată per versiune a stării.
+        Cu un filtru, snapshot-ul restrâns e serializat o dată per filtru și versiune.
+        """
+        if subscription is None:
+            return await self.snapshot_cache.get(
+                "devices", self.state_machine.version, self.state_machine.get_all_devices
+            )
+
+        async def build_filtered():
+            message, _ = await self.get_devices_snapshot()
+            return subscription.filter_snapshot(message, self.subscriptions.members_of(subscription))
+
+        version = (self.state_machine.version, self.state_machine.rooms_version)
+        return await self.snapshot_cache.get(("devices", subscription.key), version, build_filtered)
+
+    def _connection_subscription(self, websocket: WebSocket) -> Optional[Subscription]:
+        connection = self.active_connections.get(websocket)
+        return connection.subscription if connection else None
 
     async def send_all_data(self, websocket: WebSocket):
         """Trimite toate datele (dispozitive și camere) către un client WebSocket."""
@@ -53,172 +161,407 @@ class WebSocketManager:
             if not isinstance(websocket, WebSocket):
                 raise TypeError("Expected a WebSocket object, but got a different type.")
 
-            all_devices = await self.state_machine.get_all_devices()
             all_rooms = await self.state_machine.get_rooms_data()
+            subscription = self._connection_subscription(websocket)
+
+            if subscription is not None:
+                all_devices, _ = await self.get_devices_snapshot(subscription)
+                if subscription.rooms:
+                    all_rooms = {room_id: room for room_id, room in all_rooms.items() if room_id in subscription.rooms}
+                message = {"status": "success", "data": {"devices": all_devices, "rooms": all_rooms}}
+                await self.send(websocket, message)
+                return
 
-            all_data = {
-                "devices": all_devices,
-                "rooms": all_rooms,
-            }
+            async def build_all_data():
+                all_devices, _ = await self.get_devices_snapshot()
+                return {"status": "success", "data": {"devices": all_devices, "rooms": all_rooms}}
 
-            await websocket.send_json({"status": "success", "data": all_data})
-            print(f"Sent all data (devices and rooms) to WebSocket client.")
+            version = (self.state_machine.version, self.state_machine.rooms_version)
+            message, frame = await self.snapshot_cache.get("all_data", version, build_all_data)
+            await self.send(websocket, message, frame)
+            logger.debug("Sent all data (devices and rooms) to WebSocket client.")
         except Exception as e:
-            logger.error(f"Error sending all data to WebSocket: {e}")
-            traceback.print_exc()
+            logger.exception("Error sending all data to WebSocket: %s", e)
             if isinstance(websocket, WebSocket):
-                await websocket.send_json({"status": "error", "message": str(e)})
+                await self.send(websocket, {"status": "error", "message": str(e)})
+
+    def _send_to_all(self, message: Dict[str, Any], frame: SharedFrame = None):
+        """Pune mesajul în coada fiecărui client fără filtru; nu așteaptă după niciun socket."""
+        if frame is None:
+            frame = SharedFrame(message)
+        for connection in list(self.active_connections.values()):
+            if connection.subscription is None:
+                connection.enqueue(message, frame)
+
+    def _send_delta(self, delta: Dict[str, Any]):
+        """Delta-ul comun pentru clienții fără filtru și câte un delta filtrat pentru fiecare grup interesat."""
+        self._send_to_all(delta)
+        for connections, message in self.subscriptions.route(delta):
+            frame = SharedFrame(message)
+            for connection in connections:
+                connection.enqueue(message, frame)
+
+    async def _send_snapshot(self):
+        """Snapshot-ul complet pentru toți clienții, restrâns pentru cei cu filtru."""
+        self._send_to_all(*await self.get_devices_snapshot())
+        for subscription, connections in list(self.subscriptions.groups.values()):
+            message, frame = await self.get_devices_snapshot(subscription)
+            for connection in list(connections):
+                connection.enqueue(message, frame)
 
     async def broadcast_status(self):
-        """Trimite periodic statusul dispozitivelor către toți clienții conectați."""
-        print("Starting WebSocket broadcast task")
+        """Trimite modificările dispozitivelor către toți clienții imediat ce apar."""
+        logger.info("Starting WebSocket broadcast task")
+        last_version = self.state_machine.version
         while True:
             try:
-                print("Getting all devices for WebSocket broadcast")
-                all_data = await self.state_machine.get_all_devices()
-                print(f"Broadcasting data to {len(self.active_connections)} WebSocket connections")
-                for websocket in self.active_connections:
-                    try:
-                        await websocket.send_json(all_data)
-                    except Exception as e:
-                        print(f"Error sending device status to WebSocket: {e}")
-                        try:
-                            await websocket.send_json({"ping": "test"})
-                        except:
-                            print("WebSocket connection is closed, removing from active connections")
-                            if websocket in self.active_connections:
-                                self.active_connections.remove(websocket)
-                print("Finished WebSocket broadcast, sleeping for 5 seconds")
-                await asyncio.sleep(5)
+                await self.state_machine.wait_for_changes(last_version)
+                # Fereastră scurtă în care actualizările consecutive se comasează.
+                await asyncio.sleep(BROADCAST_COALESCE_MS / 1000)
+                started = time.perf_counter()
+                delta = self.state_machine.get_changes_since(last_version)
+                if delta is None:
+                    message, _ = await self.get_devices_snapshot()
+                    last_version = message["version"]
+                    await self._send_snapshot()
+                    BROADCASTS.labels("snapshot").inc()
+                else:
+                    last_version = delta["version"]
+                    self._send_delta(delta)
+                    BROADCASTS.labels("delta").inc()
+                BROADCAST_SECONDS.observe(time.perf_counter() - started)
             except Exception as e:
-                print(f"Error during periodic broadcast: {e}")
-                traceback.print_exc()
+                logger.exception("Error during broadcast: %s", e)
+                await asyncio.sleep(1)
 
     async def broadcast_new_device(self, device: Dict[str, Any]):
         """Trimite un dispozitiv nou către toți clienții conectați"""
-        logger.info(f"Broadcasting new device: {device}")
-        for websocket in self.active_connections:
-            try:
-                await websocket.send_json({"tag": "newdevice", "device": device})
-                logger.info(f"Device sent to WebSocket client: {device}")
-            except Exception as e:
-                logger.error(f"Failed to send new device to WebSocket: {e}")
+        logger.info("Broadcasting new device: %s", device.get("id"))
+        message = {"tag": "newdevice", "device": device}
+        frame = SharedFrame(message)
+        for connection in list(self.active_connections.values()):
+            if connection.subscription is None or connection.subscription.new_devices:
+                connection.enqueue(message, frame)
+
+    async def process_message(self, websocket: WebSocket, message: Any):
+        """
+        Procesează un mesaj primit de la un client WebSocket.
+
+        Mesajele fără "request_id" se tratează pe rând, ca înainte. Un mesaj cu "request_id"
+        rulează în paralel cu următoarele (cel mult WS_MAX_INFLIGHT_COMMANDS per conexiune),
+        iar răspunsul lui conține același "request_id". Un cadru care e o listă de comenzi
+        primește un singur răspuns {"tag": "batch", "responses": [...]}.
+        """
+        connection = self.active_connections.get(websocket)
+        if isinstance(message, list):
+            await self._process_batch(websocket, connection, message)
+            return
+        if connection is not None and isinstance(message, dict) and "request_id" in message:
+            REQUESTS.labels("single").inc()
+            await self._start_request(connection, self._reply(websocket, message))
+            return
 
-    async def process_message(self, websocket: WebSocket, message: Dict[str, Any]):
-        """Procesează un mesaj primit de la un client WebSocket."""
         try:
-            command = message.get("command")
-            if not command:
-                await websocket.send_json({"status": "error", "message": "No command specified"})
-                return
+            result = await self._dispatch(websocket, message)
+            if inspect.isawaitable(result):
+                if connection is None:
+                    await self.send(websocket, await result)
+                    return
+                # Comanda e publicată în fundal; bucla de citire nu o așteaptă. Task-ul e ținut
+                # în cererile conexiunii, ca să nu fie colectat și să fie anulat la deconectare.
+                task = asyncio.create_task(self._send_when_done(websocket, result))
+                connection.requests.add(task)
+                task.add_done_callback(connection.requests.discard)
+            elif result:
+                await self.send(websocket, result)
+        except Exception as e:
+            logger.exception("Error processing WebSocket message: %s", e)
+            await self.send(websocket, {"status": "error", "message": str(e)})
+
+    async def _dispatch(self, websocket: WebSocket, message: Dict[str, Any]):
+        """
+        Rulează handler-ul comenzii. Întoarce un răspuns, None, sau un awaitable care produce
+        răspunsul după publicarea comenzii.
+        """
+        if not isinstance(message, dict):
+            return {"status": "error", "message": "Expected a command object"}
+        command = message.get("command")
+        if not command:
+            return {"status": "error", "message": "No command specified"}
+
+        handler = self.command_handlers.get(command)
+        if not handler:
+            COMMANDS.labels("unknown").inc()
+            return {"status": "error", "message": f"Unknown command: {command}"}
+        COMMANDS.labels(command).inc()
+        with COMMAND_SECONDS.time():
+            return await handler(websocket, message)
+
+    async def _send_when_done(self, websocket: WebSocket, result):
+        await self.send(websocket, await result)
+
+    async def _handle_request(self, websocket: WebSocket, message: Any, request_id: Any = None) -> Dict[str, Any]:
+        """Rulează o comandă până la capăt (inclusiv publicarea) și întoarce răspunsul cu request_id."""
+        if isinstance(message, dict):
+            request_id = message.get("request_id", request_id)
+        try:
+            result = await self._dispatch(websocket, message)
+            if inspect.isawaitable(result):
+                result = await result
+            if result is None:
+                result = {"status": "success", "command": message.get("command")}
+        except Exception as e:
+            logger.exception("Error processing WebSocket request %s: %s", request_id, e)
+            result = {"status": "error", "message": str(e)}
+        return dict(result, request_id=request_id)
+
+    async def _reply(self, websocket: WebSocket, message: Dict[str, Any]):
+        await self.send(websocket, await self._handle_request(websocket, message))
+
+    async def _start_request(self, connection: ClientConnection, coroutine) -> asyncio.Task:
+        """
+        Pornește o cerere într-un task propriu după ce obține un loc din limita conexiunii.
+        Când limita e atinsă, bucla de citire așteaptă aici, deci clientul nu poate acumula
+        oricâte cereri în zbor.
+        """
+        try:
+            await connection.inflight.acquire()
+        except BaseException:
+            coroutine.close()
+            raise
+        task = asyncio.create_task(coroutine)
+        connection.requests.add(task)
+        task.add_done_callback(connection.request_done)
+        return task
+
+    async def _process_batch(self, websocket: WebSocket, connection: Optional[ClientConnection],
+                             messages: List[Any]):
+        """
+        Rulează comenzile dintr-un cadru concurent și trimite toate răspunsurile într-un singur cadru.
+        Comenzile pe dispozitive ajung în planificator în același pas, deci pleacă într-o rafală MQTT.
+        Elementele fără "request_id" primesc indexul lor din listă.
+        """
+        if len(messages) > WS_MAX_BATCH_SIZE:
+            await self.send(websocket, {"status": "error", "message": f"Batch larger than {WS_MAX_BATCH_SIZE} commands"})
+            return
+        REQUESTS.labels("batch").inc(len(messages))
+        if connection is None:
+            responses = [await self._handle_request(websocket, message, index) for index, message in enumerate(messages)]
+            await self.send(websocket, {"tag": "batch", "responses": responses})
+            return
+        tasks = [
+            await self._start_request(connection, self._handle_request(websocket, message, index))
+            for index, message in enumerate(messages)
+        ]
+
+        async def reply():
+            responses = await asyncio.gather(*tasks)
+            await self.send(websocket, {"tag": "batch", "responses": list(responses)})
+
+        task = asyncio.create_task(reply())
+        connection.requests.add(task)
+        task.add_done_callback(connection.requests.discard)
+
+    @staticmethod
+    def _bulk_response(command: str, device_ids: List[str], result: Dict[str, bool]) -> Dict[str, Any]:
+        """Răspuns pentru comenzile pe mai multe dispozitive, cu rezultatul per dispozitiv."""
+        failed = [device_id for device_id, ok in result.items() if not ok]
+        return {
+            "status": "success" if not failed else "error",
+            "device_ids": device_ids,
+            "result": result,
+            "failed": failed,
+            "command": command,
+        }
 
-            handler = self.command_handlers.get(command)
-            if not handler:
-                await websocket.send_json({"status": "error", "message": f"Unknown command: {command}"})
-                return
-            result = await handler(websocket, message)
-            if result:
-                await websocket.send_json(result)
+    def _submit(self, command: str, channel: str, device_ids: List[str], value: Any):
+        """Aplică optimist starea așteptată și pune comanda în planificator."""
+        self.command_tracker.track(device_ids, command, expected_state(channel, value))
+        return self.scheduler.submit(device_ids, channel, value)
+
+    async def _send_tracked(self, commands: Dict[Tuple[str, str], Any]) -> Dict[Tuple[str, str], bool]:
+        """Publică un lot din planificator și anunță tracker-ul de momentul trimiterii și de eșecuri."""
+        sent: Dict[str, Dict[str, Any]] = {}
+        for (device_id, channel), value in commands.items():
+            sent.setdefault(device_id, {}).update(expected_state(channel, value))
+        self.command_tracker.mark_sent(sent)
+        results = await send_batch(commands)
+        failed: Dict[str, List[str]] = {}
+        for key, value in commands.items():
+            if not results.get(key, False):
+                failed.setdefault(key[0], []).extend(expected_state(key[1], value))
+        self.command_tracker.reject(failed)
+        return results
+
+    def _schedule(self, websocket: WebSocket, command: str, channel: str, device_ids: List[str], value: Any,
+                  respond: Callable[[Dict[str, bool]], Dict[str, Any]]):
+        """
+        Trimite comanda prin planificator și întoarce un awaitable cu răspunsul de după publicare.
+        Handler-ul nu așteaptă publicarea, ca bucla de citire să poată primi valori mai noi
+        (ex. de la un slider) care le înlocuiesc pe cele încă netrimise.
+        """
+        future = self._submit(command, channel, device_ids, value)
+        return self._response_when_done(future, respond)
+
+    async def _response_when_done(self, future, respond) -> Dict[str, Any]:
+        try:
+            return respond(await future)
         except Exception as e:
-            logger.error(f"Error processing WebSocket message: {e}")
-            traceback.print_exc()
-            await websocket.send_json({"status": "error", "message": str(e)})
-    async def handle_turn_on(self, websocket: WebSocket, message: Dict[str, Any]):
-        device_id = message.get("device_ids")
-        if not device_id:
+            logger.exception("Error sending scheduled command: %s", e)
+            return {"status": "error", "message": str(e)}
+
+    def _resolve_targets(self, message: Dict[str, Any], device_type: str = None) -> Optional[List[str]]:
+        """Țintele comenzii: device_ids explicit sau membrii din room_id / group_id."""
+        return self.state_machine.resolve_targets(
+            device_ids=message.get("device_ids"),
+            room_id=message.get("room_id"),
+            group_id=message.get("group_id"),
+            device_type=device_type,
+        )
+
+    def _device_command(self, websocket: WebSocket, command: str, message: Dict[str, Any], response_command: str = None):
+        """Rezolvă țintele unei comenzi din DEVICE_COMMANDS și o trimite prin planificator."""
+        channel, build, device_type = DEVICE_COMMANDS[command]
+        device_ids = self._resolve_targets(message, device_type)
+        if device_ids is None:
+            if message.get("room_id") is not None or message.get("group_id") is not None:
+                return {"status": "error", "message": "Unknown room_id or group_id"}
             return {"status": "error", "message": "No device_id specified"}
+        if not device_ids:
+            return {"status": "error", "message": "No matching devices for target"}
 
-        result = await turn_on(device_id)
-        return {"status": "success" if result else "error", "device_id": device_id, "command": "turn_on"}
-
-    async def handle_turn_off(self, websocket: WebSocket, message: Dict[str, Any]):
+        response_command = response_command or command
         device_id = message.get("device_ids")
-        if not device_id:
-            return {"status": "error", "message": "No device_id specified"}
+        if channel == "command" and device_id and not isinstance(device_id, list):
+            # Comandă pe un singur dispozitiv: se păstrează forma răspunsului cu "device_id".
+            def respond(result: Dict[str, bool]) -> Dict[str, Any]:
+                ok = all(result.values())
+                return {"status": "success" if ok else "error", "device_id": device_id, "command": response_command}
+        else:
+            def respond(result: Dict[str, bool]) -> Dict[str, Any]:
+                return self._bulk_response(response_command, device_ids, result)
+        return self._schedule(websocket, command, channel, device_ids, build(message), respond)
 
-        result = await turn_off(device_id)
-        return {"status": "success" if result else "error", "device_id": device_id, "command": "turn_off"}
+    async def handle_turn_on(self, websocket: WebSocket, message: Dict[str, Any]):
+        return self._device_command(websocket, "turn_on", message)
+
+    async def handle_turn_off(self, websocket: WebSocket, message: Dict[str, Any]):
+        return self._device_command(websocket, "turn_off", message)
     
     async def handle_turn_on_multiple(self, websocket: WebSocket, message: Dict[str, Any]):
         device_ids = message.get("device_ids")
-        if not device_ids or not isinstance(device_ids, list):
+        if device_ids is not None and not isinstance(device_ids, list):
             return {"status": "error", "message": "No device_ids specified or invalid format"}
-
-        result = await turn_on_multiple(device_ids)
-        return {"status": "success", "device_ids": device_ids, "result": result, "command": "turn_on_multiple"}
+        return self._device_command(websocket, "turn_on_multiple", message)
     
     async def handle_turn_off_multiple(self, websocket: WebSocket, message: Dict[str, Any]):
         device_ids = message.get("device_ids")
-        if not device_ids or not isinstance(device_ids, list):
+        if device_ids is not None and not isinstance(device_ids, list):
             return {"status": "error", "message": "No device_ids specified or invalid format"}
-
-        result = await turn_off_multiple(device_ids)
-        return {"status": "success", "device_ids": device_ids, "result": result, "command": "turn_off_multiple"}
+        return self._device_command(websocket, "turn_off_multiple", message)
 
     async def handle_set_color_mode(self, websocket: WebSocket, message: Dict[str, Any]):
-        device_id = message.get("device_ids")
-        if not device_id:
-            return {"status": "error", "message": "No device_id specified"}
-
-        device_ids = message.get("device_ids", [device_id])
-
-
-        result = await set_color_mode(device_ids)
-        return {"status": "success", "device_ids": device_ids, "result": result, "command": "set_color_mode"}
+        return self._device_command(websocket, "set_color_mode", message)
     
     async def handle_set_white_mode(self, websocket: WebSocket, message: Dict[str, Any]):
-        device_id = message.get("device_ids")
-        if not device_id:
-            return {"status": "error", "message": "No device_id specified"}
-
-        device_ids = message.get("device_ids", [device_id])
-
-
-        result = await set_white_mode(device_ids)
-        return {"status": "success", "device_ids": device_ids, "result": result, "command": "set_white_mode"}
+        return self._device_command(websocket, "set_white_mode", message)
 
     async def handle_set_color(self, websocket: WebSocket, message: Dict[str, Any]):
-        device_id = message.get("device_ids")
-        if not device_id:
-            return {"status": "error", "message": "No device_id specified"}
-
-        device_ids = message.get("device_ids", [device_id])
-        red = message.get("red", 255)
-        green = message.get("green", 255)
-        blue = message.get("blue", 255)
-        gain = 100
-
-        result = await set_color(device_ids, red, green, blue)
-        return {"status": "success", "device_ids": device_ids, "result": result, "command": "set_color"}
+        return self._device_command(websocket, "set_color", message)
 
     async def handle_set_temperature(self, websocket: WebSocket, message: Dict[str, Any]):
-        device_id = message.get("device_ids")
-        if not device_id:
-            return {"status": "error", "message": "No device_id specified"}
-
-        device_ids = message.get("device_ids", [device_id])
-        temp = message.get("temp", 4750)
-
-        result = await set_white_temperature(device_ids, temp)
-        return {"status": "success", "device_ids": device_ids, "result": result, "command": "set_temperature"}
+        return self._device_command(websocket, "set_white_temperature", message, "set_temperature")
 
     async def handle_set_brightness(self, websocket: WebSocket, message: Dict[str, Any]):
-        device_id = message.get("device_ids")
-        if not device_id:
-            return {"status": "error", "message": "No device_id specified"}
-
-        device_ids = message.get("device_ids", [device_id])
-        brightness = message.get("brightness", 100)
-
-        result = await set_white_brightness(device_ids, brightness)
-        return {"status": "success", "device_ids": device_ids, "result": result, "command": "set_white_brightness"}
+        return self._device_command(websocket, "set_white_brightness", message)
+
+    async def handle_recall_scene(self, websocket: WebSocket, message: Dict[str, Any]):
+        """
+        Aplică toate acțiunile unei scene. Acțiunile au forma mesajelor de comandă
+        (ex. {"command": "set_color", "room_id": 1, "red": 255, ...}) și sunt trimise
+        planificatorului în același pas, deci pleacă într-o singură rafală MQTT.
+        """
+        scene_id = message.get("scene_id")
+        scene = self.state_machine.get_scene(scene_id)
+        if scene is None:
+            return {"status": "error", "message": f"Unknown scene_id: {scene_id}"}
+
+        futures = []
+        skipped = []
+        for index, action in enumerate(scene["actions"]):
+            spec = DEVICE_COMMANDS.get(action.get("command")) if isinstance(action, dict) else None
+            if spec is None:
+                skipped.append(index)
+                continue
+            channel, build, device_type = spec
+            device_ids = self._resolve_targets(action, device_type)
+            if not device_ids:
+                skipped.append(index)
+                continue
+            futures.append(self._submit(action["command"], channel, device_ids, build(action)))
+
+        async def scene_result():
+            result: Dict[str, bool] = {}
+            for partial in await asyncio.gather(*futures):
+                for device_id, ok in partial.items():
+                    result[device_id] = result.get(device_id, True) and ok
+            return result
+
+        def respond(result: Dict[str, bool]) -> Dict[str, Any]:
+            response = self._bulk_response("recall_scene", list(result), result)
+            response["scene_id"] = scene_id
+            response["skipped_actions"] = skipped
+            return response
+
+        return self._response_when_done(scene_result(), respond)
     
+    async def handle_sync(self, websocket: WebSocket, message: Dict[str, Any]):
+        """Retrimite modificările de după versiunea "since" sau snapshot-ul complet."""
+        since = message.get("since")
+        subscription = self._connection_subscription(websocket)
+        delta = self.state_machine.get_changes_since(since) if isinstance(since, int) and not isinstance(since, bool) else None
+        if delta is None:
+            await self.send(websocket, *await self.get_devices_snapshot(subscription))
+            return None
+        if subscription is not None:
+            return self.subscriptions.filter_delta(subscription, delta)
+        return delta
+
+    async def handle_subscribe(self, websocket: WebSocket, message: Dict[str, Any]):
+        """
+        Restrânge ce primește clientul: {"command": "subscribe", "rooms": [1], "device_ids": [...],
+        "types": ["light"], "fields": ["ison", "brightness"], "new_devices": false}.
+        Dispozitivele sunt reuniunea camerelor, id-urilor și tipurilor (toate dacă lipsesc);
+        "fields" limitează câmpurile de status. Clientul primește apoi snapshot-ul filtrat.
+        """
+        connection = self.active_connections.get(websocket)
+        if connection is None:
+            return {"status": "error", "message": "Not connected"}
+        try:
+            subscription = Subscription.from_message(message)
+        except ValueError as e:
+            return {"status": "error", "message": str(e)}
+        self._set_subscription(connection, subscription)
+        snapshot, frame = await self.get_devices_snapshot(subscription)
+        await self.send(websocket, {"status": "success", "command": "subscribe", "devices": len(snapshot["devices"])})
+        await self.send(websocket, snapshot, frame)
+        return None
+
+    async def handle_unsubscribe(self, websocket: WebSocket, message: Dict[str, Any]):
+        """Renunță la filtru: clientul primește din nou toate dispozitivele, începând cu snapshot-ul complet."""
+        connection = self.active_connections.get(websocket)
+        if connection is None:
+            return {"status": "error", "message": "Not connected"}
+        self._set_subscription(connection, None)
+        await self.send(websocket, {"status": "success", "command": "unsubscribe"})
+        await self.send(websocket, *await self.get_devices_snapshot())
+        return None
+
     async def handle_get_all_data(self, websocket: WebSocket, message: Dict[str, Any]):
         """Gestionează comanda 'get_all_data' și trimite toate datele către client."""
         try:
             await self.send_all_data(websocket)
             return {"status": "success", "message": "All data sent successfully"}
         except Exception as e:
-            logger.error(f"Error handling 'get_all_data': {e}")
-            traceback.print_exc()
+            logger.exception("Error handling 'get_all_data': %s", e)
             return {"status": "error", "message": str(e)}
\ No newline at end of file
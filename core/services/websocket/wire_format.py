@@ -0,0 +1,150 @@
+import json
+import zlib
+from collections.abc import Mapping
+from typing import Any, Dict, List, Optional, Union
+from config.settings import WS_COMPRESS_LEVEL, WS_COMPRESS_MIN_BYTES
+from integration.device_state import json_default
+
+try:
+    import msgpack
+except ImportError:  # msgpack e opțional; fără el se negociază doar JSON
+    msgpack = None
+
+JSON_PROTOCOL = "homelab.json"
+MSGPACK_PROTOCOL = "homelab.msgpack"
+
+# Dicționarul de câmpuri pentru formatul binar: o cheie cunoscută e trimisă ca indexul ei din listă.
+# Lista se trimite clientului în cadrul "hello"; se adaugă doar la sfârșit, ca id-urile să rămână stabile
+# (câmpurile noi din DeviceState se adaugă tot aici, la sfârșit).
+KEYS = (
+    "tag", "version", "since", "changes", "devices", "new_devices", "adopted", "status",
+    "id", "name", "type", "pending", "command", "device_id", "device_ids", "result", "failed",
+    "message", "data", "rooms", "entities", "manufacturer", "model", "config", "lastUpdated", "image",
+    "device", "scene_id", "skipped_actions",
+    "ison", "mode", "brightness", "temp", "red", "green", "blue", "gain", "power", "energy", "online", "last_seen",
+    "request_id", "responses",
+)
+KEY_IDS = {key: index for index, key in enumerate(KEYS)}
+
+# Primul octet al fiecărui cadru binar.
+FLAG_PLAIN = 0
+FLAG_ZLIB = 1
+
+
+def encode_message(message: Dict[str, Any]) -> str:
+    """Serializează un mesaj exact ca WebSocket.send_json (DeviceState devine dict)."""
+    return json.dumps(message, separators=(",", ":"), ensure_ascii=False, default=json_default)
+
+
+def compact_keys(value: Any) -> Any:
+    """
+    Înlocuiește cheile cunoscute cu id-ul lor. Celelalte chei întregi devin text (ca în JSON),
+    deci orice cheie întreagă din cadru e un id din KEYS.
+    """
+    if isinstance(value, Mapping):
+        return {
+            KEY_IDS.get(key, key) if isinstance(key, str) else str(key): compact_keys(item)
+            for key, item in value.items()
+        }
+    if isinstance(value, (list, tuple)):
+        return [compact_keys(item) for item in value]
+    return value
+
+
+def expand_keys(value: Any) -> Any:
+    """Inversul lui compact_keys, pentru mesajele primite de la clienți."""
+    if isinstance(value, dict):
+        return {
+            KEYS[key] if isinstance(key, int) and 0 <= key < len(KEYS) else key: expand_keys(item)
+            for key, item in value.items()
+        }
+    if isinstance(value, list):
+        return [expand_keys(item) for item in value]
+    return value
+
+
+class WireFormat:
+    """Formatul JSON text, implicit pentru clienții care nu cer alt subprotocol."""
+
+    protocol = JSON_PROTOCOL
+    binary = False
+
+    def encode(self, message: Dict[str, Any]) -> Union[str, bytes]:
+        return encode_message(message)
+
+    def decode(self, data: Union[str, bytes]) -> Any:
+        return json.loads(data)
+
+    def hello(self) -> Optional[Union[str, bytes]]:
+        """Cadrul trimis imediat după conectare, înaintea oricărui mesaj (None pentru JSON)."""
+        return None
+
+
+class MsgpackFormat(WireFormat):
+    """
+    MessagePack în cadre binare: un octet de flag (FLAG_PLAIN / FLAG_ZLIB) urmat de mesaj,
+    cu cheile cunoscute înlocuite de id-uri din KEYS. Cadrele de cel puțin `compress_min_bytes`
+    (de obicei snapshot-urile) se comprimă cu zlib.
+    """
+
+    protocol = MSGPACK_PROTOCOL
+    binary = True
+
+    def __init__(self, compress_min_bytes: int = WS_COMPRESS_MIN_BYTES, compress_level: int = WS_COMPRESS_LEVEL):
+        self.compress_min_bytes = compress_min_bytes
+        self.compress_level = compress_level
+
+    def encode(self, message: Dict[str, Any], compact: bool = True) -> bytes:
+        payload = msgpack.packb(compact_keys(message) if compact else message, default=json_default)
+        if 0 < self.compress_min_bytes <= len(payload):
+            return bytes((FLAG_ZLIB,)) + zlib.compress(payload, self.compress_level)
+        return bytes((FLAG_PLAIN,)) + payload
+
+    def decode(self, data: Union[str, bytes]) -> Any:
+        if isinstance(data, str):
+            return json.loads(data)
+        flag, payload = data[0], data[1:]
+        if flag == FLAG_ZLIB:
+            payload = zlib.decompress(payload)
+        elif flag != FLAG_PLAIN:
+            raise ValueError(f"Unknown frame flag: {flag}")
+        return expand_keys(msgpack.unpackb(payload, strict_map_key=False))
+
+    def hello(self) -> Optional[Union[str, bytes]]:
+        # Singurul cadru cu chei text: clientul află din el dicționarul de id-uri.
+        return self.encode({"tag": "hello", "protocol": self.protocol, "keys": list(KEYS),
+                            "compress_min_bytes": self.compress_min_bytes}, compact=False)
+
+
+JSON = WireFormat()
+FORMATS: Dict[str, WireFormat] = {JSON_PROTOCOL: JSON}
+if msgpack is not None:
+    FORMATS[MSGPACK_PROTOCOL] = MsgpackFormat()
+
+
+def negotiate(offered: List[str]) -> Optional[WireFormat]:
+    """Primul subprotocol oferit de client pe care îl suportăm; None dacă nu a oferit niciunul cunoscut."""
+    for protocol in offered:
+        wire = FORMATS.get(protocol)
+        if wire is not None:
+            return wire
+    return None
+
+
+class SharedFrame:
+    """
+    Un mesaj trimis mai multor clienți, serializat cel mult o dată pentru fiecare format folosit.
+    Codificarea se face la prima cerere, din task-ul de scriere al primului client cu acel format.
+    """
+
+    __slots__ = ("message", "_encoded")
+
+    def __init__(self, message: Dict[str, Any]):
+        self.message = message
+        self._encoded: Dict[str, Union[str, bytes]] = {}
+
+    def encode(self, wire: WireFormat) -> Union[str, bytes]:
+        data = self._encoded.get(wire.protocol)
+        if data is None:
+            data = self._encoded[wire.protocol] = wire.encode(self.message)
+        return data
@@ -0,0 +1,167 @@
+"""
+Fixture-urile comune. Clientul Prisma nu e generat în mediul de test, așa că modulul `prisma`
+e înlocuit cu un client în memorie înainte ca `database` să fie importat; scrierile în lot
+se înregistrează în `db.batches`.
+"""
+import json
+import os
+import sys
+import types
+from contextlib import asynccontextmanager
+from typing import Any, Dict, List, Optional
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+class FakeTable:
+    def __init__(self):
+        self.rows: List[Any] = []
+
+    async def find_many(self, where=None, include=None, order=None, take=None):
+        rows = [row for row in self.rows if _matches(row, where or {})]
+        return rows[:take] if take is not None else rows
+
+    async def find_unique(self, where, include=None):
+        return next((row for row in self.rows if _matches(row, where)), None)
+
+
+def _matches(row, where: Dict[str, Any]) -> bool:
+    for field, condition in where.items():
+        value = getattr(row, field)
+        if isinstance(condition, dict):
+            if "in" in condition and value not in condition["in"]:
+                return False
+        elif value != condition:
+            return False
+    return True
+
+
+class FakeBatch:
+    """Înregistrează operațiile unui db.batch_() ca (tabelă, operație, argumente)."""
+
+    def __init__(self):
+        self.operations: List[tuple] = []
+
+    def __getattr__(self, table: str):
+        operations = self.operations
+
+        class _Table:
+            def __getattr__(self, operation: str):
+                return lambda **kwargs: operations.append((table, operation, kwargs))
+
+        return _Table()
+
+
+class FakePrisma:
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.entity = FakeTable()
+        self.room = FakeTable()
+        self.group = FakeTable()
+        self.scene = FakeTable()
+        self.metricrollup = FakeTable()
+        self.batches: List[List[tuple]] = []
+        # Cu fail=True fiecare batch eșuează la commit, ca o bază de date indisponibilă.
+        self.fail = False
+        self.connected = False
+
+    async def connect(self):
+        self.connected = True
+
+    async def disconnect(self):
+        self.connected = False
+
+    def is_connected(self) -> bool:
+        return self.connected
+
+    @asynccontextmanager
+    async def batch_(self):
+        batch = FakeBatch()
+        yield batch
+        if self.fail:
+            raise RuntimeError("database unavailable")
+        self.batches.append(batch.operations)
+
+
+_prisma = types.ModuleType("prisma")
+_prisma.Prisma = FakePrisma
+sys.modules["prisma"] = _prisma
+
+import pytest  # noqa: E402
+from fastapi import WebSocket  # noqa: E402
+from database import db  # noqa: E402
+from integration.device_state import DeviceState  # noqa: E402
+from services.state_machine.device_state_machine import DeviceStateMachine  # noqa: E402
+
+# (id, tip, status inițial)
+DEVICES = (
+    ("light1", "light", {"ison": False, "brightness": 10}),
+    ("light2", "light", {"ison": False, "brightness": 20}),
+    ("light3", "light", {"ison": True, "brightness": 30}),
+    ("plug1", "outlet", {"ison": True, "power": 4.5}),
+)
+
+
+def room(room_id: int, name: str, device_ids: List[str]):
+    """O cameră așa cum o întoarce db.room.find_many(include={"entities": True})."""
+    entities = [
+        types.SimpleNamespace(id=device_id, name=device_id, type="light", manufacturer="shelly", model="SHCB-1",
+                              status=None, config=None, lastUpdated=None, roomId=room_id)
+        for device_id in device_ids
+    ]
+    return types.SimpleNamespace(id=room_id, name=name, status=None, image=None, entities=entities)
+
+
+def report(device_id: str, **values):
+    """Un mesaj MQTT de status (topic, payload) cu valorile date."""
+    return f"shellies/{device_id}/color/0/status", json.dumps(values)
+
+
+class FakeWebSocket(WebSocket):
+    """Un client WebSocket care păstrează mesajele trimise. Nu are conexiune ASGI în spate."""
+
+    def __init__(self, subprotocols: Optional[List[str]] = None):
+        self.scope = {"type": "websocket", "subprotocols": subprotocols or []}
+        # frames: cadrele exact cum au fost trimise; sent: aceleași mesaje decodate.
+        self.frames: List[Any] = []
+        self.sent: List[Any] = []
+        self.accepted = False
+        self.subprotocol: Optional[str] = None
+        self.closed = False
+
+    async def accept(self, subprotocol: Optional[str] = None):
+        self.accepted = True
+        self.subprotocol = subprotocol
+
+    async def send_json(self, message):
+        await self.send_text(json.dumps(message))
+
+    async def send_text(self, text: str):
+        self.frames.append(text)
+        self.sent.append(json.loads(text))
+
+    async def close(self, code: int = 1000):
+        self.closed = True
+
+
+@pytest.fixture(autouse=True)
+def fake_db():
+    db.reset()
+    return db
+
+
+@pytest.fixture
+def state_machine() -> DeviceStateMachine:
+    """Mașina de stare cu DEVICES încărcate și două camere: 1 = light1, light2; 2 = plug1."""
+    sm = DeviceStateMachine(shards=4)
+    for device_id, device_type, status in DEVICES:
+        with sm.shard(device_id).lock:
+            sm.devices[device_id] = {"id": device_id, "name": device_id, "type": device_type,
+                                     "status": DeviceState(status)}
+    with sm.lock:
+        sm.room_index.load([room(1, "Living", ["light1", "light2"]), room(2, "Office", ["plug1"])], sm.devices)
+    sm.publish_snapshots()
+    return sm
+
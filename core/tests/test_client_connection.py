@@ -0,0 +1,152 @@
+import asyncio
+from conftest import FakeWebSocket
+from services.websocket import client_connection
+from services.websocket.client_connection import ClientConnection, merge_deltas
+from services.websocket.websocket_service import WebSocketManager
+
+
+def delta(since, version, changes, **extra):
+    return {"tag": "delta", "since": since, "version": version, "changes": changes, **extra}
+
+
+class StalledWebSocket(FakeWebSocket):
+    """Un client care nu mai citește: send_json nu se termină niciodată."""
+
+    async def send_text(self, text):
+        await asyncio.Event().wait()
+
+
+class BrokenWebSocket(FakeWebSocket):
+    async def send_text(self, text):
+        raise ConnectionResetError("gone")
+
+
+def test_merge_deltas_newest_wins():
+    older = delta(1, 3, {"light1": {"status": {"ison": True, "brightness": 5}, "version": 2}},
+                  new_devices={"light8": {"id": "light8"}, "light9": {"id": "light9"}})
+    newer = delta(3, 5, {"light1": {"status": {"brightness": 9}, "version": 5}, "light2": {"status": {"ison": False}}},
+                  adopted=["light9"])
+
+    merged = merge_deltas(older, newer)
+
+    assert merged["since"] == 1 and merged["version"] == 5
+    assert merged["changes"]["light1"] == {"status": {"ison": True, "brightness": 9}, "version": 5}
+    assert merged["changes"]["light2"] == {"status": {"ison": False}}
+    assert merged["new_devices"] == {"light8": {"id": "light8"}}
+    assert merged["adopted"] == ["light9"]
+    # Mesajele inițiale nu se modifică: pot fi în cozile altor clienți.
+    assert older["changes"]["light1"]["status"]["brightness"] == 5
+
+
+def test_full_queue_merges_deltas():
+    async def scenario():
+        connection = ClientConnection(FakeWebSocket(), lambda _: None, max_queue=2, slow_timeout=60)
+        for version in range(1, 6):
+            assert connection.enqueue(delta(version - 1, version, {"light1": {"status": {"brightness": version}}}))
+        return connection
+
+    connection = asyncio.run(scenario())
+
+    assert len(connection.queue) == 2
+    last, text = connection.queue[-1]
+    assert (last["since"], last["version"]) == (1, 5)
+    assert last["changes"]["light1"]["status"] == {"brightness": 5}
+    # Mesajul comasat e propriu clientului, deci se serializează la trimitere.
+    assert text is None
+
+
+def test_delta_is_not_merged_across_a_snapshot():
+    async def scenario():
+        connection = ClientConnection(FakeWebSocket(), lambda _: None, max_queue=2, slow_timeout=60)
+        connection.enqueue(delta(0, 1, {}))
+        connection.enqueue({"devices": {}, "version": 1})
+        connection.enqueue(delta(1, 2, {"light1": {"status": {"ison": True}}}))
+        return connection
+
+    connection = asyncio.run(scenario())
+
+    assert [message.get("tag") for message, _ in connection.queue] == ["delta", None, "delta"]
+
+
+def test_slow_client_is_evicted(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr(client_connection.time, "monotonic", lambda: now[0])
+    removed = []
+    websocket = StalledWebSocket()
+
+    async def scenario():
+        connection = ClientConnection(websocket, removed.append, max_queue=1, slow_timeout=5)
+        connection.start()
+        connection.enqueue(delta(0, 1, {}))
+        await asyncio.sleep(0)
+        connection.enqueue(delta(1, 2, {}))
+        # Coada e plină: clientul e marcat ca rămas în urmă, dar nu e încă evacuat.
+        assert connection.enqueue(delta(2, 3, {}))
+        now[0] += 6
+        result = connection.enqueue(delta(3, 4, {}))
+        await asyncio.sleep(0)
+        return connection, result
+
+    connection, result = asyncio.run(scenario())
+
+    assert result is False
+    assert connection.closed and websocket.closed
+    assert removed == [connection]
+
+
+def test_non_delta_overflow_evicts():
+    async def scenario():
+        connection = ClientConnection(FakeWebSocket(), lambda _: None, max_queue=1, slow_timeout=60)
+        results = [connection.enqueue({"status": "success", "index": index}) for index in range(3)]
+        return connection, results
+
+    connection, results = asyncio.run(scenario())
+
+    assert results == [True, True, False]
+    assert connection.closed
+
+
+def test_writer_sends_in_order():
+    websocket = FakeWebSocket()
+
+    async def scenario():
+        connection = ClientConnection(websocket, lambda _: None)
+        connection.start()
+        for index in range(3):
+            connection.enqueue({"index": index})
+        while len(websocket.sent) < 3:
+            await asyncio.sleep(0)
+        connection.close()
+
+    asyncio.run(scenario())
+
+    assert [message["index"] for message in websocket.sent] == [0, 1, 2]
+
+
+def test_send_failure_removes_the_client(state_machine):
+    manager = WebSocketManager(state_machine)
+
+    async def scenario():
+        await manager.connect(BrokenWebSocket())
+        await asyncio.sleep(0.01)
+
+    asyncio.run(scenario())
+
+    assert manager.active_connections == {}
+
+
+def test_a_stalled_client_does_not_delay_the_others(state_machine):
+    manager = WebSocketManager(state_machine)
+    stalled, fast = StalledWebSocket(), FakeWebSocket()
+
+    async def scenario():
+        await manager.connect(stalled)
+        await manager.connect(fast)
+        manager._send_to_all(delta(0, 1, {}))
+        await asyncio.sleep(0.01)
+        for connection in list(manager.active_connections.values()):
+            connection.close()
+
+    asyncio.run(scenario())
+
+    assert [message.get("tag") for message in fast.sent] == [None, "delta"]
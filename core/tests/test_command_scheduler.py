@@ -0,0 +1,104 @@
+import asyncio
+import time
+from services.commands.scheduler import CommandScheduler, merge_command
+
+
+def test_merge_combines_settings_with_the_same_mode():
+    assert merge_command({"mode": "white", "brightness": 10}, {"temp": 4000}) == \
+        {"mode": "white", "brightness": 10, "temp": 4000}
+    assert merge_command({"mode": "white", "brightness": 10}, {"mode": "color", "red": 255}) == \
+        {"mode": "color", "red": 255}
+    assert merge_command("on", "off") == "off"
+    assert merge_command({"brightness": 10}, "off") == "off"
+
+
+class Recorder:
+    """send_batch care înregistrează fiecare lot și momentul trimiterii."""
+
+    def __init__(self, fail=()):
+        self.batches = []
+        self.fail = set(fail)
+
+    async def __call__(self, batch):
+        self.batches.append((time.monotonic(), dict(batch)))
+        return {key: key[0] not in self.fail for key in batch}
+
+
+def test_ready_commands_go_out_in_one_batch():
+    send = Recorder(fail={"light2"})
+
+    async def scenario():
+        scheduler = CommandScheduler(send, rate=100)
+        try:
+            return await scheduler.submit(["light1", "light2", "light3"], "color/0", {"turn": "on"})
+        finally:
+            scheduler.stop()
+
+    result = asyncio.run(scenario())
+
+    assert result == {"light1": True, "light2": False, "light3": True}
+    assert len(send.batches) == 1
+    assert set(send.batches[0][1]) == {("light1", "color/0"), ("light2", "color/0"), ("light3", "color/0")}
+
+
+def test_pending_commands_are_coalesced_and_share_the_result():
+    send = Recorder()
+
+    async def scenario():
+        scheduler = CommandScheduler(send, rate=10)
+        try:
+            await scheduler.submit(["light1"], "color/0", {"mode": "white", "brightness": 10})
+            # light1 e acum limitat; următoarele comenzi așteaptă și se comasează.
+            second = scheduler.submit(["light1"], "color/0", {"mode": "white", "brightness": 50})
+            third = scheduler.submit(["light1"], "color/0", {"temp": 3000})
+            return await asyncio.gather(second, third), scheduler.coalesced
+        finally:
+            scheduler.stop()
+
+    results, coalesced = asyncio.run(scenario())
+
+    assert results == [{"light1": True}, {"light1": True}]
+    assert coalesced == 1
+    assert [batch for _, batch in send.batches] == [
+        {("light1", "color/0"): {"mode": "white", "brightness": 10}},
+        {("light1", "color/0"): {"mode": "white", "brightness": 50, "temp": 3000}},
+    ]
+
+
+def test_each_device_is_rate_limited():
+    send = Recorder()
+    rate = 20
+
+    async def scenario():
+        scheduler = CommandScheduler(send, rate=rate)
+        try:
+            for brightness in range(3):
+                await scheduler.submit(["light1"], "color/0", {"brightness": brightness})
+            # Alt dispozitiv nu e întârziat de limita lui light1.
+            started = time.monotonic()
+            await scheduler.submit(["light2"], "color/0", {"brightness": 1})
+            return time.monotonic() - started
+        finally:
+            scheduler.stop()
+
+    other_device_wait = asyncio.run(scenario())
+
+    times = [sent_at for sent_at, batch in send.batches if ("light1", "color/0") in batch]
+    gaps = [later - earlier for earlier, later in zip(times, times[1:])]
+    assert len(gaps) == 2
+    assert min(gaps) >= 1 / rate * 0.9
+    assert other_device_wait < 1 / rate
+
+
+def test_send_errors_fail_the_commands():
+    async def broken(batch):
+        raise ConnectionError("broker down")
+
+    async def scenario():
+        scheduler = CommandScheduler(broken, rate=100)
+        try:
+            return await scheduler.submit(["light1", "light2"], "color/0", "on")
+        finally:
+            scheduler.stop()
+
+    assert asyncio.run(scenario()) == {"light1": False, "light2": False}
@@ -0,0 +1,132 @@
+import asyncio
+import json
+from types import SimpleNamespace
+from conftest import FakeWebSocket
+from services.commands.scheduler import CommandScheduler
+from services.websocket.websocket_service import WebSocketManager
+
+
+def group(group_id: int, name: str, device_ids):
+    return SimpleNamespace(id=group_id, name=name, entities=[SimpleNamespace(id=device_id) for device_id in device_ids])
+
+
+def scene(scene_id: int, name: str, actions):
+    return SimpleNamespace(id=scene_id, name=name, actions=actions if isinstance(actions, str) else json.dumps(actions))
+
+
+class Recorder:
+    """send_batch care înregistrează loturile; dispozitivele din fail eșuează."""
+
+    def __init__(self, fail=()):
+        self.batches = []
+        self.fail = set(fail)
+
+    async def __call__(self, batch):
+        self.batches.append(dict(batch))
+        return {key: key[0] not in self.fail for key in batch}
+
+
+def load_groups(state_machine, fake_db):
+    fake_db.group.rows = [group(1, "Mixed", ["light1", "plug1", "light9"])]
+    fake_db.scene.rows = [
+        scene(1, "Evening", [
+            {"command": "set_white_brightness", "room_id": 1, "brightness": 30},
+            {"command": "turn_off", "device_ids": ["light3"]},
+            {"command": "explode", "device_ids": ["light1"]},
+            {"command": "turn_on", "group_id": 99},
+        ]),
+        scene(2, "Broken", "not json"),
+    ]
+    asyncio.run(state_machine.refresh_groups())
+
+
+def run_command(state_machine, message, fail=()):
+    """Trimite o comandă managerului și întoarce răspunsul clientului și loturile publicate."""
+    send = Recorder(fail)
+    websocket = FakeWebSocket()
+
+    async def scenario():
+        manager = WebSocketManager(state_machine)
+        manager.scheduler = CommandScheduler(send, rate=100)
+        try:
+            await manager.process_message(websocket, message)
+            while not websocket.sent:
+                await asyncio.sleep(0.001)
+        finally:
+            manager.scheduler.stop()
+
+    asyncio.run(scenario())
+    return websocket.sent[0], send.batches
+
+
+def test_targets_resolve_from_rooms_and_groups(state_machine, fake_db):
+    load_groups(state_machine, fake_db)
+
+    assert state_machine.resolve_targets(room_id=1) == ["light1", "light2"]
+    # Dispozitivele necunoscute se omit, iar tipul filtrează membrii grupului.
+    assert state_machine.resolve_targets(group_id=1) == ["light1", "plug1"]
+    assert state_machine.resolve_targets(group_id=1, device_type="light") == ["light1"]
+    assert state_machine.resolve_targets(device_ids="light3", room_id=1) == ["light3"]
+    assert state_machine.resolve_targets(group_id=99) is None
+    assert state_machine.resolve_targets() is None
+
+
+def test_scenes_with_invalid_actions_are_loaded_empty(state_machine, fake_db):
+    load_groups(state_machine, fake_db)
+
+    assert state_machine.get_scene(2)["actions"] == []
+    assert [item["name"] for item in state_machine.get_scenes_data()] == ["Evening", "Broken"]
+
+
+def test_refresh_group_picks_up_changes_and_removals(state_machine, fake_db):
+    load_groups(state_machine, fake_db)
+    fake_db.group.rows = [group(1, "Mixed", ["light2"])]
+
+    asyncio.run(state_machine.refresh_group(1))
+    assert state_machine.get_groups_data() == [{"id": 1, "name": "Mixed", "entity_ids": ["light2"]}]
+
+    fake_db.group.rows = []
+    asyncio.run(state_machine.refresh_group(1))
+    assert state_machine.get_groups_data() == []
+
+
+def test_colour_commands_on_a_group_reach_only_lights(state_machine, fake_db):
+    load_groups(state_machine, fake_db)
+
+    response, batches = run_command(state_machine, {"command": "set_color", "group_id": 1, "red": 10})
+
+    assert [key for batch in batches for key in batch] == [("light1", "set")]
+    assert response["device_ids"] == ["light1"]
+    assert response["status"] == "success"
+
+
+def test_unknown_targets_are_reported(state_machine, fake_db):
+    load_groups(state_machine, fake_db)
+    websocket = FakeWebSocket()
+
+    async def scenario():
+        manager = WebSocketManager(state_machine)
+        try:
+            await manager.process_message(websocket, {"command": "turn_on", "room_id": 42})
+            await manager.process_message(websocket, {"command": "recall_scene", "scene_id": 42})
+        finally:
+            manager.scheduler.stop()
+
+    asyncio.run(scenario())
+
+    assert [message["message"] for message in websocket.sent] == ["Unknown room_id or group_id", "Unknown scene_id: 42"]
+
+
+def test_recall_scene_sends_every_action_in_one_burst(state_machine, fake_db):
+    load_groups(state_machine, fake_db)
+
+    response, batches = run_command(state_machine, {"command": "recall_scene", "scene_id": 1}, fail={"light3"})
+
+    assert len(batches) == 1
+    assert set(batches[0]) == {("light1", "set"), ("light2", "set"), ("light3", "command")}
+    assert batches[0][("light3", "command")] == "off"
+    assert response["command"] == "recall_scene"
+    assert response["result"] == {"light1": True, "light2": True, "light3": False}
+    assert response["failed"] == ["light3"]
+    # Comanda necunoscută și grupul inexistent se sar, fără să oprească scena.
+    assert response["skipped_actions"] == [2, 3]
@@ -0,0 +1,102 @@
+import pytest
+from conftest import report
+
+
+@pytest.fixture
+def tracker(state_machine):
+    return state_machine.command_tracker
+
+
+def status_of(state_machine, device_id):
+    return state_machine.devices[device_id]["status"]
+
+
+def test_track_applies_the_expected_state_optimistically(state_machine, tracker):
+    since = state_machine.version
+    tracker.track(["light1", "light2"], "set_brightness", {"ison": True, "brightness": 90})
+
+    assert status_of(state_machine, "light1")["brightness"] == 90
+    assert state_machine.devices["light1"]["pending"] == ["brightness", "ison"]
+    change = state_machine.get_changes_since(since)["changes"]["light2"]
+    assert change["status"] == {"ison": True, "brightness": 90}
+    assert change["pending"] == ["brightness", "ison"]
+    assert tracker.get_stats()["pending_fields"] == 4
+
+
+def test_matching_report_confirms_the_command(state_machine, tracker):
+    tracker.track(["light1"], "turn_on", {"ison": True})
+    tracker.mark_sent({"light1": {"ison": True}})
+    since = state_machine.version
+
+    state_machine.handle_messages([report("light1", ison=True)])
+
+    assert "light1" not in tracker.pending
+    assert "pending" not in state_machine.devices["light1"]
+    assert tracker.confirmed == 1
+    assert tracker.get_stats()["by_device"]["light1"]["count"] == 1
+    assert state_machine.get_changes_since(since)["changes"]["light1"]["pending"] == []
+
+
+def test_other_value_keeps_the_optimistic_state_and_moves_the_rollback_target(state_machine, tracker):
+    tracker.track(["light1"], "set_brightness", {"brightness": 90})
+
+    state_machine.handle_messages([report("light1", brightness=15, ison=True)])
+
+    assert status_of(state_machine, "light1")["brightness"] == 90
+    assert status_of(state_machine, "light1")["ison"] is True
+    assert tracker.pending["light1"]["brightness"].reported == 15
+
+    tracker.reject({"light1": ["brightness"]})
+    assert status_of(state_machine, "light1")["brightness"] == 15
+
+
+def test_failed_publish_rolls_back_immediately(state_machine, tracker):
+    tracker.track(["light2"], "turn_on", {"ison": True})
+    tracker.reject({"light2": ["ison"]})
+
+    assert status_of(state_machine, "light2")["ison"] is False
+    assert "pending" not in state_machine.devices["light2"]
+    assert tracker.failed == 1
+
+
+def test_unconfirmed_commands_expire(state_machine, tracker):
+    tracker.timeout = 0
+    tracker.track(["light1", "light3"], "turn_off", {"ison": False})
+
+    assert tracker.next_deadline() is not None
+    assert tracker.expire() == 2
+
+    assert status_of(state_machine, "light1")["ison"] is False
+    assert status_of(state_machine, "light3")["ison"] is True
+    assert tracker.pending == {}
+    assert tracker.timed_out == 2
+    assert tracker.timeouts_by_device == {"light1": 1, "light3": 1}
+    assert tracker.next_deadline() is None
+
+
+def test_newer_command_replaces_the_expected_value(state_machine, tracker):
+    tracker.track(["light1"], "set_brightness", {"brightness": 50})
+    tracker.track(["light1"], "set_brightness", {"brightness": 70})
+
+    state_machine.handle_messages([report("light1", brightness=50)])
+    assert status_of(state_machine, "light1")["brightness"] == 70
+    assert "brightness" in tracker.pending["light1"]
+
+    state_machine.handle_messages([report("light1", brightness=70)])
+    assert tracker.pending == {}
+
+    # După confirmare, ținta unui nou rollback e valoarea confirmată.
+    tracker.track(["light1"], "set_brightness", {"brightness": 5})
+    tracker.reject({"light1": ["brightness"]})
+    assert status_of(state_machine, "light1")["brightness"] == 70
+
+
+def test_rollback_removes_fields_the_device_never_reported(state_machine, tracker):
+    tracker.track(["light1"], "set_white_temperature", {"mode": "white", "temp": 3000})
+    since = state_machine.version
+
+    tracker.reject({"light1": ["mode", "temp"]})
+
+    assert "temp" not in status_of(state_machine, "light1")
+    assert "mode" not in status_of(state_machine, "light1")
+    assert state_machine.get_changes_since(since)["changes"]["light1"]["status"] == {"mode": None, "temp": None}
@@ -0,0 +1,86 @@
+import json
+import pytest
+from integration.device_state import FIELDS, DeviceState, json_default
+
+
+def test_mapping_view_contains_only_set_fields():
+    state = DeviceState({"ison": True, "brightness": 40, "effect": 2})
+
+    assert dict(state) == {"ison": True, "brightness": 40, "effect": 2}
+    assert len(state) == 3
+    assert "temp" not in state
+    assert state.get("temp") is None
+    with pytest.raises(KeyError):
+        state["temp"]
+
+
+def test_apply_returns_only_changed_fields():
+    state = DeviceState({"ison": False, "brightness": 40, "effect": 2})
+
+    changed = state.apply({"ison": True, "brightness": 40, "effect": 2, "mode": "color"})
+
+    assert changed == {"ison": True, "mode": "color"}
+    assert state.apply({"ison": True}) == {}
+
+
+@pytest.mark.parametrize("field, value, expected", [
+    ("brightness", 40.0, 40),
+    ("power", 3, 3.0),
+    ("ison", 1, True),
+    ("ison", 0, False),
+    ("online", "yes", "yes"),
+    ("brightness", True, True),
+    ("temp", None, None),
+])
+def test_values_are_coerced_only_when_safe(field, value, expected):
+    state = DeviceState({field: value})
+
+    assert state[field] == expected
+    assert type(state[field]) is type(expected)
+
+
+def test_fractional_values_are_not_truncated_into_int_fields():
+    state = DeviceState({"brightness": 57.9})
+
+    assert state["brightness"] == 57.9
+    assert state.apply({"brightness": 58.0}) == {"brightness": 58}
+    assert type(state["brightness"]) is int
+
+
+def test_coerced_values_compare_equal_to_the_stored_ones():
+    state = DeviceState({"brightness": 40})
+
+    assert state.apply({"brightness": 40.0}) == {}
+    assert state.apply({"power": 1}) == {"power": 1.0}
+
+
+def test_touch_sets_last_seen_without_reporting_a_change():
+    state = DeviceState({"ison": True})
+    state.touch(123.0)
+
+    assert state["last_seen"] == 123.0
+    assert state.apply({"ison": True}) == {}
+
+
+def test_serializes_like_a_plain_dict():
+    values = {"ison": True, "red": 255, "green": 0, "blue": 10, "effect": 2}
+    state = DeviceState(values)
+
+    assert state.as_dict() == values
+    assert json.loads(json.dumps({"status": state}, default=json_default)) == {"status": values}
+    assert repr(state) == f"DeviceState({values!r})"
+
+
+def test_known_fields_use_slots():
+    state = DeviceState({field: None for field in FIELDS})
+
+    assert not hasattr(state, "__dict__")
+    assert state.extra is None
+
+
+def test_discard_removes_fields_and_extra_keys():
+    state = DeviceState({"ison": True, "temp": 3000, "effect": 2})
+
+    assert state.discard("temp") and state.discard("effect")
+    assert not state.discard("temp") and not state.discard("unknown")
+    assert dict(state) == {"ison": True}
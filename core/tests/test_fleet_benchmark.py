@@ -0,0 +1,39 @@
+import asyncio
+import pytest
+from benchmarks import fleet
+from benchmarks.simulator import percentile, summarize
+from services.mqtt import mqtt_service
+
+
+def test_percentiles_and_summary():
+    samples = [0.004, 0.001, 0.003, 0.002]
+
+    assert percentile(samples, 0.5) == 0.003
+    assert percentile(samples, 0.99) == 0.004
+    assert summarize([]) == {"count": 0, "p50_ms": None, "p99_ms": None, "max_ms": None}
+    assert summarize(samples)["max_ms"] == pytest.approx(4.0)
+
+
+def test_commands_are_matched_with_the_next_publish():
+    submitted = {"a": [1.0, 2.0, 9.0], "b": [1.5]}
+    events = [("a", 1.25), ("a", 2.5), ("b", 1.75)]
+
+    # Comanda de la 9.0 n-a mai fost publicată, deci nu are latență.
+    assert fleet.command_latencies(submitted, events) == [0.25, 0.5, 0.25]
+
+
+def test_a_short_run_reports_every_section(monkeypatch):
+    # Benchmark-ul înlocuiește globalele din mqtt_service; monkeypatch le restaurează după test.
+    for name in ("publisher", "ingest", "state_machine", "connection_manager"):
+        monkeypatch.setattr(mqtt_service, name, getattr(mqtt_service, name))
+    args = fleet.parse_args(["--devices", "20", "--rate", "400", "--clients", "2", "--duration", "0.3",
+                             "--command-rate", "20", "--new-devices", "2"])
+
+    result = asyncio.run(fleet.run_benchmark(args))
+
+    assert result["config"]["devices"] == 20
+    assert result["ingest"]["received"] > 0
+    assert result["ingest"]["processed"] == result["ingest"]["received"]
+    assert result["broadcast"]["frames_per_client"] > 1
+    assert result["commands"]["submitted"] > 0
+    assert result["memory"]["bytes_per_device"] > 0
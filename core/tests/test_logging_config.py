@@ -0,0 +1,68 @@
+import logging
+import queue
+import pytest
+from config import logging_config
+from config.logging_config import DroppingQueueHandler, RateLimitedLogger, parse_levels, setup_logging, shutdown_logging
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr(logging_config.time, "monotonic", lambda: now[0])
+    return now
+
+
+def test_repeats_are_suppressed_and_counted(caplog, clock):
+    logger = RateLimitedLogger(logging.getLogger("tests.hot"), interval=10)
+
+    with caplog.at_level(logging.WARNING, logger="tests.hot"):
+        for index in range(5):
+            logger.warning("parse", "Bad payload on %s", f"light{index}")
+        logger.warning("drop", "Dropped a message")
+        clock[0] += 11
+        logger.warning("parse", "Bad payload on %s", "light9")
+
+    assert [record.getMessage() for record in caplog.records] == [
+        "Bad payload on light0",
+        "Dropped a message",
+        "Bad payload on light9 (4 similar messages suppressed)",
+    ]
+
+
+def test_disabled_level_costs_no_bookkeeping(caplog, clock):
+    logger = RateLimitedLogger(logging.getLogger("tests.quiet"), interval=10)
+
+    with caplog.at_level(logging.WARNING, logger="tests.quiet"):
+        logger.debug("parse", "Parsed %d", 1)
+
+    assert caplog.records == []
+    assert logger._last == {}
+
+
+def test_parse_levels_ignores_invalid_entries():
+    assert parse_levels("services.mqtt=debug, api = WARNING,broken,db=loud") == \
+        {"services.mqtt": logging.DEBUG, "api": logging.WARNING}
+
+
+def test_full_queue_drops_records():
+    handler = DroppingQueueHandler(queue.Queue(maxsize=1))
+    record = logging.LogRecord("tests", logging.INFO, __file__, 1, "message", None, None)
+
+    handler.enqueue(record)
+    handler.enqueue(record)
+
+    assert handler.dropped == 1
+
+
+def test_unknown_log_level_falls_back_to_info(capsys):
+    root = logging.getLogger()
+    handlers, level = root.handlers[:], root.level
+    try:
+        setup_logging(level="loud", levels="")
+        assert root.level == logging.INFO
+    finally:
+        shutdown_logging()
+        root.handlers[:] = handlers
+        root.setLevel(level)
+
+    assert "Unknown LOG_LEVEL 'loud', using INFO" in capsys.readouterr().err
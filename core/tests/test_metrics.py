@@ -0,0 +1,74 @@
+import math
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from api.routes import router
+from services.metrics.metrics import MetricsRegistry, metrics
+
+
+def test_prometheus_text_output():
+    registry = MetricsRegistry(prefix="test_")
+    requests = registry.counter("requests_total", "Requests", labelnames=("path",))
+    requests.labels("/a").inc()
+    requests.labels('/b"c').inc(2)
+    registry.gauge("queue_depth", "Depth").set(3)
+    registry.gauge_func("ratio", "Ratio", lambda: 0.5)
+
+    lines = registry.render_prometheus().splitlines()
+
+    assert lines[:4] == [
+        "# HELP test_requests_total Requests",
+        "# TYPE test_requests_total counter",
+        'test_requests_total{path="/a"} 1',
+        'test_requests_total{path="/b\\"c"} 2',
+    ]
+    assert "test_queue_depth 3" in lines
+    assert "test_ratio 0.5" in lines
+
+
+def test_histogram_buckets_are_cumulative():
+    registry = MetricsRegistry(prefix="test_")
+    latency = registry.histogram("latency_seconds", "Latency", buckets=(0.1, 1.0))
+    for value in (0.05, 0.5, 0.7, 3.0):
+        latency.observe(value)
+
+    lines = registry.render_prometheus().splitlines()
+
+    assert lines[2:] == [
+        'test_latency_seconds_bucket{le="0.1"} 1',
+        'test_latency_seconds_bucket{le="1.0"} 3',
+        'test_latency_seconds_bucket{le="+Inf"} 4',
+        "test_latency_seconds_sum 4.25",
+        "test_latency_seconds_count 4",
+    ]
+    assert registry.as_json()["latency_seconds"]["count"] == 4
+
+
+def test_failing_gauge_is_nan_in_text_and_null_in_json():
+    registry = MetricsRegistry(prefix="test_")
+
+    def broken():
+        raise RuntimeError("no data")
+
+    registry.gauge_func("broken", "Broken", broken)
+    registry.gauge("infinite", "Infinite").set(math.inf)
+
+    assert "test_broken NaN" in registry.render_prometheus().splitlines()
+    assert registry.as_json() == {"broken": None, "infinite": None}
+
+
+def test_family_registration_is_idempotent():
+    registry = MetricsRegistry(prefix="test_")
+
+    assert registry.counter("events_total", "Events") is registry.counter("events_total", "Events")
+
+
+def test_metrics_endpoints():
+    app = FastAPI()
+    app.include_router(router, prefix="/api")
+    client = TestClient(app)
+
+    text = client.get("/api/metrics")
+    assert text.status_code == 200
+    assert text.headers["content-type"].startswith("text/plain; version=0.0.4")
+    assert f"# TYPE {metrics.prefix}" in text.text
+    assert client.get("/api/metrics/json").json().keys() == metrics.as_json().keys()
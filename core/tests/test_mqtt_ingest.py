@@ -0,0 +1,93 @@
+import asyncio
+import threading
+from conftest import report
+from services.mqtt.ingest import MqttIngest
+
+
+class RecordingStateMachine:
+    def __init__(self, fail_first: bool = False):
+        self.batches = []
+        self.fail_first = fail_first
+
+    def handle_messages(self, messages):
+        self.batches.append(messages)
+        if self.fail_first and len(self.batches) == 1:
+            raise ValueError("bad batch")
+
+
+def encoded(*messages):
+    return [(topic, payload.encode()) for topic, payload in messages]
+
+
+def drain(ingest, submit):
+    """Pornește consumatorul, rulează submit() și așteaptă golirea cozii."""
+    async def scenario():
+        ingest.start()
+        submit()
+        while ingest.depth or ingest.processed < ingest.received - ingest.dropped:
+            await asyncio.sleep(0.001)
+        ingest.stop()
+
+    asyncio.run(scenario())
+
+
+def test_messages_are_applied_in_batches():
+    state_machine = RecordingStateMachine()
+    ingest = MqttIngest(state_machine, max_queue=100, batch_size=4)
+    messages = encoded(*(report(f"light{index}", brightness=index) for index in range(10)))
+
+    drain(ingest, lambda: [ingest.submit(topic, payload) for topic, payload in messages])
+
+    assert [len(batch) for batch in state_machine.batches] == [4, 4, 2]
+    assert state_machine.batches[0][0] == report("light0", brightness=0)
+    assert ingest.get_stats()["batches"] == 3
+
+
+def test_overflow_drops_the_oldest_messages():
+    state_machine = RecordingStateMachine()
+    ingest = MqttIngest(state_machine, max_queue=3, batch_size=10)
+    # Fără buclă pornită mesajele doar se acumulează, ca atunci când consumatorul rămâne în urmă.
+    for index in range(5):
+        ingest.submit(f"shellies/light{index}/online", b"true")
+
+    assert ingest.depth == 3
+    stats = ingest.get_stats()
+    assert (stats["received"], stats["dropped"], stats["capacity"]) == (5, 2, 3)
+    assert [topic for topic, _ in ingest.queue] == [f"shellies/light{index}/online" for index in (2, 3, 4)]
+
+
+def test_submit_from_the_network_thread_wakes_the_loop():
+    state_machine = RecordingStateMachine()
+    ingest = MqttIngest(state_machine)
+
+    def submit():
+        thread = threading.Thread(target=ingest.submit, args=("shellies/light1/online", b"\xfftrue"))
+        thread.start()
+        thread.join()
+
+    drain(ingest, submit)
+
+    # Octeții invalizi se înlocuiesc la decodare, nu opresc ingestia.
+    assert state_machine.batches == [[("shellies/light1/online", "�true")]]
+
+
+def test_a_failing_batch_does_not_stop_ingest():
+    state_machine = RecordingStateMachine(fail_first=True)
+    ingest = MqttIngest(state_machine, batch_size=1)
+    messages = encoded(report("light1", ison=True), report("light2", ison=True))
+
+    drain(ingest, lambda: [ingest.submit(topic, payload) for topic, payload in messages])
+
+    assert len(state_machine.batches) == 2
+    assert ingest.processed == 2
+
+
+def test_one_batch_is_one_notification(state_machine, monkeypatch):
+    notifications = []
+    monkeypatch.setattr(state_machine, "_notify_changed", lambda: notifications.append(1))
+
+    state_machine.handle_messages([report("light1", ison=True), report("light2", ison=True),
+                                   ("shellies/light3/color/0/status", "not json"), report("light3", brightness=1)])
+
+    assert notifications == [1]
+    assert state_machine.devices["light3"]["status"]["brightness"] == 1
@@ -0,0 +1,86 @@
+import asyncio
+import json
+from types import SimpleNamespace
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from api.routes import router
+from conftest import report
+
+
+def announce(state_machine, *device_ids):
+    state_machine.handle_messages([("shellies/announce", json.dumps({"id": device_id, "model": "SHCB-1"}))
+                                   for device_id in device_ids])
+
+
+def entity(device_id: str, room_id=None):
+    return SimpleNamespace(id=device_id, name=device_id, type="light", manufacturer="shelly", model="SHCB-1",
+                           status='{"ison": false}', config=None, lastUpdated=None, roomId=room_id)
+
+
+def count_queries(fake_db, monkeypatch):
+    queries = []
+    find_many = fake_db.entity.find_many
+
+    async def counting(*args, **kwargs):
+        queries.append(kwargs.get("where"))
+        return await find_many(*args, **kwargs)
+
+    monkeypatch.setattr(fake_db.entity, "find_many", counting)
+    return queries
+
+
+def test_adopt_devices_uses_one_query(state_machine, fake_db, monkeypatch):
+    queries = count_queries(fake_db, monkeypatch)
+    announce(state_machine, "light7", "light8", "light9")
+    fake_db.entity.rows = [entity("light7", room_id=1), entity("light8")]
+    since = state_machine.version
+
+    assert asyncio.run(state_machine.adopt_devices(["light7", "light8", "light9"])) == 2
+
+    assert queries == [{"id": {"in": ["light7", "light8", "light9"]}}]
+    assert set(state_machine.new_devices) == {"light9"}
+    assert state_machine.devices["light7"]["status"] == {"ison": False}
+    assert state_machine.room_index.room_entity_ids(1) == ["light1", "light2", "light7"]
+    assert state_machine.get_changes_since(since)["adopted"] == ["light7", "light8"]
+
+
+def test_adopted_devices_are_not_promoted_twice(state_machine, fake_db):
+    fake_db.entity.rows = [entity("light1")]
+
+    assert asyncio.run(state_machine.adopt_devices(["light1"])) == 0
+    assert asyncio.run(state_machine.adopt_devices([])) == 0
+
+
+def test_reconcile_runs_only_when_the_pending_set_changes(state_machine, fake_db, monkeypatch):
+    queries = count_queries(fake_db, monkeypatch)
+
+    async def scenario():
+        task = asyncio.create_task(state_machine.process_new_devices())
+        await asyncio.sleep(0.01)
+        announce(state_machine, "light8", "light9")
+        await asyncio.sleep(0.01)
+        # Mesajele de status nu schimbă lista dispozitivelor noi, deci nu declanșează interogări.
+        for brightness in range(5):
+            state_machine.handle_messages([report("light1", brightness=brightness)])
+            await asyncio.sleep(0.01)
+        task.cancel()
+
+    asyncio.run(scenario())
+
+    assert queries == [{"id": {"in": ["light8", "light9"]}}]
+
+
+def test_add_endpoint_promotes_the_device_immediately(state_machine, fake_db):
+    app = FastAPI()
+    app.state.state_machine = state_machine
+    app.include_router(router, prefix="/api")
+    announce(state_machine, "light9")
+    # Rândul creat de add_device_to_db, așa cum l-ar citi adopt_devices.
+    fake_db.entity.rows = [entity("light9")]
+
+    response = TestClient(app).post("/api/devices/add", json={"id": "light9", "model": "SHCB-1", "manufacturer": "shelly"})
+
+    assert response.status_code == 200
+    assert [operation for _, operation, _ in fake_db.batches[0]] == ["create"]
+    assert "light9" in state_machine.devices
+    assert state_machine.new_devices == {}
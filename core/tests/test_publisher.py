@@ -0,0 +1,98 @@
+import asyncio
+import threading
+from types import SimpleNamespace
+import paho.mqtt.client as mqtt
+from services.mqtt.publisher import MqttPublisher
+
+
+class FakeClient:
+    """Clientul paho: dă message id-uri consecutive; early_ack confirmă chiar din publish()."""
+
+    def __init__(self, early_ack: bool = False, fail_topics=()):
+        self.publisher = None
+        self.early_ack = early_ack
+        self.fail_topics = set(fail_topics)
+        self.published = []
+        self.next_mid = 1
+
+    def publish(self, topic, payload, qos=0):
+        if topic in self.fail_topics:
+            return SimpleNamespace(mid=0, rc=mqtt.MQTT_ERR_NO_CONN)
+        mid, self.next_mid = self.next_mid, self.next_mid + 1
+        self.published.append((mid, topic, payload, qos))
+        if self.early_ack:
+            # PUBACK-ul ajunge înainte ca publish_many să înregistreze mid-ul.
+            self.publisher.on_publish(self, None, mid)
+        return SimpleNamespace(mid=mid, rc=mqtt.MQTT_ERR_SUCCESS)
+
+
+def publisher_for(client, **kwargs):
+    client.publisher = MqttPublisher(client, **kwargs)
+    return client.publisher
+
+
+def commands(*device_ids):
+    return [(device_id, f"shellies/{device_id}/color/0/command", "on") for device_id in device_ids]
+
+
+def test_pubacks_are_matched_by_message_id():
+    client = FakeClient()
+    publisher = publisher_for(client, qos=1, timeout=5)
+
+    async def scenario():
+        task = asyncio.create_task(publisher.publish_many(commands("light1", "light2", "light3")))
+        while len(client.published) < 3 or len(publisher._pending) < 3:
+            await asyncio.sleep(0.001)
+        # Confirmările vin de pe thread-ul de rețea, în altă ordine decât publicarea.
+        acks = [threading.Thread(target=publisher.on_publish, args=(client, None, mid)) for mid in (3, 1, 2)]
+        for thread in acks:
+            thread.start()
+        for thread in acks:
+            thread.join()
+        return await task
+
+    assert asyncio.run(scenario()) == {"light1": True, "light2": True, "light3": True}
+    assert publisher._pending == {}
+
+
+def test_an_ack_before_registration_is_not_lost():
+    client = FakeClient(early_ack=True)
+    publisher = publisher_for(client, qos=1, timeout=0.05)
+
+    results = asyncio.run(publisher.publish_many(commands("light1", "light2")))
+
+    assert results == {"light1": True, "light2": True}
+    assert publisher._early_acks == {}
+
+
+def test_timeout_and_publish_errors_fail_per_device():
+    client = FakeClient(fail_topics={"shellies/plug1/color/0/command"})
+    publisher = publisher_for(client, qos=1, timeout=0.02)
+
+    async def scenario():
+        task = asyncio.create_task(publisher.publish_many(commands("light1", "light2", "plug1")))
+        while len(publisher._pending) < 2:
+            await asyncio.sleep(0.001)
+        publisher.on_publish(client, None, 1)
+        return await task
+
+    assert asyncio.run(scenario()) == {"light1": True, "light2": False, "plug1": False}
+    assert publisher._pending == {}
+
+
+def test_a_device_succeeds_only_if_all_its_messages_are_acked():
+    client = FakeClient(fail_topics={"shellies/light1/color/0/set"})
+    publisher = publisher_for(client, qos=1, timeout=0.05)
+    client.early_ack = True
+    messages = commands("light1") + [("light1", "shellies/light1/color/0/set", "{}")]
+
+    assert asyncio.run(publisher.publish_many(messages)) == {"light1": False}
+
+
+def test_qos0_does_not_wait_for_acks():
+    client = FakeClient()
+    publisher = publisher_for(client, qos=0, timeout=5)
+
+    assert asyncio.run(publisher.publish_many(commands("light1", "light2"))) == {"light1": True, "light2": True}
+    assert [qos for _, _, _, qos in client.published] == [0, 0]
+    assert asyncio.run(publisher.publish_many([])) == {}
@@ -0,0 +1,77 @@
+import asyncio
+import json
+from types import SimpleNamespace
+from database.repository import EntityRepository, entity_data_from_announce
+from integration.shelly import device_manager
+from services.state_machine.device_state_machine import DeviceStateMachine
+
+
+def entity(device_id: str, status=None, device_type: str = "light"):
+    return SimpleNamespace(id=device_id, name=device_id, type=device_type, manufacturer="shelly", model="SHCB-1",
+                           status=json.dumps(status) if status is not None else None, config=None, lastUpdated=None)
+
+
+def operations(fake_db):
+    return [[(table, operation) for table, operation, _ in batch] for batch in fake_db.batches]
+
+
+def test_the_shared_client_is_connected_on_demand(fake_db):
+    asyncio.run(EntityRepository().find_many())
+
+    assert fake_db.is_connected()
+
+
+def test_create_many_is_one_batch(fake_db):
+    rows = [entity_data_from_announce({"id": f"light{index}", "model": "SHCB-1", "manufacturer": "shelly"})
+            for index in range(3)]
+
+    assert asyncio.run(device_manager.add_devices_to_db([{"id": "plug1", "model": "SHPLG-S", "manufacturer": "shelly"}])) == 1
+    assert asyncio.run(EntityRepository().create_many(rows)) == 3
+    assert asyncio.run(EntityRepository().create_many([])) == 0
+
+    assert operations(fake_db) == [[("entity", "create")], [("entity", "create")] * 3]
+    plug = fake_db.batches[0][0][2]["data"]
+    assert (plug["type"], plug["status"]) == ("outlet", json.dumps({"ison": False}))
+    assert rows[0]["type"] == "light"
+
+
+def test_set_statuses_is_one_batch(fake_db):
+    updated = asyncio.run(EntityRepository().set_statuses({"light1": ({"ison": True}, None),
+                                                           "light2": ({"ison": False}, None)}))
+
+    assert updated == 2
+    [batch] = fake_db.batches
+    assert [(kwargs["where"]["id"], json.loads(kwargs["data"]["status"])) for _, _, kwargs in batch] == \
+        [("light1", {"ison": True}), ("light2", {"ison": False})]
+
+
+def test_merge_statuses_reads_once_and_reports_missing_ids(fake_db):
+    fake_db.entity.rows = [entity("light1", {"ison": False, "brightness": 10}), entity("light2")]
+
+    missing = asyncio.run(device_manager.update_device_statuses({
+        "light1": {"ison": True}, "light2": {"brightness": 5}, "light9": {"ison": True},
+    }))
+
+    assert missing == ["light9"]
+    [batch] = fake_db.batches
+    merged = {kwargs["where"]["id"]: json.loads(kwargs["data"]["status"]) for _, _, kwargs in batch}
+    assert merged == {"light1": {"ison": True, "brightness": 10}, "light2": {"brightness": 5}}
+
+
+def test_find_many_filters(fake_db):
+    fake_db.entity.rows = [entity("light1"), entity("plug1", device_type="outlet")]
+
+    lights = asyncio.run(device_manager.load_devices(device_type="light"))
+
+    assert [row.id for row in lights] == ["light1"]
+    assert asyncio.run(EntityRepository().find_many_by_ids([])) == []
+
+
+def test_initialize_cache_reads_the_repository(fake_db):
+    fake_db.entity.rows = [entity("light1", {"ison": True}), entity("plug1", device_type="outlet")]
+    sm = DeviceStateMachine()
+
+    asyncio.run(sm.initialize_cache())
+
+    assert sm.devices["light1"]["status"] == {"ison": True}
+    assert sm.devices["plug1"]["status"] == {}
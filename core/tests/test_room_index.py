@@ -0,0 +1,79 @@
+import asyncio
+from types import SimpleNamespace
+from conftest import FakeWebSocket, report, room
+from services.websocket.websocket_service import WebSocketManager
+
+
+def entity_ids(state_machine, room_id):
+    return state_machine.room_index.room_entity_ids(room_id)
+
+
+def test_room_entries_reference_the_live_status(state_machine):
+    state_machine.handle_messages([report("light2", brightness=90)])
+
+    [_, light2] = state_machine.rooms[1]["entities"]
+    assert light2["status"]["brightness"] == 90
+    assert light2["status"] is state_machine.devices["light2"]["status"]
+
+
+def test_get_all_data_does_not_query_the_database(state_machine, fake_db, monkeypatch):
+    async def unavailable(*args, **kwargs):
+        raise AssertionError("rooms must come from the index")
+
+    monkeypatch.setattr(fake_db.room, "find_many", unavailable)
+    manager = WebSocketManager(state_machine)
+    clients = [FakeWebSocket() for _ in range(5)]
+
+    async def scenario():
+        for websocket in clients:
+            await manager.send_all_data(websocket)
+
+    asyncio.run(scenario())
+
+    for websocket in clients:
+        [message] = websocket.sent
+        assert message["status"] == "success"
+        assert message["data"]["rooms"]["1"]["name"] == "Living"
+
+
+def test_set_room_moves_entities_from_other_rooms(state_machine):
+    version = state_machine.rooms_version
+    with state_machine.lock:
+        state_machine.room_index.set_room(room(2, "Office", ["plug1", "light2"]), state_machine.devices)
+
+    assert entity_ids(state_machine, 1) == ["light1"]
+    assert entity_ids(state_machine, 2) == ["plug1", "light2"]
+    assert state_machine.room_index.entity_rooms["light2"] == 2
+    assert state_machine.rooms_version == version + 1
+
+
+def test_assign_and_remove(state_machine):
+    with state_machine.lock:
+        state_machine.room_index.assign_entity(SimpleNamespace(id="light1", roomId=None), state_machine.devices)
+        state_machine.room_index.remove_room(2)
+
+    assert entity_ids(state_machine, 1) == ["light2"]
+    assert entity_ids(state_machine, 2) is None
+    assert "plug1" not in state_machine.room_index.entity_rooms
+
+
+def test_refresh_room_reads_one_room(state_machine, fake_db):
+    fake_db.room.rows = [room(3, "Hall", ["light3"])]
+
+    asyncio.run(state_machine.refresh_room(3))
+    asyncio.run(state_machine.refresh_room(2))
+
+    assert entity_ids(state_machine, 3) == ["light3"]
+    assert state_machine.rooms[3]["entities"][0]["status"] is state_machine.devices["light3"]["status"]
+    # Camera 2 nu mai există în baza de date.
+    assert 2 not in state_machine.rooms
+
+
+def test_unknown_entities_keep_their_persisted_status(state_machine):
+    ghost = room(4, "Attic", [])
+    ghost.entities.append(SimpleNamespace(id="ghost", name="ghost", type="light", manufacturer="shelly", model="SHCB-1",
+                                          status='{"ison": true}', config=None, lastUpdated=None, roomId=4))
+    with state_machine.lock:
+        state_machine.room_index.set_room(ghost, state_machine.devices)
+
+    assert state_machine.rooms[4]["entities"][0]["status"] == {"ison": True}
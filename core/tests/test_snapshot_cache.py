@@ -0,0 +1,85 @@
+import asyncio
+import json
+from conftest import FakeWebSocket, report
+from services.websocket.snapshot_cache import SnapshotCache
+from services.websocket.wire_format import JSON, encode_message
+from services.websocket.websocket_service import WebSocketManager
+
+
+def test_snapshot_is_built_once_per_version():
+    cache = SnapshotCache()
+    builds = []
+
+    async def build():
+        builds.append(1)
+        return {"version": len(builds)}
+
+    async def scenario():
+        first = await cache.get("devices", 1, build)
+        again = await cache.get("devices", 1, build)
+        newer = await cache.get("devices", 2, build)
+        return first, again, newer
+
+    first, again, newer = asyncio.run(scenario())
+
+    assert len(builds) == 2
+    assert again[1] is first[1]
+    assert json.loads(newer[1].encode(JSON)) == {"version": 2}
+
+
+def test_invalidate_forces_a_rebuild():
+    cache = SnapshotCache()
+    builds = []
+
+    async def build():
+        builds.append(1)
+        return {}
+
+    async def scenario():
+        await cache.get("devices", 1, build)
+        cache.invalidate("devices")
+        await cache.get("devices", 1, build)
+
+    asyncio.run(scenario())
+
+    assert len(builds) == 2
+
+
+def test_encode_message_matches_send_json():
+    assert json.loads(encode_message({"name": "Bucătărie", "ids": [1, 2]})) == {"name": "Bucătărie", "ids": [1, 2]}
+    assert "ă" in encode_message({"name": "ă"})
+
+
+def test_broadcast_frame_is_shared_by_every_client(state_machine):
+    manager = WebSocketManager(state_machine)
+    clients = [FakeWebSocket() for _ in range(3)]
+
+    async def scenario():
+        for websocket in clients:
+            await manager.connect(websocket)
+        manager._send_to_all({"tag": "delta", "since": 0, "version": 1, "changes": {}})
+        await asyncio.sleep(0.01)
+        for connection in list(manager.active_connections.values()):
+            connection.close()
+
+    asyncio.run(scenario())
+
+    # Același obiect text pentru toți clienții: snapshot-ul și delta-ul se codifică o singură dată.
+    for index in range(2):
+        assert len({id(websocket.frames[index]) for websocket in clients}) == 1
+
+
+def test_snapshot_is_reencoded_only_after_a_change(state_machine):
+    manager = WebSocketManager(state_machine)
+
+    async def scenario():
+        first = await manager.get_devices_snapshot()
+        again = await manager.get_devices_snapshot()
+        state_machine.handle_messages([report("light1", ison=True)])
+        changed = await manager.get_devices_snapshot()
+        return first, again, changed
+
+    first, again, changed = asyncio.run(scenario())
+
+    assert again[1] is first[1]
+    assert json.loads(changed[1].encode(JSON))["devices"]["light1"]["status"]["ison"] is True
@@ -0,0 +1,135 @@
+import asyncio
+import json
+import pytest
+from conftest import FakeWebSocket, report
+from integration.device_state import DeviceState
+from services.state_machine import device_state_machine
+from services.state_machine.device_state_machine import DeviceStateMachine
+from services.websocket.websocket_service import WebSocketManager
+
+
+def current_statuses(state_machine):
+    # last_seen se actualizează la fiecare mesaj, fără să apară în delte.
+    return {
+        device_id: {key: value for key, value in record["status"].items() if key != "last_seen"}
+        for device_id, record in state_machine.devices.items()
+    }
+
+
+def test_changes_are_merged_per_device(state_machine):
+    since = state_machine.version
+    state_machine.handle_messages([report("light1", ison=True), report("light1", brightness=80), report("light2", ison=True)])
+
+    delta = state_machine.get_changes_since(since)
+
+    assert delta["tag"] == "delta"
+    assert delta["since"] == since
+    assert delta["version"] == state_machine.version
+    assert delta["changes"]["light1"]["status"] == {"ison": True, "brightness": 80}
+    assert delta["changes"]["light2"]["status"] == {"ison": True}
+    assert "light3" not in delta["changes"]
+    assert since < delta["changes"]["light1"]["version"] < delta["changes"]["light2"]["version"] == delta["version"]
+
+
+def test_unchanged_values_are_not_recorded(state_machine):
+    since = state_machine.version
+    state_machine.handle_messages([report("light1", ison=False, brightness=10)])
+
+    assert state_machine.version == since
+    assert state_machine.get_changes_since(since)["changes"] == {}
+
+
+def test_changes_since_latest_version_is_empty(state_machine):
+    state_machine.handle_messages([report("light1", ison=True)])
+    delta = state_machine.get_changes_since(state_machine.version)
+
+    assert delta["changes"] == {}
+    assert state_machine.get_changes_since(-1) is None
+
+
+def test_only_changes_after_since_are_returned(state_machine):
+    state_machine.handle_messages([report("light1", ison=True)])
+    middle = state_machine.version
+    state_machine.handle_messages([report("light2", brightness=55)])
+
+    assert list(state_machine.get_changes_since(middle)["changes"]) == ["light2"]
+
+
+def test_evicted_log_requires_a_snapshot(monkeypatch):
+    monkeypatch.setattr(device_state_machine, "CHANGE_LOG_SIZE", 3)
+    sm = DeviceStateMachine()
+    sm.devices["light1"] = {"id": "light1", "name": "light1", "type": "light", "status": DeviceState({"brightness": 0})}
+    for brightness in range(1, 6):
+        sm.handle_messages([report("light1", brightness=brightness)])
+
+    assert sm.get_changes_since(0) is None
+    recent = sm.get_changes_since(sm.version - 1)
+    assert recent["changes"]["light1"]["status"] == {"brightness": 5}
+
+
+def test_snapshot_version_matches_the_deltas(state_machine):
+    state_machine.handle_messages([report("light3", brightness=1)])
+    snapshot = asyncio.run(state_machine.get_all_devices())
+
+    assert snapshot["devices"]["light3"]["status"]["brightness"] == 1
+    assert state_machine.get_changes_since(snapshot["version"])["changes"] == {}
+
+
+def test_announced_device_is_reported_as_new(state_machine):
+    since = state_machine.version
+    state_machine.handle_messages([("shellies/announce", json.dumps({"id": "light9", "model": "SHCB-1"}))])
+
+    delta = state_machine.get_changes_since(since)
+
+    assert delta["new_devices"]["light9"]["type"] == "SHCB-1"
+    assert delta["changes"] == {}
+
+
+@pytest.mark.parametrize("batches", [1, 3])
+def test_delta_replays_onto_an_old_snapshot(state_machine, batches):
+    client = current_statuses(state_machine)
+    since = state_machine.version
+    messages = [report("light1", ison=True), report("plug1", ison=False), report("light1", ison=False, brightness=3)]
+    size = len(messages) // batches
+    for start in range(0, len(messages), size):
+        state_machine.handle_messages(messages[start:start + size])
+
+    for device_id, change in state_machine.get_changes_since(since)["changes"].items():
+        client[device_id].update(change.get("status", {}))
+
+    assert client == current_statuses(state_machine)
+
+
+def test_broadcast_pushes_only_the_delta(state_machine):
+    manager = WebSocketManager(state_machine)
+    websocket = FakeWebSocket()
+
+    async def scenario():
+        await manager.connect(websocket)
+        task = asyncio.create_task(manager.broadcast_status())
+        await asyncio.sleep(0)
+        state_machine.handle_messages([report("light2", brightness=21)])
+        while len(websocket.sent) < 2:
+            await asyncio.sleep(0.01)
+        task.cancel()
+
+    asyncio.run(scenario())
+
+    snapshot, message = websocket.sent
+    assert "devices" in snapshot
+    assert message["tag"] == "delta"
+    assert message["changes"] == {"light2": {"status": {"brightness": 21}, "version": state_machine.version}}
+
+
+def test_sync_falls_back_to_a_snapshot(state_machine):
+    manager = WebSocketManager(state_machine)
+    websocket = FakeWebSocket()
+    state_machine.handle_messages([report("light1", ison=True)])
+
+    delta = asyncio.run(manager.handle_sync(websocket, {"command": "sync", "since": 0}))
+    assert asyncio.run(manager.handle_sync(websocket, {"command": "sync"})) is None
+
+    assert delta["changes"]["light1"]["status"] == {"ison": True}
+    [snapshot] = websocket.sent
+    assert snapshot["version"] >= state_machine.version
+    assert snapshot["devices"]["light1"]["status"]["ison"] is True
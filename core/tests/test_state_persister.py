@@ -0,0 +1,130 @@
+import asyncio
+import json
+import pytest
+from conftest import report
+from services.persistence.state_persister import StatePersister
+
+
+def written(fake_db):
+    """device_id -> statusul scris, din toate batch-urile înregistrate."""
+    return {
+        kwargs["where"]["id"]: json.loads(kwargs["data"]["status"])
+        for batch in fake_db.batches
+        for table, operation, kwargs in batch
+        if table == "entity" and operation == "update_many"
+    }
+
+
+def test_flush_writes_changed_devices_in_one_batch(state_machine, fake_db):
+    persister = StatePersister(state_machine)
+    state_machine.handle_messages([report("light1", ison=True), report("plug1", power=9.5)])
+
+    assert asyncio.run(persister.flush()) == 2
+    assert len(fake_db.batches) == 1
+    rows = written(fake_db)
+    assert rows["light1"]["ison"] is True
+    assert rows["plug1"]["power"] == 9.5
+    assert state_machine.dirty_count() == 0
+    assert asyncio.run(persister.flush()) == 0
+
+
+def test_unchanged_reports_are_not_persisted(state_machine, fake_db):
+    persister = StatePersister(state_machine)
+    state_machine.handle_messages([report("light1", ison=False)])
+
+    assert asyncio.run(persister.flush()) == 0
+    assert fake_db.batches == []
+
+
+def test_failed_flush_keeps_devices_dirty(state_machine, fake_db):
+    persister = StatePersister(state_machine)
+    state_machine.handle_messages([report("light1", ison=True)])
+    fake_db.fail = True
+
+    with pytest.raises(RuntimeError):
+        asyncio.run(persister.flush())
+    assert state_machine.dirty_count() == 1
+
+    fake_db.fail = False
+    assert asyncio.run(persister.flush()) == 1
+    assert written(fake_db)["light1"]["ison"] is True
+
+
+def test_run_flushes_when_the_threshold_is_reached(state_machine, fake_db):
+    persister = StatePersister(state_machine, interval=60, threshold=2)
+
+    async def scenario():
+        task = asyncio.create_task(persister.run())
+        await asyncio.sleep(0)
+        state_machine.handle_messages([report("light1", ison=True)])
+        await asyncio.sleep(0.05)
+        assert fake_db.batches == []
+        state_machine.handle_messages([report("light2", ison=True)])
+        for _ in range(100):
+            if fake_db.batches:
+                break
+            await asyncio.sleep(0.01)
+        task.cancel()
+
+    asyncio.run(scenario())
+    assert set(written(fake_db)) == {"light1", "light2"}
+    assert persister.flushes == 1
+
+
+def test_run_flushes_on_the_interval(state_machine, fake_db):
+    persister = StatePersister(state_machine, interval=0.05, threshold=100)
+
+    async def scenario():
+        task = asyncio.create_task(persister.run())
+        await asyncio.sleep(0)
+        state_machine.handle_messages([report("light3", brightness=1)])
+        await asyncio.sleep(0.2)
+        task.cancel()
+
+    asyncio.run(scenario())
+    rows = written(fake_db)
+    assert list(rows) == ["light3"]
+    assert rows["light3"]["brightness"] == 1
+
+
+def test_optimistic_state_is_not_persisted(state_machine, fake_db):
+    persister = StatePersister(state_machine)
+    state_machine.command_tracker.track(["light1"], "turn_on", {"ison": True})
+
+    assert state_machine.dirty_count() == 0
+
+    # Un raport al altui câmp persistă valoarea raportată, nu pe cea optimistă.
+    state_machine.handle_messages([report("light1", brightness=70)])
+    asyncio.run(persister.flush())
+    assert written(fake_db)["light1"]["ison"] is False
+    assert written(fake_db)["light1"]["brightness"] == 70
+    assert state_machine.devices["light1"]["status"]["ison"] is True
+
+    # Confirmarea nu schimbă starea din memorie, dar marchează valoarea ca raportată.
+    state_machine.handle_messages([report("light1", ison=True)])
+    asyncio.run(persister.flush())
+    assert written(fake_db)["light1"]["ison"] is True
+
+
+def test_rollback_is_not_persisted(state_machine):
+    state_machine.command_tracker.track(["light2"], "turn_on", {"ison": True})
+    state_machine.command_tracker.reject({"light2": ["ison"]})
+
+    assert state_machine.devices["light2"]["status"]["ison"] is False
+    assert state_machine.dirty_count() == 0
+
+
+def test_expired_field_the_device_never_reported_is_not_persisted(state_machine, fake_db):
+    persister = StatePersister(state_machine)
+    tracker = state_machine.command_tracker
+    tracker.timeout = 0
+    tracker.track(["light1"], "set_white_temperature", {"temp": 3000})
+
+    assert tracker.expire() == 1
+    state_machine.handle_messages([report("light1", brightness=70)])
+    asyncio.run(persister.flush())
+
+    row = written(fake_db)["light1"]
+    assert row["brightness"] == 70
+    assert "temp" not in row
+    assert "temp" not in state_machine.devices["light1"]["status"]
@@ -0,0 +1,114 @@
+import asyncio
+import threading
+from conftest import report
+from integration.device_state import DeviceState
+from services.state_machine.device_state_machine import DeviceStateMachine
+
+
+def machine(count: int, shards: int = 4) -> DeviceStateMachine:
+    sm = DeviceStateMachine(shards=shards)
+    for index in range(count):
+        device_id = f"light{index}"
+        with sm.shard(device_id).lock:
+            sm.devices[device_id] = {"id": device_id, "name": device_id, "type": "light",
+                                     "status": DeviceState({"brightness": 0})}
+    sm.publish_snapshots()
+    return sm
+
+
+def test_devices_are_spread_over_the_shards():
+    sm = machine(32)
+
+    assert len(sm.devices) == 32
+    assert sorted(sm.devices, key=lambda device_id: int(device_id[5:])) == [f"light{index}" for index in range(32)]
+    assert sum(1 for shard in sm.shards if shard.devices) > 1
+    for device_id in sm.devices:
+        assert device_id in sm.shard(device_id).devices
+
+
+def test_delta_merges_all_shards():
+    sm = machine(8)
+    since = sm.version
+    sm.handle_messages([report(f"light{index}", brightness=index + 1) for index in range(8)])
+
+    delta = sm.get_changes_since(since)
+
+    assert {device_id: change["status"] for device_id, change in delta["changes"].items()} == \
+        {f"light{index}": {"brightness": index + 1} for index in range(8)}
+    versions = [delta["changes"][f"light{index}"]["version"] for index in range(8)]
+    assert len(set(versions)) == 8
+    assert since < min(versions) and max(versions) == delta["version"] == sm.version
+
+
+def test_dirty_devices_are_collected_from_every_shard():
+    sm = machine(8)
+    sm.handle_messages([report(f"light{index}", brightness=50) for index in range(8)])
+
+    assert sm.dirty_count() == 8
+    assert set(sm.take_dirty_devices()) == {f"light{index}" for index in range(8)}
+    assert sm.dirty_count() == 0
+
+
+def test_concurrent_ingestion_keeps_per_device_order():
+    sm = machine(16)
+    since = sm.version
+
+    def ingest(offset: int):
+        # Fiecare thread scrie dispozitive proprii, în ordine crescătoare.
+        for brightness in range(1, 51):
+            sm.handle_messages([report(f"light{index}", brightness=brightness) for index in range(offset, 16, 4)])
+
+    threads = [threading.Thread(target=ingest, args=(offset,)) for offset in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    delta = sm.get_changes_since(since)
+    assert all(sm.devices[f"light{index}"]["status"]["brightness"] == 50 for index in range(16))
+    assert {device_id: change["status"] for device_id, change in delta["changes"].items()} == \
+        {f"light{index}": {"brightness": 50} for index in range(16)}
+    assert sm.get_changes_since(delta["version"])["changes"] == {}
+
+
+def snapshot_of(sm):
+    return asyncio.run(sm.get_all_devices())
+
+
+def test_snapshot_rebuilds_only_touched_records():
+    sm = machine(8)
+    before = snapshot_of(sm)["devices"]
+
+    sm.handle_messages([report("light3", brightness=7)])
+    after = snapshot_of(sm)["devices"]
+
+    assert before["light3"]["status"] == {"brightness": 0}
+    assert after["light3"]["status"]["brightness"] == 7
+    assert all(after[device_id] is before[device_id] for device_id in before if device_id != "light3")
+
+
+def test_snapshot_version_stops_before_a_write_in_progress():
+    sm = machine(8)
+    sm.handle_messages([report("light1", brightness=5)])
+    shard = sm.shard("light2")
+
+    with shard.lock:
+        # Ca în mutating(): versiunea de dinaintea modificării, apoi modificarea nepublicată.
+        shard.writing = sm.version
+        sm._apply_status("light2", {"brightness": 9}, 0.0)
+        snapshot = snapshot_of(sm)
+        shard.writing = None
+
+    assert snapshot["version"] < sm.version
+    assert snapshot["devices"]["light2"]["status"] == {"brightness": 0}
+    assert sm.get_changes_since(snapshot["version"])["changes"]["light2"]["status"] == {"brightness": 9}
+
+
+def test_rollback_is_published(state_machine):
+    tracker = state_machine.command_tracker
+    tracker.track(["light1"], "set_white_temperature", {"mode": "white", "temp": 3000})
+    assert snapshot_of(state_machine)["devices"]["light1"]["status"]["temp"] == 3000
+
+    tracker.reject({"light1": ["mode", "temp"]})
+
+    assert snapshot_of(state_machine)["devices"]["light1"]["status"] == {"ison": False, "brightness": 10}
@@ -0,0 +1,127 @@
+import pytest
+from conftest import report
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from api import state_views
+from api.routes import router
+from api.state_views import ResponseCache, decode_cursor, encode_cursor, etag_matches, make_etag, parse_fields, project
+
+
+@pytest.fixture
+def client(state_machine, monkeypatch):
+    monkeypatch.setattr(state_views, "response_cache", ResponseCache())
+    app = FastAPI()
+    app.state.state_machine = state_machine
+    app.include_router(router, prefix="/api")
+    return TestClient(app)
+
+
+def test_unchanged_devices_return_304(client):
+    first = client.get("/api/devices")
+    etag = first.headers["etag"]
+
+    again = client.get("/api/devices", headers={"If-None-Match": etag})
+
+    assert first.status_code == 200
+    assert first.json()["total"] == 4
+    assert again.status_code == 304
+    assert again.content == b""
+    assert again.headers["etag"] == etag
+
+
+def test_a_change_invalidates_the_etag(client, state_machine):
+    etag = client.get("/api/devices").headers["etag"]
+    device_etag = client.get("/api/devices/plug1").headers["etag"]
+
+    state_machine.handle_messages([report("light1", ison=True)])
+
+    response = client.get("/api/devices", headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.headers["etag"] != etag
+    assert next(device for device in response.json()["devices"] if device["id"] == "light1")["status"]["ison"] is True
+    # ETag-ul unui dispozitiv depinde doar de partiția lui.
+    plug = client.get("/api/devices/plug1", headers={"If-None-Match": device_etag})
+    same_shard = state_machine.shard("plug1") is state_machine.shard("light1")
+    assert plug.status_code == (200 if same_shard else 304)
+
+
+def test_etag_depends_on_the_query(client):
+    plain = client.get("/api/devices").headers["etag"]
+    projected = client.get("/api/devices", params={"fields": "id"}).headers["etag"]
+
+    assert plain != projected
+    assert client.get("/api/devices", params={"fields": "id"}, headers={"If-None-Match": plain}).status_code == 200
+
+
+def test_etags_change_across_restarts(monkeypatch):
+    etag = make_etag("devices", [0, 0], None)
+    monkeypatch.setattr(state_views, "BOOT_ID", "another-process")
+
+    assert make_etag("devices", [0, 0], None) != etag
+
+
+def test_projection_and_filters(client):
+    body = client.get("/api/devices", params={"fields": "id,status.power", "type": "outlet"}).json()
+    assert body["devices"] == [{"id": "plug1", "status": {"power": 4.5}}]
+
+    body = client.get("/api/devices", params={"room_id": 1, "fields": "id"}).json()
+    assert body["devices"] == [{"id": "light1"}, {"id": "light2"}]
+
+
+def test_cursor_pagination_walks_every_device(client):
+    seen, cursor = [], None
+    while True:
+        params = {"limit": 3, "fields": "id"}
+        if cursor:
+            params["cursor"] = cursor
+        body = client.get("/api/devices", params=params).json()
+        seen.extend(device["id"] for device in body["devices"])
+        cursor = body["next_cursor"]
+        if cursor is None:
+            break
+
+    assert seen == ["light1", "light2", "light3", "plug1"]
+
+
+@pytest.mark.parametrize("path, params, status", [
+    ("/api/devices", {"cursor": "@@@"}, 400),
+    ("/api/devices", {"limit": 0}, 400),
+    ("/api/devices", {"room_id": 9}, 404),
+    ("/api/devices/missing", {}, 404),
+    ("/api/rooms/9", {}, 404),
+])
+def test_invalid_requests(client, path, params, status):
+    assert client.get(path, params=params).status_code == status
+
+
+@pytest.mark.parametrize("path", ["/api/rooms/9", "/api/devices/missing"])
+def test_missing_resources_are_404_even_when_conditional(client, path):
+    etag = client.get("/api/rooms").headers["etag"]
+
+    for header in ("*", etag):
+        assert client.get(path, headers={"If-None-Match": header}).status_code == 404
+
+
+def test_rooms_carry_live_status(client, state_machine):
+    etag = client.get("/api/rooms").headers["etag"]
+    state_machine.handle_messages([report("light2", brightness=77)])
+
+    response = client.get("/api/rooms", params={"fields": "id,status.brightness"}, headers={"If-None-Match": etag})
+
+    assert response.status_code == 200
+    living = next(room for room in response.json()["rooms"] if room["id"] == 1)
+    assert {"id": "light2", "status": {"brightness": 77}} in living["entities"]
+    room = client.get("/api/rooms/2", headers={"If-None-Match": response.headers["etag"]})
+    assert room.status_code == 200
+    assert room.json()["name"] == "Office"
+
+
+def test_helpers():
+    assert etag_matches('W/"a", "b"', '"a"')
+    assert etag_matches("*", '"a"')
+    assert not etag_matches(None, '"a"')
+    assert decode_cursor(encode_cursor("light-1/ă")) == "light-1/ă"
+    projection = parse_fields("id, status.ison,status.power")
+    assert project({"id": "x", "name": "n", "status": {"ison": True, "temp": 1}}, projection) == \
+        {"id": "x", "status": {"ison": True}}
+    assert parse_fields("status,status.ison") == (frozenset({"status"}), None)
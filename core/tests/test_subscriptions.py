@@ -0,0 +1,126 @@
+import asyncio
+import json
+import pytest
+from conftest import FakeWebSocket, report, room
+from services.websocket.subscriptions import Subscription, SubscriptionIndex
+from services.websocket.websocket_service import WebSocketManager
+
+
+@pytest.fixture
+def index(state_machine):
+    return SubscriptionIndex(state_machine)
+
+
+def delta_after(state_machine, *messages):
+    since = state_machine.version
+    state_machine.handle_messages(list(messages))
+    return state_machine.get_changes_since(since)
+
+
+def routed(index, delta):
+    """conexiune -> delta primit."""
+    return {connection: message for connections, message in index.route(delta) for connection in connections}
+
+
+def test_from_message_validates_lists():
+    subscription = Subscription.from_message({"rooms": [1], "types": ["light"], "fields": ["ison"], "new_devices": True})
+
+    assert subscription.rooms == {1}
+    assert subscription.fields == {"ison"}
+    assert subscription.new_devices is True
+    for invalid in ({"rooms": "1"}, {"rooms": [True]}, {"device_ids": [1]}, {"fields": "ison"}):
+        with pytest.raises(ValueError):
+            Subscription.from_message(invalid)
+
+
+def test_same_filter_shares_a_group(index):
+    index.add("a", Subscription(rooms=[1]))
+    index.add("b", Subscription(rooms=[1]))
+
+    assert len(index.groups) == 1
+    assert index.remove("a", Subscription(rooms=[1])) is False
+    assert index.remove("b", Subscription(rooms=[1])) is True
+    assert index.groups == {} and index.by_device == {}
+
+
+def test_deltas_reach_only_interested_groups(state_machine, index):
+    index.add("living", Subscription(rooms=[1]))
+    index.add("plug", Subscription(device_ids=["plug1"]))
+    index.add("lights", Subscription(types=["light"], fields=["ison"]))
+
+    messages = routed(index, delta_after(state_machine, report("light3", ison=False, brightness=5),
+                                         report("light1", brightness=99)))
+
+    assert set(messages) == {"living", "lights"}
+    assert set(messages["living"]["changes"]) == {"light1"}
+    # "lights" cere doar ison: light1 (doar brightness) nu are nimic de trimis.
+    assert list(messages["lights"]["changes"]) == ["light3"]
+    assert messages["lights"]["changes"]["light3"]["status"] == {"ison": False}
+
+
+def test_unfiltered_field_projection_gets_every_device(state_machine, index):
+    index.add("power", Subscription(fields=["power"]))
+
+    messages = routed(index, delta_after(state_machine, report("plug1", power=12.5), report("light2", ison=True)))
+
+    assert list(messages["power"]["changes"]) == ["plug1"]
+    assert messages["power"]["changes"]["plug1"]["status"] == {"power": 12.5}
+
+
+def test_new_device_announcements_only_when_requested(state_machine, index):
+    index.add("plain", Subscription(rooms=[1]))
+    index.add("admin", Subscription(rooms=[2], new_devices=True))
+
+    messages = routed(index, delta_after(state_machine, ("shellies/announce", json.dumps({"id": "light9"}))))
+
+    assert set(messages) == {"admin"}
+    assert "light9" in messages["admin"]["new_devices"]
+
+
+def test_room_changes_are_picked_up(state_machine, index, fake_db):
+    index.add("office", Subscription(rooms=[2]))
+    assert not routed(index, delta_after(state_machine, report("light3", brightness=1)))
+
+    fake_db.room.rows = [room(2, "Office", ["plug1", "light3"])]
+    asyncio.run(state_machine.refresh_room(2))
+
+    messages = routed(index, delta_after(state_machine, report("light3", brightness=2)))
+    assert set(messages["office"]["changes"]) == {"light3"}
+
+
+def test_filter_snapshot_and_sync_delta(state_machine, index):
+    subscription = Subscription(device_ids=["light2"], fields=["brightness"])
+    snapshot = {"devices": {device_id: {"id": device_id, "type": record["type"], "status": dict(record["status"])}
+                            for device_id, record in state_machine.devices.items()},
+                "new_devices": {"light9": {}}, "version": 7}
+
+    filtered = subscription.filter_snapshot(snapshot, index.members_of(subscription))
+
+    assert filtered == {"devices": {"light2": {"id": "light2", "type": "light", "status": {"brightness": 20}}},
+                        "new_devices": {}, "version": 7}
+    delta = delta_after(state_machine, report("light1", brightness=1))
+    assert index.filter_delta(subscription, delta)["changes"] == {}
+
+
+def test_subscribed_client_gets_only_its_devices(state_machine):
+    manager = WebSocketManager(state_machine)
+    websocket = FakeWebSocket()
+
+    async def scenario():
+        await manager.connect(websocket)
+        await manager.handle_subscribe(websocket, {"command": "subscribe", "rooms": [2]})
+        task = asyncio.create_task(manager.broadcast_status())
+        await asyncio.sleep(0)
+        state_machine.handle_messages([report("light1", brightness=1), report("plug1", ison=False)])
+        while len(websocket.sent) < 4:
+            await asyncio.sleep(0.01)
+        task.cancel()
+        await manager.handle_unsubscribe(websocket, {"command": "unsubscribe"})
+
+    asyncio.run(scenario())
+
+    _, reply, snapshot, delta, _, full = websocket.sent
+    assert reply == {"status": "success", "command": "subscribe", "devices": 1}
+    assert list(snapshot["devices"]) == ["plug1"]
+    assert list(delta["changes"]) == ["plug1"]
+    assert set(full["devices"]) == {"light1", "light2", "light3", "plug1"}
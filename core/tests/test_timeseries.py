@@ -0,0 +1,137 @@
+import asyncio
+from datetime import datetime, timezone
+import pytest
+from services.timeseries.rollup_writer import RollupWriter
+from services.timeseries.timeseries_store import TimeSeriesStore, choose_resolution, finalize, merge_rows
+
+# Începutul unei zile UTC, ca minutul, ora și ziua să înceapă toate aici.
+DAY = 1_700_006_400.0
+
+
+def rows_of(store, resolution):
+    return [row for row in store.pending if row["resolution"] == resolution]
+
+
+def test_closed_minute_becomes_a_pending_row():
+    store = TimeSeriesStore(ring_size=8)
+    store.record_many([("plug1", "power", 10.0)], DAY + 5)
+    store.record_many([("plug1", "power", 30.0)], DAY + 50)
+    assert store.pending == []
+
+    store.record_many([("plug1", "power", 5.0)], DAY + 65)
+
+    [row] = store.pending
+    assert row["entityId"] == "plug1"
+    assert row["resolution"] == "minute"
+    assert row["bucket"] == datetime.fromtimestamp(DAY, timezone.utc)
+    assert (row["count"], row["min"], row["max"], row["avg"]) == (2, 10.0, 30.0, 20.0)
+
+
+def test_energy_delta_handles_counter_resets():
+    store = TimeSeriesStore(ring_size=8)
+    for offset, value in ((0, 100.0), (10, 130.0), (20, 5.0), (30, 12.0)):
+        store.record_many([("plug1", "energy", value)], DAY + offset)
+
+    store.close_expired(DAY + 86400)
+
+    # 30 de la creștere, 5 după reset (contorul a pornit de la 0), apoi 7.
+    assert [row["delta"] for row in rows_of(store, "minute")] == [42.0]
+    assert [row["delta"] for row in rows_of(store, "day")] == [42.0]
+
+
+def test_close_expired_closes_only_finished_buckets():
+    store = TimeSeriesStore(ring_size=8)
+    store.record_many([("plug1", "power", 10.0)], DAY + 5)
+
+    assert store.close_expired(DAY + 61) == 1
+    assert [row["resolution"] for row in store.pending] == ["minute"]
+    assert store.close_expired(DAY + 3600) == 1
+    assert store.close_expired(DAY + 3600) == 0
+
+
+def test_non_numeric_samples_are_ignored():
+    store = TimeSeriesStore(ring_size=8)
+    store.record_many([("plug1", "power", True), ("plug1", "power", "7"), ("plug1", "power", 7)], DAY)
+
+    assert store.samples == 1
+    assert store.raw_samples("plug1", "power", DAY, DAY) == [(DAY, 7.0)]
+
+
+def test_ring_buffer_keeps_the_latest_samples():
+    store = TimeSeriesStore(ring_size=3)
+    for offset in range(5):
+        store.record_many([("plug1", "power", float(offset))], DAY + offset)
+
+    assert store.raw_samples("plug1", "power", 0, DAY + 10) == [(DAY + 2, 2.0), (DAY + 3, 3.0), (DAY + 4, 4.0)]
+    assert store.raw_samples("plug1", "power", DAY + 3, DAY + 3) == [(DAY + 3, 3.0)]
+
+
+def test_unflushed_rows_include_pending_and_open_buckets():
+    store = TimeSeriesStore(ring_size=8)
+    store.record_many([("plug1", "power", 10.0), ("light1", "power", 1.0)], DAY + 5)
+    store.record_many([("plug1", "power", 20.0)], DAY + 65)
+
+    rows = store.unflushed_rows(["plug1"], "power", "minute", DAY, DAY + 120)
+
+    assert sorted((row["bucket"].timestamp(), row["avg"]) for row in rows) == [(DAY, 10.0), (DAY + 60, 20.0)]
+    assert len(store.unflushed_rows(None, "power", "hour", DAY, DAY + 120)) == 2
+
+
+def test_merge_rows_combines_duplicate_buckets():
+    bucket = datetime.fromtimestamp(DAY, timezone.utc)
+    rows = [
+        {"entityId": "plug1", "bucket": bucket, "count": 2, "min": 1.0, "max": 5.0, "avg": 3.0, "delta": 4.0},
+        {"entityId": "plug1", "bucket": bucket, "count": 6, "min": 0.5, "max": 4.0, "avg": 1.0, "delta": None},
+        {"entityId": "light1", "bucket": bucket, "count": 1, "min": 9.0, "max": 9.0, "avg": 9.0, "delta": 0.0},
+    ]
+
+    merged = merge_rows(rows)
+
+    assert finalize(merged[("plug1", DAY)]) == {
+        "bucket": DAY, "count": 8, "min": 0.5, "max": 5.0, "avg": 1.5, "delta": 4.0,
+    }
+    assert finalize(merged[("light1", DAY)])["avg"] == 9.0
+
+
+@pytest.mark.parametrize("span, resolution", [(3600, "minute"), (6 * 3600, "minute"), (86400, "hour"),
+                                              (14 * 86400, "hour"), (30 * 86400, "day")])
+def test_choose_resolution(span, resolution):
+    assert choose_resolution(DAY, DAY + span) == resolution
+
+
+def test_writer_flushes_closed_rollups_in_one_batch(fake_db):
+    store = TimeSeriesStore(ring_size=8)
+    writer = RollupWriter(store)
+    store.record_many([("plug1", "power", 10.0), ("plug1", "energy", 1.0)], DAY)
+    store.record_many([("plug1", "energy", 3.0)], DAY + 30)
+
+    assert asyncio.run(writer.flush(close_open=True)) == 6
+
+    [batch] = fake_db.batches
+    assert {(table, operation) for table, operation, _ in batch} == {("metricrollup", "create")}
+    assert store.pending_count() == 0
+    assert writer.rows_written == 6
+
+
+def test_failed_flush_restores_a_bounded_backlog(fake_db):
+    store = TimeSeriesStore(ring_size=8, max_pending=4)
+    writer = RollupWriter(store)
+    fake_db.fail = True
+    store.record_many([("plug1", "power", 1.0), ("light1", "power", 1.0)], DAY)
+
+    with pytest.raises(RuntimeError):
+        asyncio.run(writer.flush())
+
+    # flush încheie toate bucket-urile expirate: minut, oră și zi pentru două serii.
+    assert store.pending_count() == 4
+    assert store.dropped == 2
+    assert store.get_stats()["dropped_rows"] == 2
+
+
+def test_restore_keeps_the_newest_rows():
+    store = TimeSeriesStore(ring_size=8, max_pending=3)
+    store.pending = [{"id": "new"}]
+
+    assert store.restore_pending([{"id": "old1"}, {"id": "old2"}, {"id": "old3"}]) == 1
+    assert [row["id"] for row in store.pending] == ["old2", "old3", "new"]
+    assert store.restore_pending([]) == 0
@@ -0,0 +1,61 @@
+import pytest
+from integration.shelly.common import parse_json_object, parse_number, parse_on_off
+from services.state_machine.topic_router import TopicRouter, build_default_router
+
+
+@pytest.fixture
+def router():
+    return build_default_router()
+
+
+def test_status_topic_captures_the_device_id(router):
+    match = router.match("shellies/light1/color/0/status")
+
+    assert match.device_id == "light1"
+    assert match.route.integration == "shelly"
+    assert match.route.channel == "color/0"
+    assert match.route.field is None
+    assert match.route.parser is parse_json_object
+
+
+@pytest.mark.parametrize("topic, field, parser", [
+    ("shellies/light1/color/0", "ison", parse_on_off),
+    ("shellies/light1/light/0/power", "power", parse_number),
+    ("shellies/light1/light/0/energy", "energy", parse_number),
+])
+def test_single_field_topics(router, topic, field, parser):
+    match = router.match(topic)
+
+    assert match.device_id == "light1"
+    assert match.route.field == field
+    assert match.route.parser is parser
+
+
+def test_literal_segments_win_over_the_wildcard(router):
+    broadcast = router.match("shellies/announce")
+    per_device = router.match("shellies/light1/announce")
+
+    assert broadcast.route.field == "announce" and broadcast.device_id is None
+    assert per_device.route.field == "announce" and per_device.device_id == "light1"
+
+
+@pytest.mark.parametrize("topic", [
+    "other/light1/color/0/status",
+    "shellies/light1/color/0/command",
+    "shellies/light1/color/0/status/extra",
+    "shellies/light1/color",
+    "shellies",
+    "",
+])
+def test_unknown_topics_are_rejected(router, topic):
+    assert router.match(topic) is None
+
+
+def test_routes_from_several_integrations():
+    router = TopicRouter()
+    router.register("shelly", "shellies", "+/online", None, "online", str)
+    router.register("tasmota", "tele", "+/STATE", None, None, str)
+
+    assert router.match("tele/plug7/STATE").route.integration == "tasmota"
+    assert router.match("shellies/light1/online").route.integration == "shelly"
+    assert router.match("tele/plug7/online") is None
@@ -0,0 +1,129 @@
+import asyncio
+import json
+import pytest
+from conftest import FakeWebSocket
+from integration.device_state import FIELDS, DeviceState
+from services.websocket import wire_format
+from services.websocket.wire_format import (FLAG_PLAIN, FLAG_ZLIB, JSON, KEY_IDS, KEYS, JSON_PROTOCOL, MSGPACK_PROTOCOL,
+                                            MsgpackFormat, SharedFrame, compact_keys, expand_keys, negotiate)
+from services.websocket.websocket_service import WebSocketManager
+
+msgpack = pytest.importorskip("msgpack")
+
+DELTA = {
+    "tag": "delta", "since": 4, "version": 9,
+    "changes": {"light1": {"status": {"ison": True, "brightness": 80, "effect": 3}, "pending": ["ison"], "version": 8}},
+    "adopted": ["light9"],
+}
+
+
+def test_key_ids_are_stable():
+    # Id-urile sunt trimise clienților: cheile existente nu își schimbă poziția.
+    assert KEYS[:8] == ("tag", "version", "since", "changes", "devices", "new_devices", "adopted", "status")
+    assert KEYS[KEY_IDS["ison"]:KEY_IDS["ison"] + len(FIELDS)] == FIELDS
+    assert len(set(KEYS)) == len(KEYS)
+
+
+def test_compact_keys_round_trip():
+    message = {"tag": "x", "unknown": {"ison": 1}, 5: "int key", "devices": [{"id": "a"}]}
+
+    compact = compact_keys(message)
+
+    assert compact[KEY_IDS["tag"]] == "x"
+    assert compact["unknown"] == {KEY_IDS["ison"]: 1}
+    assert compact["5"] == "int key"
+    assert expand_keys(compact) == {"tag": "x", "unknown": {"ison": 1}, "5": "int key", "devices": [{"id": "a"}]}
+
+
+def test_small_frames_are_plain_msgpack():
+    wire = MsgpackFormat(compress_min_bytes=4096)
+
+    frame = wire.encode(DELTA)
+
+    assert frame[0] == FLAG_PLAIN
+    assert len(frame) < len(json.dumps(DELTA))
+    assert wire.decode(frame) == DELTA
+
+
+def test_large_frames_are_compressed():
+    wire = MsgpackFormat(compress_min_bytes=64)
+    snapshot = {"devices": {f"light{index}": {"id": f"light{index}", "status": DeviceState({"ison": True})}
+                            for index in range(50)}, "version": 3}
+
+    frame = wire.encode(snapshot)
+
+    assert frame[0] == FLAG_ZLIB
+    decoded = wire.decode(frame)
+    assert decoded["devices"]["light7"] == {"id": "light7", "status": {"ison": True}}
+
+
+def test_unknown_flag_is_rejected():
+    with pytest.raises(ValueError):
+        MsgpackFormat().decode(bytes((7,)) + msgpack.packb({}))
+
+
+def test_text_frames_are_json_for_every_format():
+    assert MsgpackFormat().decode('{"command": "sync"}') == {"command": "sync"}
+
+
+def test_hello_carries_the_key_table():
+    wire = MsgpackFormat(compress_min_bytes=0)
+
+    hello = msgpack.unpackb(wire.hello()[1:])
+
+    assert hello == {"tag": "hello", "protocol": MSGPACK_PROTOCOL, "keys": list(KEYS), "compress_min_bytes": 0}
+    assert JSON.hello() is None
+
+
+def test_negotiate_picks_the_first_supported_protocol():
+    assert negotiate(["v2.unknown", MSGPACK_PROTOCOL, JSON_PROTOCOL]).protocol == MSGPACK_PROTOCOL
+    assert negotiate([JSON_PROTOCOL]) is JSON
+    assert negotiate([]) is None
+
+
+def test_negotiate_without_msgpack(monkeypatch):
+    monkeypatch.setattr(wire_format, "FORMATS", {JSON_PROTOCOL: JSON})
+
+    assert negotiate([MSGPACK_PROTOCOL]) is None
+
+
+def test_shared_frame_encodes_once_per_format(monkeypatch):
+    wire = MsgpackFormat()
+    calls = []
+    monkeypatch.setattr(wire, "encode", lambda message: calls.append(message) or b"frame")
+    frame = SharedFrame(DELTA)
+
+    assert frame.encode(wire) is frame.encode(wire)
+    assert len(calls) == 1
+    assert json.loads(frame.encode(JSON)) == DELTA
+
+
+class BinaryWebSocket(FakeWebSocket):
+    """Client care negociază MessagePack; cadrele binare se decodează cu formatul negociat."""
+
+    async def send_bytes(self, data: bytes):
+        self.frames.append(data)
+        self.sent.append(wire_format.FORMATS[self.subprotocol].decode(data))
+
+
+def test_connect_negotiates_the_format_per_client(state_machine):
+    manager = WebSocketManager(state_machine)
+    binary, text = BinaryWebSocket([MSGPACK_PROTOCOL]), FakeWebSocket()
+
+    async def scenario():
+        await manager.connect(binary)
+        await manager.connect(text)
+        manager._send_to_all({"tag": "delta", "since": 0, "version": 1, "changes": {}})
+        await asyncio.sleep(0.01)
+        for connection in list(manager.active_connections.values()):
+            connection.close()
+
+    asyncio.run(scenario())
+
+    assert (binary.subprotocol, text.subprotocol) == (MSGPACK_PROTOCOL, None)
+    assert all(isinstance(frame, bytes) for frame in binary.frames)
+    assert all(isinstance(frame, str) for frame in text.frames)
+    hello, snapshot, delta = binary.sent
+    assert hello["tag"] == "hello"
+    assert snapshot == text.sent[0]
+    assert delta == text.sent[1] == {"tag": "delta", "since": 0, "version": 1, "changes": {}}
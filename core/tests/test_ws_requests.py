@@ -0,0 +1,175 @@
+import asyncio
+import pytest
+from conftest import FakeWebSocket
+from services.commands.scheduler import CommandScheduler
+from services.websocket import websocket_service
+from services.websocket.websocket_service import WebSocketManager
+
+
+class GatedSend:
+    """send_batch care înregistrează loturile și nu se termină până când `gate` e setat."""
+
+    def __init__(self, open_gate: bool = True):
+        self.batches = []
+        self.gate = asyncio.Event()
+        if open_gate:
+            self.gate.set()
+
+    async def __call__(self, batch):
+        self.batches.append(dict(batch))
+        await self.gate.wait()
+        return {key: True for key in batch}
+
+
+async def connected(state_machine, send):
+    manager = WebSocketManager(state_machine)
+    manager.scheduler = CommandScheduler(send, rate=100)
+    websocket = FakeWebSocket()
+    await manager.connect(websocket)
+    return manager, websocket, manager.active_connections[websocket]
+
+
+async def replies(websocket, count: int):
+    """Răspunsurile la comenzi (fără snapshot-ul de la conectare), după ce au sosit `count`."""
+    while True:
+        messages = [message for message in websocket.sent if "devices" not in message]
+        if len(messages) >= count:
+            return messages
+        await asyncio.sleep(0.001)
+
+
+def test_requests_are_pipelined_and_echo_their_id(state_machine):
+    async def scenario():
+        send = GatedSend(open_gate=False)
+        manager, websocket, connection = await connected(state_machine, send)
+        try:
+            await manager.process_message(websocket, {"command": "turn_on", "device_ids": ["light1"], "request_id": "a"})
+            await manager.process_message(websocket, {"command": "turn_off", "device_ids": ["light2"], "request_id": 7})
+            # Bucla de citire nu a așteptat publicarea: ambele cereri sunt încă în zbor.
+            in_flight = len(connection.requests)
+            send.gate.set()
+            return in_flight, await replies(websocket, 2)
+        finally:
+            manager.scheduler.stop()
+            connection.close()
+
+    in_flight, (first, second) = asyncio.run(scenario())
+
+    assert in_flight == 2
+    assert {first["request_id"], second["request_id"]} == {"a", 7}
+    assert all(reply["status"] == "success" for reply in (first, second))
+
+
+def test_batch_frame_gets_one_response_and_one_burst(state_machine):
+    send = GatedSend()
+
+    async def scenario():
+        manager, websocket, connection = await connected(state_machine, send)
+        try:
+            await manager.process_message(websocket, [
+                {"command": "turn_on", "device_ids": ["light1"], "request_id": "on"},
+                {"command": "turn_off", "device_ids": ["light2"]},
+                {"command": "explode"},
+            ])
+            return await replies(websocket, 1)
+        finally:
+            manager.scheduler.stop()
+            connection.close()
+
+    [frame] = asyncio.run(scenario())
+
+    assert frame["tag"] == "batch"
+    assert [response["request_id"] for response in frame["responses"]] == ["on", 1, 2]
+    assert [response["status"] for response in frame["responses"]] == ["success", "success", "error"]
+    assert len(send.batches) == 1
+    assert set(send.batches[0]) == {("light1", "command"), ("light2", "command")}
+
+
+def test_empty_and_oversized_batches(state_machine, monkeypatch):
+    monkeypatch.setattr(websocket_service, "WS_MAX_BATCH_SIZE", 2)
+
+    async def scenario():
+        manager, websocket, connection = await connected(state_machine, GatedSend())
+        try:
+            await manager.process_message(websocket, [])
+            await manager.process_message(websocket, [{"command": "sync"}] * 3)
+            return await replies(websocket, 2)
+        finally:
+            manager.scheduler.stop()
+            connection.close()
+
+    messages = asyncio.run(scenario())
+
+    assert {"tag": "batch", "responses": []} in messages
+    assert {"status": "error", "message": "Batch larger than 2 commands"} in messages
+
+
+def test_reader_waits_when_the_inflight_limit_is_reached(state_machine):
+    async def scenario():
+        send = GatedSend(open_gate=False)
+        manager, websocket, connection = await connected(state_machine, send)
+        connection.inflight = asyncio.Semaphore(2)
+        try:
+            for request_id, device_id in enumerate(["light1", "light2"]):
+                await manager.process_message(websocket, {"command": "turn_on", "device_ids": [device_id],
+                                                          "request_id": request_id})
+            third = asyncio.create_task(manager.process_message(
+                websocket, {"command": "turn_on", "device_ids": ["light3"], "request_id": 2}))
+            await asyncio.sleep(0.02)
+            blocked = not third.done()
+            send.gate.set()
+            await asyncio.wait_for(third, timeout=1)
+            messages = await replies(websocket, 3)
+            while connection.requests:
+                await asyncio.sleep(0.001)
+            return blocked, messages, connection.inflight._value
+        finally:
+            manager.scheduler.stop()
+            connection.close()
+
+    blocked, messages, free = asyncio.run(scenario())
+
+    assert blocked
+    assert sorted(message["request_id"] for message in messages) == [0, 1, 2]
+    assert free == 2
+
+
+def test_disconnect_cancels_inflight_requests(state_machine):
+    async def scenario():
+        send = GatedSend(open_gate=False)
+        manager, websocket, connection = await connected(state_machine, send)
+        try:
+            await manager.process_message(websocket, {"command": "turn_on", "device_ids": ["light1"], "request_id": 1})
+            await manager.process_message(websocket, {"command": "turn_on", "device_ids": ["light2"]})
+            # Ca bucla de citire, care cedează controlul în receive() înainte de deconectare.
+            await asyncio.sleep(0)
+            tasks = list(connection.requests)
+            await manager.disconnect(websocket)
+            await asyncio.sleep(0.01)
+            return tasks
+        finally:
+            manager.scheduler.stop()
+
+    tasks = asyncio.run(scenario())
+
+    # Cererea cu request_id și răspunsul în fundal al comenzii simple.
+    assert len(tasks) == 2
+    assert all(task.cancelled() for task in tasks)
+
+
+@pytest.mark.parametrize("since", [True, "3"])
+def test_sync_with_an_invalid_version_sends_a_snapshot(state_machine, since):
+    async def scenario():
+        manager, websocket, connection = await connected(state_machine, GatedSend())
+        try:
+            await manager.process_message(websocket, {"command": "sync", "since": since})
+            while len(websocket.sent) < 2:
+                await asyncio.sleep(0.001)
+            return websocket.sent
+        finally:
+            manager.scheduler.stop()
+            connection.close()
+
+    _, snapshot = asyncio.run(scenario())
+
+    assert "devices" in snapshot
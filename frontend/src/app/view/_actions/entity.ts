@@ -2,6 +2,7 @@
 import db from "@/db/db"
 import { z } from "zod"
 import { redirect } from "next/navigation"
+import { refreshBackendRoom } from "@/lib/backend"
 
 const addSchema = z.object({
     id: z.string().min(1),
@@ -37,6 +38,7 @@ export async function addEntity(prevState: unknown, formData: FormData) {
     });
 
     console.log("Entity created:", entity);
+    await refreshBackendRoom(data.roomId);
     redirect("/view/entities");
 
 
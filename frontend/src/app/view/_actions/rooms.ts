@@ -3,6 +3,7 @@ import db from "@/db/db"
 import { z } from "zod"
 import fs from "fs/promises"
 import { redirect } from "next/navigation"
+import { refreshBackendRoom } from "@/lib/backend"
 
 const fileSchema = z.instanceof(File, { message: "Invalid file" })
 const imageSchema = fileSchema.refine(
@@ -43,5 +44,6 @@ export async function addRoom(prevState: unknown, formData: FormData) {
             image: imagePath,
         },
     });
+    await refreshBackendRoom(room.id);
     redirect("/view/rooms");
 }
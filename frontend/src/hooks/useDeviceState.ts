@@ -1,4 +1,4 @@
-import { useState, useEffect } from "react";
+import { useState, useEffect, useRef } from "react";
 import { interpretDevices } from "./deviceStateMachine";
 
 type Devices = {
@@ -7,11 +7,19 @@ type Devices = {
     name: string;
     type: string;
     status: any;
+    pending?: string[];
   };
 };
 
+type NewDevices = {
+  [deviceId: string]: { id: string; name: string; type: string; [key: string]: any };
+};
+
 export function useDeviceState(initialDevices: Devices, wsUrl: string) {
   const [devices, setDevices] = useState(interpretDevices(initialDevices));
+  const [newDevices, setNewDevices] = useState<NewDevices>({});
+  const rawDevices = useRef<Devices>(initialDevices);
+  const rawNewDevices = useRef<NewDevices>({});
 
   useEffect(() => {
     const ws = new WebSocket(wsUrl);
@@ -25,8 +33,36 @@ export function useDeviceState(initialDevices: Devices, wsUrl: string) {
         const data = JSON.parse(event.data);
 
         if (data.devices) {
-          const updatedDevices = interpretDevices(data.devices);
-          setDevices(updatedDevices);
+          rawDevices.current = data.devices;
+          rawNewDevices.current = data.new_devices || {};
+          setDevices(interpretDevices(data.devices));
+          setNewDevices(rawNewDevices.current);
+        } else if (data.tag === "delta" && data.changes) {
+          // Delta: doar câmpurile modificate, comasate pe dispozitiv
+          const merged: Devices = { ...rawDevices.current };
+          for (const deviceId in data.changes) {
+            const change = { ...data.changes[deviceId] };
+            // "version" e versiunea modificării, nu un câmp al dispozitivului
+            delete change.version;
+            const current = merged[deviceId];
+            merged[deviceId] = {
+              ...current,
+              ...change,
+              status: { ...(current?.status || {}), ...(change.status || {}) },
+            };
+          }
+          rawDevices.current = merged;
+          setDevices(interpretDevices(merged));
+
+          // Dispozitive anunțate, respectiv adoptate (acestea vin și în "changes")
+          if (data.new_devices || data.adopted) {
+            const pending: NewDevices = { ...rawNewDevices.current, ...(data.new_devices || {}) };
+            for (const deviceId of data.adopted || []) {
+              delete pending[deviceId];
+            }
+            rawNewDevices.current = pending;
+            setNewDevices(pending);
+          }
         }
       } catch (error) {
         console.error("❌ Failed to parse WebSocket message:", error);
@@ -46,5 +82,5 @@ export function useDeviceState(initialDevices: Devices, wsUrl: string) {
     };
   }, [wsUrl]);
 
-  return devices;
-}
\ No newline at end of file
+  return { devices, newDevices };
+}
@@ -0,0 +1,10 @@
+const BACKEND_URL = process.env.BACKEND_URL || "http://localhost:8000";
+
+// Backend-ul ține camerele în memorie; după ce le modificăm direct în baza de date îi cerem să reîncarce camera.
+export async function refreshBackendRoom(roomId: number) {
+  try {
+    await fetch(`${BACKEND_URL}/api/rooms/${roomId}/refresh`, { method: "POST" });
+  } catch (error) {
+    console.error("Failed to refresh room on backend:", error);
+  }
+}